@@ -0,0 +1,459 @@
+# async_pipeline.py
+"""
+asyncio-motor: diff → opret → anvend på én event loop.
+
+ACCT-operationerne her har samme returkontrakt (ok, info) som de synkrone i
+changing_state_of_group / create_missing_users / member_rasmus_diff og genbruger
+deres XML-parsing og -opbygning; kun I/O'en er async. Alle kald går gennem én
+AsyncAcctClient, hvis semaforer begrænser antallet af samtidige kald.
+
+Kør:  python async_pipeline.py [--create-missing] [--dry-run]
+Forudsætter rasmus-liste.csv i working dir (rasmus_liste_til_csv kører før;
+dens metafil fortæller om listen er ændret siden sidste download).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import requests
+
+import build_members_csv as bm
+import changing_state_of_group as cs
+import create_missing_users as cm
+import find_users as fu
+import member_rasmus_diff as mrd
+import plan_operations as planner
+import rasmus_liste_til_csv as rl
+from utils.acct_async import AcctRequestError, AsyncAcctClient
+from utils.acct_client import XML_BODY_HEADERS
+from utils import apply_journal, snapshot
+from utils.card_cache import CardCache, invalidating
+from utils.concurrency import dedupe
+from utils.xml_utils import aiter_elements
+
+
+# ---------- helpers ----------
+async def _get_user_groups(client: AsyncAcctClient, user_guid: str) -> list[str]:
+    try:
+        r = await client.get(f"{cs.ACCT_BASE}/users/{user_guid}/groups", timeout=15)
+    except AcctRequestError:
+        return []
+    if r.status_code != 200:
+        return []
+    return cs._parse_group_ids_from_xml(r.text)
+
+
+async def _put_userdata(client: AsyncAcctClient, url_user: str, ud: ET.Element) -> tuple[bool, str | None]:
+    snapshot.shared().invalidate(url_user.rsplit("/", 1)[-1])
+    put_xml = ET.tostring(ud, encoding="utf-8", xml_declaration=True)
+    try:
+        p = await client.put(url_user, data=put_xml, headers=XML_BODY_HEADERS, timeout=20)
+        if p.status_code in (200, 202, 204):
+            return True, None
+        if p.status_code != 400:
+            return False, f"{p.status_code} {(p.text or '')[:200]}"
+        put_xml_no_decl = ET.tostring(ud, encoding="utf-8", xml_declaration=False)
+        p2 = await client.put(url_user, data=put_xml_no_decl, headers=XML_BODY_HEADERS, timeout=20)
+        if p2.status_code not in (200, 202, 204):
+            return False, f"{p2.status_code} {(p2.text or '')[:200]}"
+    except AcctRequestError as e:
+        return False, f"PUT failed: {e}"
+    return True, None
+
+
+async def _load_user(client: AsyncAcctClient, user_guid: str) -> tuple[dict | None, str | None]:
+    """Async udgave af changing_state_of_group._load_user (snapshot først, ellers GET)."""
+    cached = snapshot.shared().get(user_guid)
+    if cached is not None:
+        return cs._with_fallbacks(cached, user_guid), None
+    try:
+        g = await client.get(f"{cs.ACCT_BASE}/users/{user_guid}", timeout=20)
+    except AcctRequestError as e:
+        return None, f"GET failed: {e}"
+    if g.status_code == 404:
+        return None, "not_found"
+    if g.status_code >= 400:
+        return None, f"GET failed: {g.status_code}"
+    try:
+        return cs._parse_user_fields(g.content, user_guid), None
+    except ET.ParseError as e:
+        return None, f"parse_error: {e}"
+
+
+# ---------- API ops ----------
+async def add_user_to_group(client: AsyncAcctClient, user_guid: str) -> tuple[bool, str | None]:
+    """Async udgave af changing_state_of_group.add_user_to_group."""
+    url_user = f"{cs.ACCT_BASE}/users/{user_guid}"
+    cur, err = await _load_user(client, user_guid)
+    if err:
+        return False, "user_not_found" if err == "not_found" else err
+
+    current_groups = set(await _get_user_groups(client, user_guid))
+    if not current_groups:
+        try:
+            rgrp = await client.get(f"{url_user}/groups", timeout=15)
+            if rgrp.status_code == 200:
+                current_groups.update(cs._parse_groupcollection_ids(rgrp.content))
+        except AcctRequestError:
+            pass
+
+    if cs.GROUP_ID in current_groups:
+        return True, "already_in_group"
+    current_groups.add(cs.GROUP_ID)
+
+    ud = cs.build_userdata(cur["card"], cur["name"], current_groups,
+                           entry_nil=cur["entry_nil"], entry_text=cur["entry_text"])
+    ok, info = await _put_userdata(client, url_user, ud)
+    if not ok or not cs.VERIFY.inline(user_guid):
+        return ok, info
+
+    try:
+        ok = cs._recheck_in_group(await client.get(f"{url_user}/groups", timeout=15))
+    except (AcctRequestError, ValueError):
+        ok = False
+    return (True, None) if ok else (False, "not_in_group_after_put")
+
+
+async def delete_user(client: AsyncAcctClient, user_guid: str) -> tuple[bool, str | None]:
+    """Async udgave af changing_state_of_group.delete_user."""
+    snapshot.shared().invalidate(user_guid)
+    try:
+        r = await client.delete(f"{cs.ACCT_BASE}/users/{user_guid}", timeout=20)
+    except AcctRequestError as e:
+        return False, f"DELETE failed: {e}"
+    if r.status_code in (200, 204):
+        return True, None
+    if r.status_code == 404:
+        return True, "already_deleted"
+    if r.status_code >= 400:
+        return False, f"{r.status_code} {(r.text or '')[:200]}"
+    return True, None
+
+
+async def remove_user_from_group(client: AsyncAcctClient, user_guid: str) -> tuple[bool, str | None]:
+    """Async udgave af changing_state_of_group.remove_user_from_group."""
+    try:
+        r = await client.delete(f"{cs.ACCT_BASE}/groups/{cs.GROUP_ID}/users/{user_guid}", timeout=20)
+        if r.status_code in (200, 204):
+            return True, None
+        if r.status_code == 404:
+            return True, "already_not_in_group"
+    except AcctRequestError:
+        pass
+
+    cur, err = await _load_user(client, user_guid)
+    if err:
+        return (True, "already_deleted") if err == "not_found" else (False, err)
+
+    current = set(await _get_user_groups(client, user_guid))
+    if cs.GROUP_ID not in current:
+        return True, "already_not_in_group"
+
+    ud = cs.build_userdata(cur["card"], cur["name"], current - {cs.GROUP_ID},
+                           entry_nil=cur["entry_nil"], entry_text=cur["entry_text"])
+    ok, info = await _put_userdata(client, f"{cs.ACCT_BASE}/users/{user_guid}", ud)
+    if not ok or not cs.VERIFY.inline(user_guid):
+        return ok, info
+
+    try:
+        ok = not cs._recheck_in_group(await client.get(f"{cs.ACCT_BASE}/users/{user_guid}/groups", timeout=15))
+    except (AcctRequestError, ValueError):
+        ok = False
+    return (True, None) if ok else (False, "still_in_group_after_put")
+
+
+async def set_entry_remaining(client: AsyncAcctClient, user_guid: str, target: str = "1",
+                              add_groups=()) -> tuple[bool, str | None]:
+    """Async udgave af changing_state_of_group.set_entry_remaining (samme modes og backoff)."""
+    url_user = f"{cs.ACCT_BASE}/users/{user_guid}"
+    cur, err = await _load_user(client, user_guid)
+    if err:
+        return False, "GET failed: 404" if err == "not_found" else err
+
+    groups_now = sorted(set(await _get_user_groups(client, user_guid)) | set(add_groups))
+
+    async def _verify() -> bool:
+        try:
+            r = await client.get(url_user, timeout=15)
+            return r.status_code < 400 and cs._entry_matches(r.content, target)
+        except (AcctRequestError, ET.ParseError):
+            return False
+
+    phases = cs.entry_phases(target)
+    if not cs.VERIFY.inline(user_guid):
+        return await _put_userdata(client, url_user, cs.build_entry_userdata(cur, groups_now, phases[0], target))
+
+    budget, put_error = cs.ENTRY_VERIFY_BUDGET, None
+    for mode in phases:
+        ok, info = await _put_userdata(client, url_user, cs.build_entry_userdata(cur, groups_now, mode, target))
+        if not ok:
+            put_error = info
+            continue
+        put_error = None
+        for delay in cs.poll_delays(budget):
+            if delay:
+                await asyncio.sleep(delay)
+                budget -= delay
+            if await _verify():
+                cs.remember_entry_mode(target, mode)
+                return True, None
+    return False, put_error or "persist_failed"
+
+
+async def create_user(client: AsyncAcctClient, card: str, name: str, pid: str | None) -> tuple[bool, str | None]:
+    """Async udgave af create_missing_users.create_user."""
+    body = cm.build_userdata_xml(card, name, pid, cm.GROUP_ID)
+    try:
+        r = await client.post(f"{cm.ACCT_BASE}/users", data=body, headers=XML_BODY_HEADERS, timeout=30)
+    except AcctRequestError as e:
+        return False, f"POST failed: {e}"
+    if r.status_code in (200, 201, 202, 204):
+        return True, cm.created_user_id(r.headers.get("Location"), r.content)
+    if r.status_code == 409:
+        return False, "already_exists"
+    if r.status_code >= 400:
+        return False, f"{r.status_code} {(r.text or '')[:300]}"
+    return True, cm.created_user_id(r.headers.get("Location"), r.content)
+
+
+async def lookup_userid_by_card(client: AsyncAcctClient, card: str, cache: CardCache) -> str | None:
+    """Async udgave af member_rasmus_diff.lookup_userid_by_card (samme kandidat-URL'er og cache)."""
+    card = (card or "").strip()
+    if not card:
+        return None
+    hit, uid = cache.lookup(card)
+    if hit:
+        return uid
+    definitive = True
+    for url in mrd.candidate_urls(card):
+        try:
+            r = await client.get(url, timeout=30)
+        except AcctRequestError:
+            definitive = False
+            continue
+        if 200 <= r.status_code < 300:
+            uid = mrd.pick_userid(mrd.parse_users_from_xml(r.content), card)
+            if uid:
+                cache.put(card, uid)
+                return uid
+        elif r.status_code >= 500:
+            definitive = False
+    if definitive:
+        cache.put(card, None)
+    return None
+
+
+async def resolve_cards(client: AsyncAcctClient, cards, cache: CardCache) -> dict[str, str | None]:
+    """Async udgave af member_rasmus_diff.resolve_cards (samme tærskel for /users-udtræk)."""
+    result: dict[str, str | None] = {}
+    unresolved: list[str] = []
+    for card in dedupe((c or "").strip() for c in cards):
+        if not card:
+            continue
+        hit, uid = cache.lookup(card)
+        if hit:
+            result[card] = uid
+        else:
+            unresolved.append(card)
+    if not unresolved:
+        return result
+
+    if len(unresolved) >= mrd.RESOLVE_EXPORT_THRESHOLD:
+        print(f"• {len(unresolved)} ukendte kort — henter hele /users i stedet for enkeltopslag")
+        try:
+            async with await client.get(f"{mrd.ACCT_BASE}/users", stream=True) as r:
+                if r.status_code < 400:
+                    wanted = set(unresolved)
+                    found = {u["card"]: u["guid"]
+                             async for u in aiter_elements(r.iter_chunked(), f"{{{fu.NS['n']}}}User", fu.parse_user)
+                             if u["card"] in wanted}
+            if r.status_code < 400:
+                for card in unresolved:
+                    cache.put(card, found.get(card))
+                    result[card] = found.get(card)
+                return result
+        except (AcctRequestError, ET.ParseError):
+            pass
+        print("⚠️  /users-udtræk fejlede — slår kortene op enkeltvis")
+
+    lookups = await asyncio.gather(*(lookup_userid_by_card(client, c, cache) for c in unresolved))
+    result.update(zip(unresolved, lookups))
+    return result
+
+
+# ---------- driver ----------
+async def _gather_ordered(coro_fn, items):
+    """Kør coro_fn(item) for alle items samtidig; returnér [(item, result)] i input-rækkefølge."""
+    async def safe(it):
+        try:
+            return await coro_fn(it)
+        except Exception as e:
+            return False, f"exception: {e}"
+    results = await asyncio.gather(*(safe(it) for it in items))
+    return list(zip(items, results))
+
+
+async def run_pipeline(rasmus_csv: str = mrd.RASMUS_FILE, create_missing: bool = True,
+                       dry_run: bool = False, client: AsyncAcctClient | None = None,
+                       rasmus_changed: bool | None = None) -> dict:
+    """
+    Eksportér gruppen, diff mod Rasmus-listen, slå kort op, opret manglende
+    og anvend ADD/DEL/UPD — alt på den aktuelle event loop.
+    Skriver de samme artefakter som den synkrone pipeline.
+    rasmus_changed: fra rasmus_liste_til_csv.main(); None = læs metafilen.
+    Uændret liste + uændret sync-tilstand → stop efter gruppe-eksporten.
+    """
+    if client is None:
+        async with AsyncAcctClient() as c:
+            return await run_pipeline(rasmus_csv, create_missing, dry_run, c, rasmus_changed)
+    if rasmus_changed is None:
+        rasmus_changed = not rl.input_unchanged()
+
+    # 1) Gruppemedlemmer — streames direkte til group_members.csv; kun group_by_card holdes
+    # felterne gemmes i snapshottet, så ADD/DEL/UPD ikke GET'er brugere der lige er listet
+    record = snapshot.recording(bm.parse_user, snapshot.shared())
+    group_by_card: dict[str, dict[str, str]] = {}
+    seen = wrote = 0
+    async with await client.get(f"{bm.ACCT_BASE}/groups/{bm.GROUP_ID}/users", stream=True) as r:
+        if r.status_code >= 400:
+            raise RuntimeError(f"Kunne ikke hente gruppens medlemmer: {r.status_code}")
+        with open(bm.OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(bm.CSV_HEADER)
+            async for u in aiter_elements(r.iter_chunked(), f"{{{bm.NS['n']}}}User", record):
+                seen += 1
+                if u["card"]:
+                    w.writerow(bm.member_row(u))
+                    wrote += 1
+                    group_by_card[u["card"]] = {"UserID": u["guid"], "EntryRemaining": u["entry_remaining"]}
+    print(f"• Fundet {seen} medlemmer i gruppen ({wrote} med Card)")
+
+    # 2) Diff + opslag
+    rasmus = cm.read_cards_from_rasmus(rasmus_csv)
+    if mrd.unchanged_since_sync(rasmus_changed, set(rasmus), group_by_card):
+        print("• Rasmus-listen og gruppen er uændrede siden sidste kørsel — springer diff, opret og anvend over")
+        mrd.write_diff_outputs([], [], [], [])
+        planner.write_plan(planner.build_plan([], [], []))
+        return {"adds": 0, "deletes": 0, "updates": 0, "missing_cards": 0, "created": 0,
+                "http": client.stats()}
+    to_delete, to_add_cards, to_update = mrd.incremental_diff(set(rasmus), group_by_card)
+
+    cache = CardCache()
+    resolved = await resolve_cards(client, to_add_cards, cache)
+    to_add = sorted({uid for uid in resolved.values() if uid})
+    missing = [c for c in to_add_cards if not resolved.get(c)]
+    cache.flush()
+    mrd.write_diff_outputs(to_add, to_delete, to_update, missing)
+    plan = planner.build_plan(dedupe(to_add), dedupe(to_delete), dedupe(to_update))
+    planner.write_plan(plan)
+    planner.print_summary(plan)
+
+    summary = {"adds": len(to_add), "deletes": len(to_delete), "updates": len(to_update),
+               "missing_cards": len(missing), "created": 0}
+    if dry_run:
+        print("Tørkørsel: ingen ændringer sendt til ACCT")
+        summary["http"] = client.stats()
+        return summary
+
+    # 3) Opret manglende (POST'es med GROUP_ID, så de er medlemmer med det samme).
+    # UserID'erne fra svarene foldes ind i diff og plan — ingen ny eksport af gruppen.
+    if create_missing and missing:
+        results = await _gather_ordered(
+            lambda c: create_user(client, c, rasmus[c]["name"], rasmus[c]["pid"]), missing)
+        created = {"created": [], "user_ids": {}, "already_exists": [], "errors": []}
+        for c, (ok, info) in results:
+            if ok:
+                created["created"].append(c)
+                created["user_ids"][c] = info
+                if info:
+                    cache.put(c, info)
+                else:
+                    cache.invalidate_card(c)
+            elif info == "already_exists":
+                created["already_exists"].append(c)
+                cache.invalidate_card(c)
+            else:
+                created["errors"].append({"card": c, "error": info})
+        summary["created"] = len(created["created"])
+        print(f"Oprettet: {summary['created']}  | Fejl: {len(created['errors'])}")
+        if created["errors"]:
+            Path("create_user_errors.json").write_text(
+                json.dumps(created["errors"], indent=2, ensure_ascii=False), encoding="utf-8")
+
+        diff = {"to_add": to_add, "to_delete": to_delete, "to_update": to_update, "missing": missing}
+        cm.fold_into_diff(created, diff, group_by_card,
+                          await resolve_cards(client, cm.cards_to_resolve(created), cache))
+        cache.flush()
+        to_add, missing = diff["to_add"], diff["missing"]
+        mrd.write_diff_outputs(to_add, to_delete, to_update, missing)
+        plan = planner.build_plan(dedupe(to_add), dedupe(to_delete), dedupe(to_update))
+        planner.write_plan(plan)
+        planner.print_summary(plan)
+        summary.update(adds=len(to_add), missing_cards=len(missing))
+
+    # 4) Anvend planen — faserne efter hinanden, brugerne i hver fase samtidig.
+    # add_update-brugere får én PUT i ADD-fasen; resultatet genbruges i UPD-fasen.
+    remove = remove_user_from_group if cs.DELETE_STRATEGY == "group_only" else delete_user
+    # Bekræftede ops journaliseres, så et genforsøg af samme (afbrudte) plan springer dem over.
+    merged = set(planner.plan_ids(plan, "add_update"))
+    journal = apply_journal.open_for(plan)
+    completed = False
+
+    async def add_op(u):
+        if u in merged:
+            return await set_entry_remaining(client, u, "1", add_groups=(cs.GROUP_ID,))
+        return await add_user_to_group(client, u)
+
+    try:
+        add_res = await _gather_ordered(apply_journal.ajournaled(add_op, journal, "add"),
+                                        planner.plan_ids(plan, "add", "add_update"))
+        del_res = await _gather_ordered(apply_journal.ajournaled(lambda u: remove(client, u), journal, "remove"),
+                                        planner.plan_ids(plan, "remove"))
+        done = {u: res for u, res in add_res if u in merged}
+        update = apply_journal.ajournaled(lambda u: set_entry_remaining(client, u, "1"), journal, "update")
+
+        async def upd_op(u):
+            return done[u] if u in done else await update(u)
+
+        upd_res = await _gather_ordered(upd_op, planner.plan_ids(plan, "update", "add_update"))
+        completed = True
+    finally:
+        if journal is not None:
+            journal.close(clear=completed)
+    if cs.VERIFY.batch:
+        # gen-tjek af afvigere bruger den synkrone klient i en worker-tråd
+        add_res, del_res, upd_res = await asyncio.to_thread(cs.verify_batch, add_res, del_res, upd_res)
+    try:
+        summary.update(cs.report_results(invalidating(add_res, cache), invalidating(del_res, cache),
+                                         invalidating(upd_res, cache)))
+    finally:
+        cache.flush()
+        cs.save_entry_modes()
+    # post-state til næste inkrementelle kørsel; gruppen hentes kun igen hvis noget blev ændret
+    changed = summary["created"] or add_res or del_res or upd_res
+    try:
+        await asyncio.to_thread(mrd.commit_sync_state, None if changed else group_by_card, set(rasmus))
+    except (requests.RequestException, ET.ParseError, OSError, ValueError) as e:
+        print(f"⚠️  Kunne ikke gemme sync-tilstand ({e}) — næste kørsel laver fuld diff")
+    summary["http"] = client.stats()
+    return summary
+
+
+def run(create_missing: bool = True, dry_run: bool = False, rasmus_changed: bool | None = None) -> dict:
+    """Synkron indgang (fx fra main.entry_point)."""
+    return asyncio.run(run_pipeline(create_missing=create_missing, dry_run=dry_run, rasmus_changed=rasmus_changed))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Async diff → opret → anvend mod ACCT")
+    ap.add_argument("--create-missing", "--opret-manglende", action="store_true")
+    ap.add_argument("--dry-run", "--tørkørsel", action="store_true")
+    args = ap.parse_args()
+    run(create_missing=args.create_missing, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end benchmark: hele synk'en (Rasmus → gruppe → diff → opret → plan →
+anvend) mod en lokal fake-ACCT (benchmarks.fake_acct) med syntetiske kataloger.
+
+Pr. katalogstørrelse startes fake-serveren i sin egen proces, og synk'en køres
+--runs gange i træk i friske worker-processer med samme arbejdsmappe: første
+kørsel er "kold" (alt churn skal anvendes, tomme caches), de næste er "varme"
+(intet ændret — tester betingede downloads, inkrementel diff og caches).
+
+Rapporterer pr. kørsel: sekunder, kørsler/sekund, ACCT-kald i alt og pr.
+bruger, genforsøg, peak RSS (worker-processens ru_maxrss) og anvendte ændringer.
+Tallene er baseline for performance-ændringer; gem dem med --json.
+
+Kør fra repo-roden:
+  python -m benchmarks.bench_e2e [--users 1000,10000,50000] [--runs 2] [--churn 0.05]
+      [--latency 0.002] [--jitter 0.002] [--error-rate 0] [--throttle-rate 0]
+      [--engine threads|async] [--jobs 8] [--json bench_e2e.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_worker(base: str, group_id: str, workdir: str, engine: str, jobs: int) -> dict:
+    """Én synk i denne proces (kaldes i en frisk proces via --worker). Returnerer målingerne."""
+    import resource
+
+    os.chdir(workdir)
+    os.environ.update({
+        "ACCT_BASE": base, "ACCT_USER": "bench", "ACCT_PASS": "bench", "GROUP_ID": group_id,
+        "APPLY_JOBS": str(jobs), "USER_SNAPSHOT_FILE": "user_snapshot.json",
+    })
+    # stage-modulerne læser env ved import — derfor først nu
+    import pipeline
+    import rasmus_liste_til_csv as rl
+    from utils import metrics
+    rl.url = base.rsplit("/rest/", 1)[0] + "/sheet.csv"
+
+    t0 = time.perf_counter()
+    if engine == "async":
+        import async_pipeline
+        pipeline.stage("rasmus", rl.main)
+        summary = async_pipeline.run(create_missing=True)
+    else:
+        summary = pipeline.run(create_missing=True, write_artifacts=False)
+    seconds = time.perf_counter() - t0
+
+    rep = metrics.report()
+    acct = {k: v for k, v in rep["http"].items() if "/rest/" in k}
+    return {
+        "seconds": round(seconds, 3),
+        "acct_requests": sum(v["count"] for v in acct.values()),
+        "retries": sum(v["retries"] for v in acct.values()),
+        "bytes_in": sum(v["bytes_in"] for v in acct.values()),
+        "maxrss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": rep["stages"],
+        "changes": {k: summary.get(k, 0) for k in ("created", "added", "deleted", "updated",
+                                                    "add_errors", "delete_errors", "update_errors")},
+    }
+
+
+def start_server(n_users: int, args) -> tuple[subprocess.Popen, str, str]:
+    cmd = [sys.executable, "-m", "benchmarks.fake_acct", "--users", str(n_users), "--churn", str(args.churn),
+           "--latency", str(args.latency), "--jitter", str(args.jitter),
+           "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate)]
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline().split()
+    if len(line) != 3 or line[0] != "LISTENING":
+        proc.kill()
+        raise RuntimeError(f"fake_acct startede ikke: {line}")
+    return proc, line[1], line[2]
+
+
+def bench_size(n_users: int, args, tmp: Path) -> list[dict]:
+    proc, base, group_id = start_server(n_users, args)
+    workdir = tmp / f"users_{n_users}"
+    workdir.mkdir()
+    rows = []
+    try:
+        for i in range(args.runs):
+            result_file = workdir / "result.json"
+            with (workdir / f"run_{i + 1}.log").open("w", encoding="utf-8") as log:
+                subprocess.run([sys.executable, "-m", "benchmarks.bench_e2e", "--worker", base, group_id,
+                                str(workdir), "--engine", args.engine, "--jobs", str(args.jobs)],
+                               cwd=REPO_ROOT, stdout=log, stderr=subprocess.STDOUT, check=True)
+            res = json.loads(result_file.read_text(encoding="utf-8"))
+            res.update(users=n_users, run=i + 1, kind="kold" if i == 0 else "varm",
+                       runs_per_s=round(1 / res["seconds"], 3) if res["seconds"] else None,
+                       requests_per_user=round(res["acct_requests"] / n_users, 2))
+            rows.append(res)
+            print_row(res)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return rows
+
+
+def print_header() -> None:
+    print(f"{'brugere':>8} {'kørsel':>7} {'sek':>8} {'kørsler/s':>9} {'ACCT-kald':>9} {'kald/bruger':>11} "
+          f"{'genforsøg':>9} {'peak MB':>8}  ændringer")
+
+
+def print_row(r: dict) -> None:
+    c = r["changes"]
+    print(f"{r['users']:>8} {r['kind']:>7} {r['seconds']:>8.2f} {r['runs_per_s']:>9.3f} {r['acct_requests']:>9} "
+          f"{r['requests_per_user']:>11.2f} {r['retries']:>9} {r['maxrss_mb']:>8.1f}  "
+          f"+{c['added']} -{c['deleted']} ~{c['updated']} ny {c['created']} "
+          f"fejl {c['add_errors'] + c['delete_errors'] + c['update_errors']}", flush=True)
+
+
+def main(argv: list[str] | None = None) -> list[dict]:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--users", default="1000,10000,50000", help="kommasepareret liste af katalogstørrelser")
+    ap.add_argument("--runs", type=int, default=2, help="kørsler i træk pr. størrelse (første er kold)")
+    ap.add_argument("--churn", type=float, default=0.05)
+    ap.add_argument("--latency", type=float, default=0.002)
+    ap.add_argument("--jitter", type=float, default=0.002)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--engine", choices=("threads", "async"), default="threads")
+    ap.add_argument("--jobs", type=int, default=8)
+    ap.add_argument("--json", default=None, help="gem alle rækker som JSON")
+    ap.add_argument("--worker", nargs=3, metavar=("BASE", "GROUP_ID", "WORKDIR"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.worker:
+        base, group_id, workdir = args.worker
+        res = run_worker(base, group_id, workdir, args.engine, args.jobs)
+        Path(workdir, "result.json").write_text(json.dumps(res), encoding="utf-8")
+        return [res]
+
+    sizes = [int(s) for s in args.users.split(",") if s.strip()]
+    print(f"fake-ACCT: latens {args.latency * 1000:.1f}+{args.jitter * 1000:.1f} ms, 503 {args.error_rate:.1%}, "
+          f"429 {args.throttle_rate:.1%}, churn {args.churn:.0%}, motor {args.engine}, jobs {args.jobs}")
+    print_header()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            rows += bench_size(n, args, Path(tmp))
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Skrev {args.json}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_parse_users.py
+"""
+Sammenlign den gamle Card→UserID-parser (root.iter() + _find_first_text pr. node)
+med utils.xml_utils.parse_card_userid_map (ét gennemløb) på et syntetisk svar.
+
+Kør fra repo-roden:  python -m benchmarks.bench_parse_users [--users 10000] [--repeat 3]
+"""
+import argparse
+import time
+import xml.etree.ElementTree as ET
+
+from utils.xml_utils import parse_card_userid_map
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+XSI = "http://www.w3.org/2001/XMLSchema-instance"
+BASE = "https://test.acct.dk/rest/current"
+
+
+def make_collection(n: int) -> bytes:
+    rows = [f'<UserCollection xmlns="{NS}" xmlns:i="{XSI}">']
+    for i in range(n):
+        rows.append(
+            "<User>"
+            f"<Card>{1000000000 + i}</Card><CardPin i:nil=\"true\"/>"
+            f"<EntryRemaining>{i % 3}</EntryRemaining>"
+            f"<Groups>{BASE}/users/{i:08d}-0000-0000-0000-000000000000/groups</Groups>"
+            f"<Name>Bruger {i}</Name><Pid i:nil=\"true\"/>"
+            f"<UserID>{BASE}/users/{i:08d}-0000-0000-0000-000000000000</UserID>"
+            "<UType>Normal</UType>"
+            "</User>"
+        )
+    rows.append("</UserCollection>")
+    return "".join(rows).encode("utf-8")
+
+
+# --- reference: parseren som den så ud før (member_rasmus_diff) ---
+def _local(tag: str) -> str:
+    return tag.split("}", 1)[-1] if "}" in tag else tag
+
+
+def _find_first_text(node, local_names) -> str:
+    for el in node.iter():
+        if _local(el.tag).lower() in {n.lower() for n in local_names}:
+            return (el.text or "").strip()
+    return ""
+
+
+def legacy_parse(xml_bytes: bytes) -> dict:
+    out = {}
+    root = ET.fromstring(xml_bytes)
+    for node in root.iter():
+        card = _find_first_text(node, {"Card"})
+        if not card:
+            continue
+        uid = _find_first_text(node, {"UserID", "UserId", "Guid", "ID", "Id"})
+        if card and uid:
+            out[card] = uid
+    return out
+
+
+def _best(fn, data, repeat: int) -> tuple[float, dict]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(data)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--users", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    data = make_collection(args.users)
+    print(f"Svar: {args.users} brugere, {len(data) / 1e6:.1f} MB")
+
+    t_old, r_old = _best(legacy_parse, data, args.repeat)
+    t_new, r_new = _best(parse_card_userid_map, data, args.repeat)
+    assert r_old == r_new, "parserne er uenige"
+
+    print(f"legacy (root.iter + _find_first_text): {t_old * 1000:8.1f} ms")
+    print(f"parse_card_userid_map (ét gennemløb):  {t_new * 1000:8.1f} ms")
+    print(f"speedup: {t_old / t_new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
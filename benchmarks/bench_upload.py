@@ -0,0 +1,85 @@
+# benchmarks/bench_upload.py
+"""
+Sammenlign den gamle upload (én fil ad gangen, ukomprimeret, ny prefix pr. kørsel)
+med utils.artifact_store (parallelt, gzip, dedup) mod et lokalt backend med
+simuleret latency pr. kald.
+
+Kør fra repo-roden:  python -m benchmarks.bench_upload [--rows 20000] [--latency 0.05] [--runs 2]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from utils.artifact_store import LocalBackend, upload_artifacts
+
+
+class SlowBackend(LocalBackend):
+    """LocalBackend med fast latency pr. kald (som et round-trip til GCS)."""
+
+    def __init__(self, root, latency: float):
+        super().__init__(root)
+        self.latency = latency
+        self.bytes_sent = 0
+
+    def exists(self, key):
+        time.sleep(self.latency)
+        return super().exists(key)
+
+    def put(self, key, data, content_type, content_encoding=None):
+        time.sleep(self.latency)
+        self.bytes_sent += len(data)
+        super().put(key, data, content_type, content_encoding)
+
+
+def make_files(root: Path, rows: int) -> list[str]:
+    (root / "group_members.csv").write_text(
+        "Card,Name,UserID,EntryRemaining\n" + "".join(
+            f"{1000000 + i},Bruger {i},{i:08d}-0000-0000-0000-000000000000,{i % 2}\n" for i in range(rows)),
+        encoding="utf-8")
+    (root / "rasmus-liste.csv").write_text(
+        "Card,Name\n" + "".join(f"{1000000 + i},Bruger {i}\n" for i in range(rows)), encoding="utf-8")
+    for name in ("to_add.json", "to_delete.json", "to_update.json", "apply_plan.json", "acct_http_stats.json"):
+        (root / name).write_text('{"ids": []}', encoding="utf-8")
+    return [str(p) for p in sorted(root.iterdir())]
+
+
+def legacy_upload(backend: SlowBackend, files: list[str], run_id: str) -> None:
+    for f in files:
+        backend.put(f"logs/{run_id}/{Path(f).name}", Path(f).read_bytes(), "text/plain")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--runs", type=int, default=2, help="kørsler i træk med uændrede filer")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src = tmp / "src"
+        src.mkdir()
+        files = make_files(src, args.rows)
+        print(f"{len(files)} filer, {sum(Path(f).stat().st_size for f in files) / 1e6:.1f} MB, "
+              f"latency {args.latency * 1000:.0f} ms/kald, {args.runs} kørsler")
+
+        old = SlowBackend(tmp / "old", args.latency)
+        t0 = time.perf_counter()
+        for i in range(args.runs):
+            legacy_upload(old, files, f"run{i}")
+        t_old = time.perf_counter() - t0
+
+        new = SlowBackend(tmp / "new", args.latency)
+        t0 = time.perf_counter()
+        for i in range(args.runs):
+            upload_artifacts(files, new, run_id=f"run{i}")
+        t_new = time.perf_counter() - t0
+
+    print(f"sekventiel, ukomprimeret:  {t_old:6.2f} s  {old.bytes_sent / 1e6:6.2f} MB sendt")
+    print(f"parallel, gzip, dedup:     {t_new:6.2f} s  {new.bytes_sent / 1e6:6.2f} MB sendt")
+    print(f"speedup: {t_old / t_new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# benchmarks/fake_acct.py
+"""
+Lokal stand-in for ACCT's REST-API (og Rasmus-arket) til end-to-end benchmarks.
+
+Implementerer de endpoints synk'en bruger, med DataContract-XML som ACCT:
+  GET    /rest/current/users[?card=]          UserCollection (alle / filtreret på kort)
+  POST   /rest/current/users                  opret fra <UserData> → 201 + Location (409 hvis kortet findes)
+  GET    /rest/current/users/{guid}           <User> (404 ukendt)
+  GET    /rest/current/users/card/{card}      <User> (404 ukendt)
+  PUT    /rest/current/users/{guid}           erstat Card/Name/EntryRemaining/Groups fra <UserData>
+  DELETE /rest/current/users/{guid}           slet brugeren
+  GET    /rest/current/users/{guid}/groups    ArrayOfstring med …/groups/{id}
+  GET    /rest/current/groups/{id}/users      UserCollection med gruppens medlemmer
+  DELETE /rest/current/groups/{id}/users/{guid}  afmeld (404 hvis ikke medlem)
+  GET    /sheet.csv                           Rasmus-listen (ETag/304 som Sheets-eksporten)
+  GET    /_stats                              antal kald pr. metode/endpoint (JSON)
+
+Latens (fast + jitter) og fejl (503 / 429 med Retry-After) kan injiceres pr.
+ACCT-kald. Serveren er trådet og taler HTTP/1.1 keep-alive, så klientens
+connection pool bruges som mod det rigtige ACCT.
+
+Syntetisk katalog (make_directory): N brugere; en del er medlem af gruppen,
+Rasmus-listen overlapper så der er kort at tilføje, slette, nulstille
+(EntryRemaining=0) og oprette (--churn styrer andelen).
+
+Kør selvstændigt:  python -m benchmarks.fake_acct --users 1000 [--port 8099] [--latency 0.005]
+(udskriver "LISTENING <base-url> <group-id>" når den er klar)
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+XSI = "http://www.w3.org/2001/XMLSchema-instance"
+ARR = "http://schemas.microsoft.com/2003/10/Serialization/Arrays"
+PREFIX = "/rest/current"
+GROUP_ID = "e9d39db7-b38f-43db-bfe1-d9a3a8f4b177"
+OTHER_GROUPS = ("11111111-0000-0000-0000-000000000001", "11111111-0000-0000-0000-000000000002")
+
+_GUID = r"[0-9a-fA-F-]{36}"
+_ROUTES = [
+    ("GET", re.compile(rf"^/users/({_GUID})/groups$"), "user_groups"),
+    ("GET", re.compile(r"^/users/card/([^/]+)$"), "user_by_card"),
+    ("GET", re.compile(r"^/users/([^/]+)$"), "user"),
+    ("GET", re.compile(r"^/users$"), "users"),
+    ("POST", re.compile(r"^/users$"), "create"),
+    ("PUT", re.compile(rf"^/users/({_GUID})$"), "put_user"),
+    ("DELETE", re.compile(rf"^/users/({_GUID})$"), "delete_user"),
+    ("GET", re.compile(rf"^/groups/({_GUID})/users$"), "group_users"),
+    ("DELETE", re.compile(rf"^/groups/({_GUID})/users/({_GUID})$"), "leave_group"),
+]
+
+
+class FakeAcct:
+    """Katalogets tilstand (trådsikker) + Rasmus-listen."""
+
+    def __init__(self, group_id: str = GROUP_ID):
+        self.group_id = group_id
+        self.users: dict[str, dict] = {}     # guid -> {"card", "name", "entry", "groups"}
+        self.by_card: dict[str, str] = {}
+        self.rasmus: list[tuple[str, str]] = []  # (card, name)
+        self.lock = threading.Lock()
+        self.calls: dict[str, int] = {}
+        self.base = ""  # sættes af serveren (bruges i UserID-URI'er)
+
+    # ----- tilstand -----
+    def add_user(self, card: str, name: str, entry: str | None = "1", groups=()) -> str:
+        guid = str(uuid.UUID(bytes=hashlib.md5(card.encode()).digest()))
+        self.users[guid] = {"card": card, "name": name, "entry": entry, "groups": set(groups)}
+        self.by_card[card] = guid
+        return guid
+
+    def rasmus_csv(self) -> bytes:
+        return ("Card,Name\n" + "".join(f"{c},{n}\n" for c, n in self.rasmus)).encode("utf-8")
+
+    # ----- XML -----
+    def user_xml(self, guid: str, u: dict) -> str:
+        entry = ('<EntryRemaining i:nil="true"/>' if u["entry"] is None
+                 else f"<EntryRemaining>{escape(u['entry'])}</EntryRemaining>")
+        return ("<User>"
+                f"<Card>{escape(u['card'])}</Card><CardPin i:nil=\"true\"/>{entry}"
+                f"<Groups>{self.base}/users/{guid}/groups</Groups>"
+                f"<Name>{escape(u['name'])}</Name><Pid i:nil=\"true\"/>"
+                f"<UserID>{self.base}/users/{guid}</UserID><UType>Normal</UType>"
+                "</User>")
+
+    def single_xml(self, guid: str) -> bytes:
+        body = self.user_xml(guid, self.users[guid]).replace("<User>", f'<User xmlns="{NS}" xmlns:i="{XSI}">', 1)
+        return body.encode("utf-8")
+
+    def collection_xml(self, guids) -> bytes:
+        return (f'<UserCollection xmlns="{NS}" xmlns:i="{XSI}">'
+                + "".join(self.user_xml(g, self.users[g]) for g in guids)
+                + "</UserCollection>").encode("utf-8")
+
+    def groups_xml(self, guid: str) -> bytes:
+        return (f'<ArrayOfstring xmlns="{ARR}">'
+                + "".join(f"<string>{self.base}/groups/{g}</string>" for g in sorted(self.users[guid]["groups"]))
+                + "</ArrayOfstring>").encode("utf-8")
+
+    @staticmethod
+    def parse_userdata(body: bytes) -> dict:
+        """<UserData> → felter; manglende EntryRemaining = nil, manglende Groups = uændret."""
+        root = ET.fromstring(body)
+        out = {"entry": None}
+        for el in root:
+            tag = el.tag.split("}", 1)[-1]
+            if tag == "Card":
+                out["card"] = (el.text or "").strip()
+            elif tag == "Name":
+                out["name"] = (el.text or "").strip()
+            elif tag == "EntryRemaining":
+                nil = el.attrib.get(f"{{{XSI}}}nil", "").lower() == "true"
+                out["entry"] = None if nil else (el.text or "").strip() or None
+            elif tag == "Groups":
+                out["groups"] = {(s.text or "").strip().rsplit("/", 1)[-1] for s in el if (s.text or "").strip()}
+        return out
+
+    # ----- endpoints: (status, body, headers) -----
+    def handle(self, method: str, path: str, query: dict, body: bytes):
+        for m, rx, name in _ROUTES:
+            if m == method:
+                hit = rx.match(path)
+                if hit:
+                    with self.lock:
+                        self.calls[f"{method} {name}"] = self.calls.get(f"{method} {name}", 0) + 1
+                        return getattr(self, f"_{name}")(*hit.groups(), query=query, body=body)
+        return 404, b"", {}
+
+    def _users(self, query, body):
+        card = (query.get("card") or [None])[0]
+        if card is None:
+            return 200, self.collection_xml(list(self.users)), {}
+        guid = self.by_card.get(card)
+        return 200, self.collection_xml([guid] if guid else []), {}
+
+    def _user(self, guid, query, body):
+        return (200, self.single_xml(guid), {}) if guid in self.users else (404, b"", {})
+
+    def _user_by_card(self, card, query, body):
+        guid = self.by_card.get(card)
+        return (200, self.single_xml(guid), {}) if guid else (404, b"", {})
+
+    def _user_groups(self, guid, query, body):
+        return (200, self.groups_xml(guid), {}) if guid in self.users else (404, b"", {})
+
+    def _group_users(self, gid, query, body):
+        return 200, self.collection_xml([g for g, u in self.users.items() if gid in u["groups"]]), {}
+
+    def _create(self, query, body):
+        data = self.parse_userdata(body)
+        card = data.get("card", "")
+        if not card:
+            return 400, b"Card mangler", {}
+        if card in self.by_card:
+            return 409, b"Card findes allerede", {}
+        guid = self.add_user(card, data.get("name") or card, data["entry"], data.get("groups", ()))
+        return 201, b"", {"Location": f"{self.base}/users/{guid}"}
+
+    def _put_user(self, guid, query, body):
+        u = self.users.get(guid)
+        if u is None:
+            return 404, b"", {}
+        data = self.parse_userdata(body)
+        if data.get("card") and data["card"] != u["card"]:
+            self.by_card.pop(u["card"], None)
+            self.by_card[data["card"]] = guid
+            u["card"] = data["card"]
+        u["name"] = data.get("name") or u["name"]
+        u["entry"] = data["entry"]
+        if "groups" in data:
+            u["groups"] = data["groups"]
+        return 204, b"", {}
+
+    def _delete_user(self, guid, query, body):
+        u = self.users.pop(guid, None)
+        if u is None:
+            return 404, b"", {}
+        self.by_card.pop(u["card"], None)
+        return 204, b"", {}
+
+    def _leave_group(self, gid, guid, query, body):
+        u = self.users.get(guid)
+        if u is None or gid not in u["groups"]:
+            return 404, b"", {}
+        u["groups"].discard(gid)
+        return 204, b"", {}
+
+
+def make_directory(n_users: int, churn: float = 0.05, seed: int = 1, group_id: str = GROUP_ID) -> FakeAcct:
+    """
+    Syntetisk katalog med n_users brugere. Med k = churn * n_users:
+      - brugerne [0, 0.6n) er medlemmer af gruppen, resten ikke
+      - Rasmus-listen er [k, 0.6n + k) + k nye kort → k at slette, k at tilføje, k at oprette
+      - k medlemmer på listen har EntryRemaining=0 → k at nulstille
+    """
+    rng = random.Random(seed)
+    fake = FakeAcct(group_id)
+    members = int(n_users * 0.6)
+    k = max(1, int(n_users * churn))
+    cards = [str(1_000_000_000 + i) for i in range(n_users)]
+    for i, card in enumerate(cards):
+        groups = {group_id} if i < members else set()
+        if rng.random() < 0.3:
+            groups.add(rng.choice(OTHER_GROUPS))
+        entry = "0" if k <= i < 2 * k else "1"
+        fake.add_user(card, f"Bruger {i}", entry, groups)
+    listed = cards[k:members + k] + [str(2_000_000_000 + i) for i in range(k)]
+    fake.rasmus = [(c, f"Svømmer {c[-6:]}") for c in listed]
+    return fake
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeAcctServer"
+
+    def _serve(self, method: str):
+        srv = self.server
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        headers = {}
+        if parts.path == "/sheet.csv":
+            data = srv.fake.rasmus_csv()
+            etag = '"%s"' % hashlib.sha1(data).hexdigest()[:16]
+            if self.headers.get("If-None-Match") == etag:
+                status, data = 304, b""
+            else:
+                status, headers = 200, {"Content-Type": "text/csv; charset=utf-8"}
+            headers["ETag"] = etag
+        elif parts.path == "/_stats":
+            with srv.fake.lock:
+                status, data = 200, json.dumps(srv.fake.calls).encode("utf-8")
+        elif parts.path.startswith(PREFIX):
+            if srv.latency or srv.jitter:
+                time.sleep(srv.latency + srv.rng.uniform(0, srv.jitter))
+            roll = srv.rng.random()
+            if roll < srv.error_rate:
+                status, data, headers = 503, b"Service Unavailable", {"Retry-After": "0"}
+            elif roll < srv.error_rate + srv.throttle_rate:
+                status, data, headers = 429, b"Too Many Requests", {"Retry-After": "0"}
+            else:
+                status, data, headers = srv.fake.handle(method, parts.path[len(PREFIX):] or "/",
+                                                        parse_qs(parts.query), body)
+                if data and "Content-Type" not in headers:
+                    headers["Content-Type"] = "application/xml; charset=utf-8"
+        else:
+            status, data = 404, b""
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def do_PUT(self):
+        self._serve("PUT")
+
+    def do_DELETE(self):
+        self._serve("DELETE")
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeAcctServer(ThreadingHTTPServer):
+    """Trådet HTTP-server om en FakeAcct; brug som context manager (kører i en baggrundstråd)."""
+    daemon_threads = True
+
+    def __init__(self, fake: FakeAcct, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0, seed: int = 1):
+        super().__init__((host, port), _Handler)
+        self.fake = fake
+        self.latency, self.jitter = latency, jitter
+        self.error_rate, self.throttle_rate = error_rate, throttle_rate
+        self.rng = random.Random(seed)
+        self.root = f"http://{host}:{self.server_port}"
+        self.base = fake.base = self.root + PREFIX
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> "FakeAcctServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Lokal fake-ACCT til benchmarks")
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--churn", type=float, default=0.05)
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--latency", type=float, default=0.0, help="fast latens pr. ACCT-kald i sekunder")
+    ap.add_argument("--jitter", type=float, default=0.0, help="ekstra tilfældig latens [0, jitter] sekunder")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="andel kald der får 503")
+    ap.add_argument("--throttle-rate", type=float, default=0.0, help="andel kald der får 429")
+    args = ap.parse_args(argv)
+    fake = make_directory(args.users, args.churn)
+    srv = FakeAcctServer(fake, port=args.port, latency=args.latency, jitter=args.jitter,
+                         error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    print(f"LISTENING {srv.base} {fake.group_id}", flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 # build_members_csv.py
 import csv
 import xml.etree.ElementTree as ET
-import requests
-from requests.auth import HTTPBasicAuth
+from utils import acct_client
+from utils import snapshot
+from utils.xml_utils import iter_elements
 import os
 ACCT_BASE = os.getenv("ACCT_BASE", "https://test.acct.dk/rest/current")
 ACCT_USER = os.getenv("ACCT_USER", "")
@@ -15,10 +16,9 @@ NS = {
     "n": "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary",
     "i": "http://www.w3.org/2001/XMLSchema-instance",
 }
-auth = HTTPBasicAuth(ACCT_USER, ACCT_PASS)
 
 def get_xml(url: str) -> ET.Element:
-    r = requests.get(url, auth=auth, headers={"Accept": "application/xml"}, timeout=30)
+    r = acct_client.get(url)
     r.raise_for_status()
     return ET.fromstring(r.text)
 
@@ -38,40 +38,98 @@ def get_entry_remaining(user_el: ET.Element) -> str:
     value = (er.text or "").strip()
     return value if value else "0"
 
+def parse_user(u: ET.Element):
+    user_id_uri = (u.findtext("n:UserID", default="", namespaces=NS) or "").strip()
+    guid = user_id_uri.rsplit("/", 1)[-1] if user_id_uri else ""
+    if not guid:
+        return None
+    return {
+        "guid": guid,
+        "card": (u.findtext("n:Card", default="", namespaces=NS) or "").strip(),
+        "name": (u.findtext("n:Name", default="", namespaces=NS) or "").strip(),
+        "entry_remaining": get_entry_remaining(u)
+    }
+
 def parse_users(xml_root: ET.Element):
     users = []
     for u in xml_root.findall("n:User", NS):
-        user_id_uri = (u.findtext("n:UserID", default="", namespaces=NS) or "").strip()
-        guid = user_id_uri.rsplit("/", 1)[-1] if user_id_uri else ""
-        card = (u.findtext("n:Card", default="", namespaces=NS) or "").strip()
-        name = (u.findtext("n:Name", default="", namespaces=NS) or "").strip()
-        entry_remaining = get_entry_remaining(u)
-        if guid:
-            users.append({
-                "guid": guid,
-                "card": card,
-                "name": name,
-                "entry_remaining": entry_remaining
-            })
+        rec = parse_user(u)
+        if rec:
+            users.append(rec)
     return users
 
-def main():
-    print(" Henter gruppens medlemmer…")
-    group_users_root = get_xml(f"{ACCT_BASE}/groups/{GROUP_ID}/users")
-    group_users = parse_users(group_users_root)
-    print(f"• Fundet {len(group_users)} medlemmer i gruppen")
+def stream_users(url: str, handle=parse_user):
+    """Streamer <User>-records fra en collection uden at holde hele svaret i hukommelsen."""
+    with acct_client.get(url, stream=True) as r:
+        r.raise_for_status()
+        yield from iter_elements(r.iter_content(chunk_size=64 * 1024), f"{{{NS['n']}}}User", handle)
+
+CSV_HEADER = ["Card", "Name", "UserID", "EntryRemaining"]
 
+def member_row(u: dict) -> list[str]:
+    return [u["card"], u["name"], u["guid"], u["entry_remaining"]]
+
+def write_members_csv(users, path: str = OUTPUT_CSV) -> int:
+    """Skriv Card,Name,UserID,EntryRemaining for medlemmer med Card. Returnerer antal rækker."""
     wrote = 0
-    with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
+    with open(path, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
-        w.writerow(["Card", "Name", "UserID", "EntryRemaining"])
-        for u in group_users:
+        w.writerow(CSV_HEADER)
+        for u in users:
             if not u["card"]:
                 continue
-            w.writerow([u["card"], u["name"], u["guid"], u["entry_remaining"]])
+            w.writerow(member_row(u))
             wrote += 1
+    return wrote
+
+def members_by_card(users) -> dict[str, dict[str, str]]:
+    """{Card: {"UserID", "EntryRemaining"}} — samme form som member_rasmus_diff.load_group_members."""
+    return {u["card"]: {"UserID": u["guid"], "EntryRemaining": u["entry_remaining"]}
+            for u in users if u["card"]}
+
+def _group_users():
+    """Streamer gruppens medlemmer; felterne gemmes undervejs i kørslens snapshot."""
+    snap = snapshot.shared()
+    yield from stream_users(f"{ACCT_BASE}/groups/{GROUP_ID}/users", snapshot.recording(parse_user, snap))
+    snap.save()
+
+def export_group_members(path: str = OUTPUT_CSV) -> int:
+    """Skriv gruppens medlemmer direkte fra streamen til path; intet holdes i hukommelsen."""
+    print(" Henter gruppens medlemmer…")
+    wrote = write_members_csv(_group_users(), path)
+    print(f" Skrev {wrote} medlemmer til {path}")
+    return wrote
+
+def fetch_group_members(write: bool = True) -> dict[str, dict[str, str]]:
+    """
+    Hent gruppens medlemmer som members_by_card-dict (kun de felter diff'en bruger).
+    Felterne gemmes også i kørslens snapshot, så changing_state_of_group kan
+    springe GET /users/{guid} over; write=True skriver desuden group_members.csv
+    række for række mens der streames.
+    """
+    print(" Henter gruppens medlemmer…")
+    by_card: dict[str, dict[str, str]] = {}
+    seen = 0
+
+    def collect():
+        nonlocal seen
+        for u in _group_users():
+            seen += 1
+            if u["card"]:
+                by_card[u["card"]] = {"UserID": u["guid"], "EntryRemaining": u["entry_remaining"]}
+            yield u
 
-    print(f" Skrev {wrote} medlemmer til {OUTPUT_CSV}")
+    if write:
+        wrote = write_members_csv(collect())
+        print(f" Skrev {wrote} medlemmer til {OUTPUT_CSV}")
+    else:
+        for _ in collect():
+            pass
+    print(f"• Fundet {seen} medlemmer i gruppen")
+    return by_card
+
+def main():
+    export_group_members()
 
 if __name__ == "__main__":
     main()
@@ -1,11 +1,21 @@
 # changing_state_of_group.py
 import sys, os
+import argparse
 import json
 import csv
+import threading
+import time
 from pathlib import Path
 import requests
-from requests.auth import HTTPBasicAuth
 import xml.etree.ElementTree as ET
+import build_members_csv
+from plan_operations import build_plan, load_plan, plan_ids, print_summary, subplan, write_plan
+from utils import acct_client, apply_journal
+from utils.card_cache import CardCache, invalidating
+from utils.concurrency import dedupe, jobs_from_env, run_bounded
+from utils.deadline import DEFERRED, Deadline, guarded
+from utils import snapshot
+from utils.verification import policy_from_env
 from utils.xml_utils import sort_children_alphabetically
 
 NS_USERDATA = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
@@ -21,6 +31,9 @@ ET.register_namespace("i", NS_XSI)
 ET.register_namespace("arr", NS_ARR)
 
 DELETE_STRATEGY = os.getenv("DELETE_STRATEGY", "group_only")  # "group_only" | "delete_user"
+VERIFY = policy_from_env()  # "per_op" | "sampled(N%)" | "batch" | "none", se utils/verification.py
+# brugere en deadline nåede at udskyde, som plan til næste kørsel (--plan), se utils/deadline.py
+REMAINING_PLAN_FILE = os.getenv("APPLY_REMAINING_FILE", "apply_plan.remaining.json")
 
 # --- ACCT config ---
 ACCT_BASE = os.getenv("ACCT_BASE", "https://test.acct.dk/rest/current")
@@ -28,8 +41,6 @@ ACCT_USER = os.getenv("ACCT_USER", "")
 ACCT_PASS = os.getenv("ACCT_PASS", "")
 GROUP_ID  = os.getenv("GROUP_ID", "")
 
-auth = HTTPBasicAuth(ACCT_USER, ACCT_PASS)
-
 # ---------- helpers ----------
 def load_ids_from_json_or_csv(path: Path):
     if not path.exists():
@@ -96,7 +107,7 @@ def _parse_group_ids_from_xml(xml_text: str) -> list[str]:
 def _get_user_groups(user_guid: str) -> list[str]:
     url = f"{ACCT_BASE}/users/{user_guid}/groups"
     try:
-        r = requests.get(url, auth=auth, headers={"Accept": "application/xml"}, timeout=15)
+        r = acct_client.get(url, timeout=15)
         if r.status_code != 200:
             return []
         return _parse_group_ids_from_xml(r.text)
@@ -108,66 +119,233 @@ def _lname(tag: str) -> str:
 
 def _get_card_name(user_guid: str) -> tuple[str, str]:
     url = f"{ACCT_BASE}/users/{user_guid}"
-    r = requests.get(url, auth=auth, headers={"Accept":"application/xml"}, timeout=20)
+    r = acct_client.get(url, timeout=20)
     r.raise_for_status()
-    root = ET.fromstring(r.content)
-    card = name = ""
-    for el in root:
-        t = _lname(el.tag)
-        if t == "card":
-            card = (el.text or "").strip()
-        elif t == "name":
-            name = (el.text or "").strip()
-    return card, (name or card or "")
+    cur = _parse_user_fields(r.content, user_guid)
+    return cur["card"], cur["name"]
 
-# ---------- API ops ----------
-def add_user_to_group(user_guid: str) -> tuple[bool, str | None]:
+def _parse_user_fields(content: bytes, user_guid: str) -> dict:
     """
-    Tilføj bruger til GROUP_ID uden at miste andre gruppemedlemskaber.
-    - Bevarer EntryRemaining (nil='true' eller tekst)
-    - Unionerer eksisterende grupper med GROUP_ID
-    - PUT'er minimal <UserData> (alfabetisk sorteret)
+    Læs Card/Name/EntryRemaining fra et <User>/<UserData>-svar (namespace-agnostisk).
+    Card falder tilbage til GUID og Name til Card. Kaster ET.ParseError ved ugyldig XML.
     """
-    url_user = f"{ACCT_BASE}/users/{user_guid}"
+    return _with_fallbacks(snapshot.element_fields(ET.fromstring(content)), user_guid)
+
+def _with_fallbacks(cur: dict, user_guid: str) -> dict:
+    if not cur["card"]:
+        cur["card"] = user_guid
+    if not cur["name"]:
+        cur["name"] = cur["card"]
+    return cur
 
-    # 1) Hent aktuel bruger (Card/Name/EntryRemaining)
+def _load_user(user_guid: str) -> tuple[dict | None, str | None]:
+    """
+    Card/Name/EntryRemaining for brugeren: fra kørslens snapshot hvis posten er
+    frisk, ellers GET /users/{guid}. Returnerer (cur, None), (None, "not_found")
+    ved 404 eller (None, fejltekst).
+    """
+    cached = snapshot.shared().get(user_guid)
+    if cached is not None:
+        return _with_fallbacks(cached, user_guid), None
     try:
-        g = requests.get(url_user, auth=auth, headers={"Accept": "application/xml"}, timeout=20)
+        g = acct_client.get(f"{ACCT_BASE}/users/{user_guid}", timeout=20)
         if g.status_code == 404:
-            return False, "user_not_found"
+            return None, "not_found"
         g.raise_for_status()
     except requests.RequestException as e:
-        return False, f"GET failed: {e}"
-
+        return None, f"GET failed: {e}"
     try:
-        cur = ET.fromstring(g.content)
+        return _parse_user_fields(g.content, user_guid), None
     except ET.ParseError as e:
-        return False, f"parse_error: {e}"
-
-    def lname(tag: str) -> str:
-        return tag.split("}", 1)[1].lower() if "}" in tag else tag.lower()
-
-    cur_card = ""
-    cur_name = ""
-    entry_nil = False
-    entry_text = None
-
-    for el in cur:
-        t = lname(el.tag)
-        if t == "card":
-            cur_card = (el.text or "").strip()
-        elif t == "name":
-            cur_name = (el.text or "").strip()
-        elif t == "entryremaining":
-            if el.attrib.get(f"{{{NS_XSI}}}nil", "").lower() == "true":
-                entry_nil = True
-            else:
-                entry_text = (el.text or "").strip() or None
-
-    if not cur_card:
-        cur_card = user_guid
-    if not cur_name:
-        cur_name = cur_card
+        return None, f"parse_error: {e}"
+
+def _parse_groupcollection_ids(content: bytes) -> set[str]:
+    """Fallback: GroupCollection/<GroupID>-URL'er → GUIDs."""
+    out = set()
+    try:
+        gr = ET.fromstring(content)
+    except ET.ParseError:
+        return out
+    for e in gr.iter():
+        if _lname(e.tag) == "groupid":
+            url = (e.text or "").strip()
+            if url:
+                out.add(url.rsplit("/", 1)[-1])
+    return out
+
+def _recheck_in_group(r) -> bool:
+    """Viser et /users/{guid}/groups-svar GROUP_ID? Forstår både ArrayOfstring og GroupCollection."""
+    if r.status_code != 200:
+        raise ValueError(f"groups re-check: {r.status_code}")
+    return GROUP_ID in set(_parse_group_ids_from_xml(r.text)) | _parse_groupcollection_ids(r.content)
+
+def build_userdata(card: str, name: str, groups, *,
+                   entry_nil: bool = False, entry_text: str | None = None,
+                   with_entry: bool = True, card_pin_nil: bool = False,
+                   empty_groups: bool = True) -> ET.Element:
+    """
+    Byg minimal <UserData> (alfabetisk sorteret) til PUT /users/{guid}.
+    - with_entry=False udelader <EntryRemaining/> helt
+    - card_pin_nil tilføjer <CardPin i:nil="true"/> (hjælper nogle WCF set-ups)
+    - empty_groups=False udelader <Groups/> når der ingen grupper er
+    """
+    ud = ET.Element(ET.QName(NS_MAIN, "UserData"))
+    ET.SubElement(ud, ET.QName(NS_MAIN, "Card")).text = card
+
+    if card_pin_nil:
+        el_pin = ET.SubElement(ud, ET.QName(NS_MAIN, "CardPin"))
+        el_pin.set(ET.QName(NS_XSI, "nil"), "true")
+
+    if with_entry:
+        el_entry = ET.SubElement(ud, ET.QName(NS_MAIN, "EntryRemaining"))
+        if entry_nil:
+            el_entry.set(ET.QName(NS_XSI, "nil"), "true")
+        elif entry_text is not None:
+            el_entry.text = entry_text
+
+    groups = sorted(set(groups))
+    if groups or empty_groups:
+        el_groups = ET.SubElement(ud, ET.QName(NS_MAIN, "Groups"))
+        for gid in groups:
+            ET.SubElement(el_groups, ET.QName(NS_ARR, "string")).text = gid
+
+    ET.SubElement(ud, ET.QName(NS_MAIN, "Name")).text = name or card
+    ET.SubElement(ud, ET.QName(NS_MAIN, "UType")).text = "Normal"
+
+    sort_children_alphabetically(ud)
+    return ud
+
+def _put_userdata(url_user: str, ud: ET.Element) -> tuple[bool, str | None]:
+    """PUT <UserData> med fallback uden XML-deklaration ved 400."""
+    snapshot.shared().invalidate(url_user.rsplit("/", 1)[-1])
+    put_xml = ET.tostring(ud, encoding="utf-8", xml_declaration=True)
+    try:
+        p = acct_client.put(url_user, data=put_xml, headers=acct_client.XML_BODY_HEADERS, timeout=20)
+        if p.status_code in (200, 202, 204):
+            return True, None
+        if p.status_code != 400:
+            return False, f"{p.status_code} {(p.text or '')[:200]}"
+        put_xml_no_decl = ET.tostring(ud, encoding="utf-8", xml_declaration=False)
+        p2 = acct_client.put(url_user, data=put_xml_no_decl, headers=acct_client.XML_BODY_HEADERS, timeout=20)
+        if p2.status_code not in (200, 202, 204):
+            return False, f"{p2.status_code} {(p2.text or '')[:200]}"
+    except requests.RequestException as e:
+        return False, f"PUT failed: {e}"
+    return True, None
+
+def _entry_matches(content: bytes, target: str) -> bool:
+    """True hvis <EntryRemaining> i et <User>-svar har teksten target ('1' eller '0')."""
+    NS = {"n": NS_USERDATA, "i": NS_XSI}
+    root = ET.fromstring(content)
+    er = root.find("n:EntryRemaining", NS)
+    txt = (er.text or "").strip() if er is not None else ""
+    return txt == ("1" if target == "1" else "0")
+
+# Skrive-modes i set_entry_remaining: altid tal som tekst (1 eller 0) — aldrig nil.
+# Ved target == "1" prøves til sidst helt uden elementet.
+ENTRY_PHASES = {"1": ("text", "none"), "0": ("text",)}
+
+# Verifikation efter hver PUT: første GET med det samme, derefter eksponentiel
+# backoff fra ENTRY_POLL_INITIAL indtil ENTRY_VERIFY_BUDGET sekunders ventetid er brugt.
+ENTRY_POLL_INITIAL = acct_client.env_float("ENTRY_POLL_INITIAL", 0.05)
+ENTRY_VERIFY_BUDGET = acct_client.env_float("ENTRY_VERIFY_BUDGET", 1.5)
+
+# Hvilken mode ACCT faktisk persisterede sidst, pr. target — så senere brugere går direkte til den
+# (env ENTRY_MODE_FILE; default i cwd)
+ENTRY_MODE_FILE = "entry_mode_memory.json"
+
+_entry_modes: dict[str, str] | None = None
+_entry_modes_path: str | None = None
+_entry_modes_dirty = False
+_entry_modes_lock = threading.Lock()
+
+# udskiftelig i tests
+_sleep = time.sleep
+
+def poll_delays(budget: float | None = None, initial: float | None = None) -> list[float]:
+    """Ventetider før hvert verifikations-GET: 0, initial, 2*initial, … (sum <= budget)."""
+    budget = ENTRY_VERIFY_BUDGET if budget is None else budget
+    delay = ENTRY_POLL_INITIAL if initial is None else initial
+    out, used = [0.0], 0.0
+    while delay > 0 and used < budget:
+        step = min(delay, budget - used)
+        out.append(step)
+        used += step
+        delay *= 2
+    return out
+
+def entry_mode_file() -> str:
+    return os.getenv("ENTRY_MODE_FILE", ENTRY_MODE_FILE)
+
+def _load_entry_modes() -> dict[str, str]:
+    global _entry_modes, _entry_modes_path
+    path = entry_mode_file()
+    if _entry_modes is None or _entry_modes_path != path:  # ny fil (fx ny ENTRY_MODE_FILE i samme proces)
+        _entry_modes_path = path
+        try:
+            obj = json.loads(Path(path).read_text(encoding="utf-8"))
+            _entry_modes = {str(k): str(v) for k, v in obj.items()} if isinstance(obj, dict) else {}
+        except (OSError, ValueError):
+            _entry_modes = {}
+    return _entry_modes
+
+def entry_phases(target: str) -> tuple[str, ...]:
+    """Modes for target i den rækkefølge de prøves: sidst virkende mode først."""
+    phases = ENTRY_PHASES.get(target, ENTRY_PHASES["0"])
+    with _entry_modes_lock:
+        learned = _load_entry_modes().get(target)
+    if learned in phases:
+        return (learned,) + tuple(m for m in phases if m != learned)
+    return phases
+
+def remember_entry_mode(target: str, mode: str) -> None:
+    global _entry_modes_dirty
+    with _entry_modes_lock:
+        modes = _load_entry_modes()
+        if modes.get(target) != mode:
+            modes[target] = mode
+            _entry_modes_dirty = True
+
+def save_entry_modes() -> None:
+    """Gem lærte modes (atomisk) hvis de er ændret i denne kørsel."""
+    global _entry_modes_dirty
+    with _entry_modes_lock:
+        if not _entry_modes_dirty or _entry_modes is None:
+            return
+        path = _entry_modes_path or entry_mode_file()
+        tmp = Path(path + ".tmp")
+        tmp.write_text(json.dumps(_entry_modes, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        _entry_modes_dirty = False
+
+def build_entry_userdata(cur: dict, groups, mode: str, target: str) -> ET.Element:
+    """
+    mode:
+      "text" -> <EntryRemaining>1</EntryRemaining> (eller "0")
+      "none" -> (intet EntryRemaining-element)
+    """
+    return build_userdata(
+        cur["card"], cur["name"], groups,
+        entry_text="1" if target == "1" else "0",
+        with_entry=(mode != "none"), card_pin_nil=True, empty_groups=False,
+    )
+
+# ---------- API ops ----------
+def add_user_to_group(user_guid: str, verify: bool | None = None) -> tuple[bool, str | None]:
+    """
+    Tilføj bruger til GROUP_ID uden at miste andre gruppemedlemskaber.
+    - Bevarer EntryRemaining (nil='true' eller tekst)
+    - Unionerer eksisterende grupper med GROUP_ID
+    - PUT'er minimal <UserData> (alfabetisk sorteret)
+    verify=None: VERIFY-politikken afgør om der re-checkes efter PUT; viser
+    re-checket ikke gruppen, returneres (False, "not_in_group_after_put").
+    """
+    url_user = f"{ACCT_BASE}/users/{user_guid}"
+
+    # 1) Aktuel bruger (Card/Name/EntryRemaining) — fra snapshot eller GET
+    cur, err = _load_user(user_guid)
+    if err:
+        return False, "user_not_found" if err == "not_found" else err
 
     # 2) Hent nuværende grupper → union med GROUP_ID
     current_groups = set()
@@ -179,18 +357,9 @@ def add_user_to_group(user_guid: str) -> tuple[bool, str | None]:
     # fallback: parse GroupCollection/<GroupID> hvis ovenstående gav tomt
     if not current_groups:
         try:
-            rgrp = requests.get(f"{ACCT_BASE}/users/{user_guid}/groups",
-                                auth=auth, headers={"Accept": "application/xml"}, timeout=15)
+            rgrp = acct_client.get(f"{ACCT_BASE}/users/{user_guid}/groups", timeout=15)
             if rgrp.status_code == 200:
-                try:
-                    gr = ET.fromstring(rgrp.content)
-                    for e in gr.iter():
-                        if lname(e.tag) == "groupid":
-                            url = (e.text or "").strip()
-                            if url:
-                                current_groups.add(url.rsplit("/", 1)[-1])
-                except ET.ParseError:
-                    pass
+                current_groups.update(_parse_groupcollection_ids(rgrp.content))
         except requests.RequestException:
             pass
 
@@ -199,63 +368,22 @@ def add_user_to_group(user_guid: str) -> tuple[bool, str | None]:
     current_groups.add(GROUP_ID)
 
     # 3) Byg minimal <UserData> med bevaret EntryRemaining + ALLE grupper
-    ud = ET.Element(ET.QName(NS_MAIN, "UserData"))
-
-    el_card = ET.SubElement(ud, ET.QName(NS_MAIN, "Card"))
-    el_card.text = cur_card
-
-    el_entry = ET.SubElement(ud, ET.QName(NS_MAIN, "EntryRemaining"))
-    if entry_nil:
-        el_entry.set(ET.QName(NS_XSI, "nil"), "true")
-    elif entry_text is not None:
-        el_entry.text = entry_text
-
-    el_groups = ET.SubElement(ud, ET.QName(NS_MAIN, "Groups"))
-    for gid in sorted(current_groups):
-        ET.SubElement(el_groups, ET.QName(NS_ARR, "string")).text = gid
-
-    ET.SubElement(ud, ET.QName(NS_MAIN, "Name")).text = cur_name or cur_card
-    ET.SubElement(ud, ET.QName(NS_MAIN, "UType")).text = "Normal"
-
-    sort_children_alphabetically(ud)
-    put_xml = ET.tostring(ud, encoding="utf-8", xml_declaration=True)
+    ud = build_userdata(cur["card"], cur["name"], current_groups,
+                        entry_nil=cur["entry_nil"], entry_text=cur["entry_text"])
 
     # 4) PUT med fallback uden XML-deklaration ved 400
-    try:
-        p = requests.put(
-            url_user,
-            data=put_xml,
-            auth=auth,
-            headers={"Content-Type": "application/xml; charset=utf-8", "Accept": "application/xml"},
-            timeout=20,
-        )
-        if p.status_code not in (200, 202, 204):
-            if p.status_code == 400:
-                put_xml_no_decl = ET.tostring(ud, encoding="utf-8", xml_declaration=False)
-                p2 = requests.put(
-                    url_user,
-                    data=put_xml_no_decl,
-                    auth=auth,
-                    headers={"Content-Type": "application/xml; charset=utf-8", "Accept": "application/xml"},
-                    timeout=20,
-                )
-                if p2.status_code not in (200, 202, 204):
-                    return False, f"{p2.status_code} {(p2.text or '')[:200]}"
-            else:
-                return False, f"{p.status_code} {(p.text or '')[:200]}"
-    except requests.RequestException as e:
-        return False, f"PUT failed: {e}"
+    ok, info = _put_userdata(url_user, ud)
+    if not ok:
+        return False, info
+    if not (VERIFY.inline(user_guid) if verify is None else verify):
+        return True, None
 
-    # 5) Re-check membership (tåler eventual consistency)
+    # 5) Re-check membership — som remove: vises gruppen ikke, er tilføjelsen ikke bekræftet
     try:
-        gg = requests.get(f"{ACCT_BASE}/users/{user_guid}/groups",
-                          auth=auth, headers={"Accept": "application/xml"}, timeout=15)
-        if gg.status_code == 200 and f"/groups/{GROUP_ID}" in (gg.text or ""):
-            return True, None
-    except requests.RequestException:
-        pass
-
-    return True, None
+        ok = _recheck_in_group(acct_client.get(f"{ACCT_BASE}/users/{user_guid}/groups", timeout=15))
+    except (requests.RequestException, ValueError):
+        ok = False
+    return (True, None) if ok else (False, "not_in_group_after_put")
 
 def delete_user(user_guid: str) -> tuple[bool, str | None]:
     """
@@ -263,7 +391,8 @@ def delete_user(user_guid: str) -> tuple[bool, str | None]:
     Returnerer (ok, info). info kan være "already_deleted" ved 404.
     """
     url = f"{ACCT_BASE}/users/{user_guid}"
-    r = requests.delete(url, auth=auth, headers={"Accept": "application/xml"}, timeout=20)
+    snapshot.shared().invalidate(user_guid)
+    r = acct_client.delete(url, timeout=20)
     if r.status_code in (200, 204):
         return True, None
     if r.status_code == 404:
@@ -281,16 +410,17 @@ def _write_debug_xml(path: str, content: bytes):
     except Exception:
         pass
 
-def remove_user_from_group(user_guid: str) -> tuple[bool, str | None]:
+def remove_user_from_group(user_guid: str, verify: bool | None = None) -> tuple[bool, str | None]:
     """
     Fjern user fra GROUP_ID.
     1) Forsøg officielt endpoint: DELETE /groups/{GROUP_ID}/users/{user_guid}
     2) Fallback hvis 400/405: PUT /users/{guid} med <Groups> = eksisterende minus GROUP_ID
+    verify=None: VERIFY-politikken afgør om fallback-PUT'en verificeres.
     """
     # --- 1) Prøv DELETE membership endpoint ---
     url_del = f"{ACCT_BASE}/groups/{GROUP_ID}/users/{user_guid}"
     try:
-        r = requests.delete(url_del, auth=auth, headers={"Accept": "application/xml"}, timeout=20)
+        r = acct_client.delete(url_del, timeout=20)
         if r.status_code in (200, 204):
             return True, None
         if r.status_code == 404:
@@ -300,39 +430,10 @@ def remove_user_from_group(user_guid: str) -> tuple[bool, str | None]:
         pass
 
     # --- 2) Fallback: PUT UserData uden denne gruppe ---
-    # GET nuværende bruger + grupper
-    try:
-        g = requests.get(f"{ACCT_BASE}/users/{user_guid}", auth=auth, headers={"Accept":"application/xml"}, timeout=20)
-        if g.status_code == 404:
-            return True, "already_deleted"
-        g.raise_for_status()
-    except requests.RequestException as e:
-        return False, f"GET failed: {e}"
-
-    try:
-        root = ET.fromstring(g.content)
-    except ET.ParseError as e:
-        return False, f"parse_error: {e}"
-
-    def lname(tag: str) -> str:
-        return tag.split("}", 1)[1].lower() if "}" in tag else tag.lower()
-
-    cur_card = cur_name = ""
-    entry_nil = False
-    entry_text = None
-    for el in root:
-        t = lname(el.tag)
-        if t == "card":
-            cur_card = (el.text or "").strip()
-        elif t == "name":
-            cur_name = (el.text or "").strip()
-        elif t == "entryremaining":
-            if el.attrib.get(f"{{{NS_XSI}}}nil", "").lower() == "true":
-                entry_nil = True
-            else:
-                entry_text = (el.text or "").strip() or None
-    if not cur_card: cur_card = user_guid
-    if not cur_name: cur_name = cur_card
+    # nuværende bruger (snapshot eller GET) + grupper
+    cur, err = _load_user(user_guid)
+    if err:
+        return (True, "already_deleted") if err == "not_found" else (False, err)
 
     current = set()
     try:
@@ -342,214 +443,360 @@ def remove_user_from_group(user_guid: str) -> tuple[bool, str | None]:
 
     if GROUP_ID not in current:
         return True, "already_not_in_group"
-    remaining = sorted(current - {GROUP_ID})
+    remaining = current - {GROUP_ID}
 
     # Byg UserData uden target-gruppen
-    ud = ET.Element(ET.QName(NS_MAIN, "UserData"))
-    ET.SubElement(ud, ET.QName(NS_MAIN, "Card")).text = cur_card
-
-    el_entry = ET.SubElement(ud, ET.QName(NS_MAIN, "EntryRemaining"))
-    if entry_nil:
-        el_entry.set(ET.QName(NS_XSI, "nil"), "true")
-    elif entry_text is not None:
-        el_entry.text = entry_text
-
-    el_groups = ET.SubElement(ud, ET.QName(NS_MAIN, "Groups"))
-    for gid in remaining:
-        ET.SubElement(el_groups, ET.QName(NS_ARR, "string")).text = gid
-
-    ET.SubElement(ud, ET.QName(NS_MAIN, "Name")).text = cur_name
-    ET.SubElement(ud, ET.QName(NS_MAIN, "UType")).text = "Normal"
-
-    sort_children_alphabetically(ud)
-    put_xml = ET.tostring(ud, encoding="utf-8", xml_declaration=True)
-
-    try:
-        p = requests.put(
-            f"{ACCT_BASE}/users/{user_guid}",
-            data=put_xml,
-            auth=auth,
-            headers={"Content-Type":"application/xml; charset=utf-8","Accept":"application/xml"},
-            timeout=20,
-        )
-        if p.status_code not in (200,202,204):
-            if p.status_code == 400:
-                put_xml2 = ET.tostring(ud, encoding="utf-8", xml_declaration=False)
-                p2 = requests.put(
-                    f"{ACCT_BASE}/users/{user_guid}",
-                    data=put_xml2,
-                    auth=auth,
-                    headers={"Content-Type":"application/xml; charset=utf-8","Accept":"application/xml"},
-                    timeout=20,
-                )
-                if p2.status_code not in (200,202,204):
-                    return False, f"{p2.status_code} {(p2.text or '')[:200]}"
-            else:
-                return False, f"{p.status_code} {(p.text or '')[:200]}"
-    except requests.RequestException as e:
-        return False, f"PUT failed: {e}"
+    ud = build_userdata(cur["card"], cur["name"], remaining,
+                        entry_nil=cur["entry_nil"], entry_text=cur["entry_text"])
+    ok, info = _put_userdata(f"{ACCT_BASE}/users/{user_guid}", ud)
+    if not ok:
+        return False, info
+    if not (VERIFY.inline(user_guid) if verify is None else verify):
+        return True, None
 
     # verify: ikke længere i gruppen
-    gg = requests.get(f"{ACCT_BASE}/users/{user_guid}/groups", auth=auth, headers={"Accept":"application/xml"}, timeout=15)
-    ok = (gg.status_code == 200 and f"/groups/{GROUP_ID}" not in (gg.text or ""))
+    try:
+        ok = not _recheck_in_group(acct_client.get(f"{ACCT_BASE}/users/{user_guid}/groups", timeout=15))
+    except (requests.RequestException, ValueError):
+        ok = False
     return (True, None) if ok else (False, "still_in_group_after_put")
 
-def set_entry_remaining(user_guid: str, target: str = "1") -> tuple[bool, str | None]:
+def set_entry_remaining(user_guid: str, target: str = "1", verify: bool | None = None,
+                        add_groups=()) -> tuple[bool, str | None]:
     """
-    Sæt EntryRemaining til '1' (unlimited) eller '0' (tekst "0").
-    Multi-phase fallback for at tvinge serveren til at persistere:
-      Phase A: nil=true
-      Phase B: text "1"
-      Phase C: helt uden <EntryRemaining/>
-    Returnerer False med forklaring hvis alt fejler.
+    Sæt EntryRemaining til '1' eller '0' (altid som tekst).
+    Fallback mellem skrive-modes for at tvinge serveren til at persistere (se ENTRY_PHASES):
+      "text": text "1"/"0"
+      "none": helt uden <EntryRemaining/> (kun target == "1")
+    Den mode der sidst virkede prøves først (entry_phases), og hver accepteret
+    PUT verificeres med GET'er med eksponentiel backoff (poll_delays) inden for
+    ét samlet ENTRY_VERIFY_BUDGET pr. bruger. En afvist PUT verificeres ikke.
+    Returnerer False med forklaring (sidste PUT-fejl eller "persist_failed")
+    hvis alt fejler.
+    Uden verifikation (verify=False eller efter VERIFY-politikken) sendes kun
+    første mode; ved VERIFY=batch tages resten kun for afvigere.
+    add_groups lægges til brugerens grupper i samme PUT (planens add_update).
     """
-    import time
-
     url_user = f"{ACCT_BASE}/users/{user_guid}"
 
-    # 1) GET bruger (Card/Name)
-    try:
-        g = requests.get(url_user, auth=auth, headers={"Accept": "application/xml"}, timeout=20)
-        g.raise_for_status()
-    except requests.RequestException as e:
-        return False, f"GET failed: {e}"
+    # 1) Bruger (Card/Name) — fra snapshot eller GET
+    cur, err = _load_user(user_guid)
+    if err:
+        return False, "GET failed: 404" if err == "not_found" else err
 
-    try:
-        root_cur = ET.fromstring(g.content)
-    except ET.ParseError as e:
-        return False, f"parse_error: {e}"
-
-    def lname(tag: str) -> str:
-        return tag.split("}", 1)[1].lower() if "}" in tag else tag.lower()
-
-    cur_card = cur_name = ""
-    for el in root_cur:
-        t = lname(el.tag)
-        if t == "card": cur_card = (el.text or "").strip()
-        elif t == "name": cur_name = (el.text or "").strip()
-    if not cur_card: cur_card = user_guid
-    if not cur_name: cur_name = cur_card
-
-    groups_now = _get_user_groups(user_guid)
-
-    def _build_and_put(mode: str) -> tuple[bool, str]:
-        """
-        mode:
-          "nil"  -> <EntryRemaining i:nil="true"/>
-          "text" -> <EntryRemaining>1</EntryRemaining> (eller "0")
-          "none" -> (intet EntryRemaining-element)
-        """
-        ud = ET.Element(ET.QName(NS_USERDATA, "UserData"))
-        ET.SubElement(ud, ET.QName(NS_USERDATA, "Card")).text = cur_card
-
-        # CardPin i:nil="true" hjælper nogle WCF set-ups
-        el_pin = ET.SubElement(ud, ET.QName(NS_USERDATA, "CardPin"))
-        el_pin.attrib[ET.QName(NS_XSI, "nil")] = "true"
-
-        if mode != "none":
-            el_entry = ET.SubElement(ud, ET.QName(NS_USERDATA, "EntryRemaining"))
-
-            if target == "1":
-                el_entry.text = "1"        # <-- ALTID tekst "1"
-            else:
-                el_entry.text = "0"
-
-
-        if groups_now:
-            el_groups = ET.SubElement(ud, ET.QName(NS_USERDATA, "Groups"))
-            for gid in sorted(set(groups_now)):
-                ET.SubElement(el_groups, ET.QName(NS_ARR, "string")).text = gid
-
-        ET.SubElement(ud, ET.QName(NS_USERDATA, "Name")).text = cur_name
-        ET.SubElement(ud, ET.QName(NS_USERDATA, "UType")).text = "Normal"
-
-        sort_children_alphabetically(ud)
-        put_xml = ET.tostring(ud, encoding="utf-8", xml_declaration=True)
-        try:
-            p = requests.put(
-                url_user, data=put_xml, auth=auth,
-                headers={"Content-Type":"application/xml; charset=utf-8","Accept":"application/xml"},
-                timeout=20
-            )
-            if p.status_code not in (200,202,204):
-                if p.status_code == 400:
-                    put_xml2 = ET.tostring(ud, encoding="utf-8", xml_declaration=False)
-                    p2 = requests.put(
-                        url_user, data=put_xml2, auth=auth,
-                        headers={"Content-Type":"application/xml; charset=utf-8","Accept":"application/xml"},
-                        timeout=20
-                    )
-                    if p2.status_code not in (200,202,204):
-                        return False, f"{p2.status_code}"
-                else:
-                    return False, f"{p.status_code}"
-        except requests.RequestException as e:
-            return False, f"PUT failed: {e}"
-        return True, "ok"
+    groups_now = sorted(set(_get_user_groups(user_guid)) | set(add_groups))
 
     def _verify() -> bool:
-        NS = {"n": NS_USERDATA, "i": NS_XSI}
         try:
-            r = requests.get(url_user, auth=auth, headers={"Accept": "application/xml"}, timeout=15)
+            r = acct_client.get(url_user, timeout=15)
             r.raise_for_status()
-            root = ET.fromstring(r.content)
-            er = root.find("n:EntryRemaining", NS)
-            nil = (er is not None and er.attrib.get(f"{{{NS['i']}}}nil", "").lower() == "true")
-            txt = (er.text or "").strip() if er is not None else ""
-            if target == "1":
-                return (txt == "1")
-            else:
-                return (txt == "0")
+            return _entry_matches(r.content, target)
         except Exception:
             return False
 
-    # Phase A: altid skriv tal som tekst (1 eller 0) — aldrig nil
-    phaseA = "text"
-    ok, _ = _build_and_put(phaseA); time.sleep(0.4)
-    if _verify(): return True, None
+    phases = entry_phases(target)
+    if not (VERIFY.inline(user_guid) if verify is None else verify):
+        return _put_userdata(url_user, build_entry_userdata(cur, groups_now, phases[0], target))
+
+    # ENTRY_VERIFY_BUDGET er ventetid pr. bruger på tværs af alle modes
+    budget, put_error = ENTRY_VERIFY_BUDGET, None
+    for mode in phases:
+        ok, info = _put_userdata(url_user, build_entry_userdata(cur, groups_now, mode, target))
+        if not ok:  # afvist PUT: intet at verificere, prøv næste mode
+            put_error = info
+            continue
+        put_error = None
+        for delay in poll_delays(budget):
+            if delay:
+                _sleep(delay)
+                budget -= delay
+            if _verify():
+                remember_entry_mode(target, mode)
+                return True, None
+
+    return False, put_error or "persist_failed"
+
+# ---------- batch-verifikation ----------
+def _group_members_entry() -> dict[str, str] | None:
+    """GUID -> EntryRemaining for alle i GROUP_ID med ét udtræk; None hvis det fejler."""
+    try:
+        return {u["guid"]: u["entry_remaining"]
+                for u in build_members_csv.stream_users(f"{ACCT_BASE}/groups/{GROUP_ID}/users")}
+    except (requests.RequestException, ET.ParseError):
+        return None
 
+def _recheck_update(uid: str) -> tuple[bool, str | None]:
+    """Afviger EntryRemaining stadig, køres alle faser med verifikation."""
+    try:
+        r = acct_client.get(f"{ACCT_BASE}/users/{uid}", timeout=15)
+        if r.status_code == 200 and _entry_matches(r.content, "1"):
+            return True, None
+    except (requests.RequestException, ET.ParseError):
+        pass
+    return set_entry_remaining(uid, "1", verify=True)
 
-    # Phase B: text "1" (kun hvis target == "1")
-    if target == "1":
-        ok, _ = _build_and_put("text"); time.sleep(0.4)
-        if _verify(): return True, None
+def verify_batch(add_results, del_results, upd_results):
+    """
+    Bekræft alle vellykkede ændringer med ét /groups/{GROUP_ID}/users-udtræk.
+    Kun brugere der afviger tjekkes igen enkeltvis; afvigere der stadig er
+    forkerte bliver til (False, "verify_failed: …") og havner i *_errors.json.
+    Returnerer de tre resultatlister (samme rækkefølge).
+    """
+    add_results, del_results, upd_results = list(add_results), list(del_results), list(upd_results)
+    members = _group_members_entry()
+    if members is None:
+        print("⚠️  Kunne ikke hente gruppens medlemmer til verifikation — tjekker enkeltvis")
+        members = {}
+        unknown = True
+    else:
+        unknown = False
+
+    def in_group(uid: str) -> bool:
+        return GROUP_ID in _get_user_groups(uid)
+
+    def check(results, matches, recheck, reason):
+        out, mismatches = [], 0
+        for uid, (ok, info) in results:
+            if ok and (unknown or not matches(uid)):
+                mismatches += 1
+                if not recheck(uid):
+                    ok, info = False, f"verify_failed: {reason}"
+            out.append((uid, (ok, info)))
+        return out, mismatches
+
+    add_results, n_add = check(add_results, lambda u: u in members, in_group, "not_in_group")
+    del_results, n_del = check(del_results, lambda u: u not in members, lambda u: not in_group(u), "still_in_group")
+    upd_results, n_upd = check(upd_results, lambda u: members.get(u) == "1",
+                               lambda u: _recheck_update(u)[0], "entry_remaining_not_1")
+    if not unknown:
+        print(f"Batch-verifikation: {len(members)} medlemmer hentet; gen-tjekket "
+              f"ADD {n_add} / DEL {n_del} / UPD {n_upd}")
+    return add_results, del_results, upd_results
 
-        # Phase C: fjern elementet helt
-        ok, _ = _build_and_put("none"); time.sleep(0.4)
-        if _verify(): return True, None
+# ---------- main ----------
+def _safe(op):
+    """Pak en ACCT-op så en uventet exception bliver til (False, info) i stedet for at stoppe hele poolen."""
+    def run(uid: str) -> tuple[bool, str | None]:
+        try:
+            return op(uid)
+        except Exception as e:
+            return False, f"exception: {e}"
+    return run
 
-    return False, "persist_failed"
+def _remove_op(uid: str) -> tuple[bool, str | None]:
+    if DELETE_STRATEGY == "group_only":
+        return remove_user_from_group(uid)
+    return delete_user(uid)
 
-# ---------- main ----------
-def main():
-    # standardfilnavne (kan overrides via args)
-    to_add_path     = Path("to_add.json")
-    to_delete_path  = Path("to_delete.json")
-    to_update_path  = Path("to_update.json")
-
-    # valgfri: python changing_state_of_group.py to_add.json to_delete.json to_update.json
-    if len(sys.argv) >= 2:
-        to_add_path = Path(sys.argv[1])
-    if len(sys.argv) >= 3:
-        to_delete_path = Path(sys.argv[2])
-    if len(sys.argv) >= 4:
-        to_update_path = Path(sys.argv[3])
-
-    # Indlæs lister
-    to_add_ids     = load_ids_from_json_or_csv(to_add_path)    if to_add_path.exists()    else []
-    to_delete_ids  = load_ids_from_json_or_csv(to_delete_path) if to_delete_path.exists() else []
-    to_update_ids  = load_ids_from_json_or_csv(to_update_path) if to_update_path.exists() else []
-
-    print(f"Indlæst {len(to_add_ids)} GUIDs fra {to_add_path.name} (to_add)")
-    print(f"Indlæst {len(to_delete_ids)} GUIDs fra {to_delete_path.name} (to_delete)")
-    print(f"Indlæst {len(to_update_ids)} GUIDs fra {to_update_path.name} (to_update)")
+def _update_op(uid: str) -> tuple[bool, str | None]:
+    return set_entry_remaining(uid, "1")
+
+def _add_update_op(uid: str) -> tuple[bool, str | None]:
+    """Planens add_update: GROUP_ID og EntryRemaining=1 i én PUT."""
+    return set_entry_remaining(uid, "1", add_groups=(GROUP_ID,))
+
+def _plan_phases(plan: dict, jobs: int, journal=None, deadline: Deadline | None = None):
+    """
+    ADD/DEL/UPD-faser fra en plan. add_update-brugere køres én gang i ADD-fasen;
+    deres resultat genbruges i UPD-fasen, så de tælles begge steder (en udskudt
+    bruger tælles dog kun én gang af report_results).
+    Med en journal springes ops der er bekræftet i en afbrudt kørsel over;
+    med en deadline udskydes ops der ikke kan nå at blive færdige.
+    """
+    merged = set(plan_ids(plan, "add_update"))
+    done: dict[str, tuple[bool, str | None]] = {}
+
+    def _add(uid: str) -> tuple[bool, str | None]:
+        return (_add_update_op if uid in merged else add_user_to_group)(uid)
+
+    add = apply_journal.journaled(guarded(_add, deadline, "add"), journal, "add")
+    remove = apply_journal.journaled(guarded(_remove_op, deadline, "remove"), journal, "remove")
+    update = apply_journal.journaled(guarded(_update_op, deadline, "update"), journal, "update")
+
+    def add_op(uid: str) -> tuple[bool, str | None]:
+        res = _safe(add)(uid)
+        if uid in merged:
+            done[uid] = res
+        return res
+
+    def upd_op(uid: str) -> tuple[bool, str | None]:
+        return done[uid] if uid in done else _safe(update)(uid)
+
+    return (
+        run_bounded(add_op, plan_ids(plan, "add", "add_update"), jobs),
+        run_bounded(_safe(remove), plan_ids(plan, "remove"), jobs),
+        run_bounded(upd_op, plan_ids(plan, "update", "add_update"), jobs),
+    )
+
+def _list_run_id(paths) -> str:
+    """Kørsels-id for liste-stien: listefilernes mtime (ny diff = nye filer = nyt id)."""
+    return str(max((p.stat().st_mtime_ns for p in paths if p.exists()), default=0))
+
+def _list_journal(to_add_ids, to_delete_ids, to_update_ids, run_id: str = ""):
+    """Journal for liste-stien; nøglen er de tre lister som plan-lignende brugerliste + run_id."""
+    users = [{"user_id": u, "action": a}
+             for a, ids in (("add", to_add_ids), ("remove", to_delete_ids), ("update", to_update_ids))
+             for u in ids]
+    return apply_journal.open_for({"created": run_id, "group_id": GROUP_ID,
+                                   "delete_strategy": DELETE_STRATEGY, "users": users})
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Anvend to_add/to_delete/to_update på ACCT-gruppen")
+    ap.add_argument("to_add", nargs="?", default="to_add.json")
+    ap.add_argument("to_delete", nargs="?", default="to_delete.json")
+    ap.add_argument("to_update", nargs="?", default="to_update.json")
+    ap.add_argument("--jobs", "-j", type=int, default=jobs_from_env(),
+                    help="Antal samtidige brugere pr. fase (env APPLY_JOBS, default %(default)s)")
+    ap.add_argument("--plan", default=None,
+                    help="Anvend en plan fra plan_operations.py i stedet for de tre lister")
+    ap.add_argument("--deadline", type=float, default=float(os.getenv("APPLY_DEADLINE", "0") or 0),
+                    help="Sekunder til rådighed; ops der ikke kan nå det udskydes til %s "
+                         "(env APPLY_DEADLINE, 0 = ingen)" % REMAINING_PLAN_FILE)
+    args, _ = ap.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return args
+
+def main(argv: list[str] | None = None):
+    # valgfri: python changing_state_of_group.py to_add.json to_delete.json to_update.json [--jobs N] [--plan apply_plan.json]
+    args = parse_args(argv)
+    jobs = max(1, args.jobs)
+
+    if args.plan:
+        plan = load_plan(args.plan)
+        print(f"Indlæst plan fra {args.plan}")
+        print_summary(plan)
+    else:
+        to_add_path     = Path(args.to_add)
+        to_delete_path  = Path(args.to_delete)
+        to_update_path  = Path(args.to_update)
+
+        # Indlæs lister
+        to_add_ids     = load_ids_from_json_or_csv(to_add_path)    if to_add_path.exists()    else []
+        to_delete_ids  = load_ids_from_json_or_csv(to_delete_path) if to_delete_path.exists() else []
+        to_update_ids  = load_ids_from_json_or_csv(to_update_path) if to_update_path.exists() else []
+
+        print(f"Indlæst {len(to_add_ids)} GUIDs fra {to_add_path.name} (to_add)")
+        print(f"Indlæst {len(to_delete_ids)} GUIDs fra {to_delete_path.name} (to_delete)")
+        print(f"Indlæst {len(to_update_ids)} GUIDs fra {to_update_path.name} (to_update)")
+        run_id = _list_run_id((to_add_path, to_delete_path, to_update_path))
+        plan = None
+    deadline = Deadline(args.deadline) if args.deadline > 0 else None
+    print(f"Parallelitet: {jobs} samtidige brugere pr. fase")
+    print(f"Verifikation: {VERIFY!r}")
+    if deadline is not None:
+        print(f"Deadline: {args.deadline:.0f}s — rækkefølge DEL → ADD → UPD")
+
+    # Faserne kører efter hinanden (generatorerne startes først når report_results når dem);
+    # inden for en fase kører brugerne parallelt. run_bounded returnerer i input-rækkefølge,
+    # så optælling og output er deterministisk.
+    if plan is not None:
+        return apply_plan(plan, jobs, deadline=deadline)
+    to_add_ids, to_delete_ids, to_update_ids = dedupe(to_add_ids), dedupe(to_delete_ids), dedupe(to_update_ids)
+    journal = _list_journal(to_add_ids, to_delete_ids, to_update_ids, run_id)
+
+    def op(fn, phase):
+        return _safe(apply_journal.journaled(guarded(fn, deadline, phase), journal, phase))
+
+    summary = apply_phases(
+        run_bounded(op(add_user_to_group, "add"), to_add_ids, jobs),
+        run_bounded(op(_remove_op, "remove"), to_delete_ids, jobs),
+        run_bounded(op(_update_op, "update"), to_update_ids, jobs),
+        journal=journal, deadline=deadline,
+    )
+    deferred = deadline is not None and deadline.deferred
+    save_remaining(build_plan(to_add_ids, to_delete_ids, to_update_ids) if deferred else {}, deadline)
+    return summary
+
+def apply_plan(plan: dict, jobs: int | None = None, rasmus_cards=None, group_by_card=None,
+               deadline: Deadline | None = None, cache: CardCache | None = None) -> dict:
+    """Anvend en plan (plan_operations.build_plan) i hukommelsen; se apply_phases."""
+    journal = apply_journal.open_for(plan)
+    summary = apply_phases(*_plan_phases(plan, max(1, jobs or jobs_from_env()), journal, deadline),
+                           rasmus_cards=rasmus_cards, group_by_card=group_by_card,
+                           journal=journal, deadline=deadline, cache=cache)
+    save_remaining(plan, deadline)
+    return summary
+
+def save_remaining(plan: dict, deadline: Deadline | None) -> dict | None:
+    """
+    Gem de brugere deadline udskød som plan i REMAINING_PLAN_FILE (kør den med
+    --plan, eller lad næste diff tage dem). Blev intet udskudt, fjernes en
+    gammel rest-plan.
+    """
+    path = Path(REMAINING_PLAN_FILE)
+    if deadline is None or not deadline.deferred:
+        path.unlink(missing_ok=True)
+        return None
+    rest = subplan(plan, (uid for _, uid in deadline.deferred))
+    write_plan(rest, str(path))
+    print(f"⏱️  Deadline: {len(rest['users'])} brugere udskudt — rest-plan gemt i {path}")
+    return rest
+
+def apply_phases(add_res, del_res, upd_res, rasmus_cards=None, group_by_card=None, journal=None,
+                 deadline: Deadline | None = None, cache: CardCache | None = None) -> dict:
+    """
+    Kør ADD/DEL/UPD-faserne (iterables af (user_id, (ok, info))), verificér efter
+    VERIFY-politikken, optæl og gem sync-tilstanden. rasmus_cards/group_by_card
+    (pre-state) kan gives fra hukommelsen; ellers læses rasmus-liste.csv /
+    group_members.csv. En apply_journal lukkes (sidste fsync) til sidst.
+    cache: kort-cachen der invalideres for ændrede brugere (default CARD_CACHE_FILE).
+    Med en deadline køres DEL-fasen først (adgang fjernes før der gives ny),
+    så det er tilføjelser og EntryRemaining-nulstillinger der udskydes.
+    """
+    if deadline is not None:
+        del_res = list(del_res)
+    if cache is None:
+        cache = CardCache()
+    phases = (invalidating(add_res, cache), invalidating(del_res, cache), invalidating(upd_res, cache))
+    completed = False
+    try:
+        if VERIFY.batch:
+            # alle faser skal være færdige før gruppen hentes til verifikation
+            phases = verify_batch(*phases)
+        summary = report_results(*phases)
+        completed = True
+    finally:
+        cache.flush()
+        save_entry_modes()
+        if journal is not None:
+            # kun et afbrudt apply skal kunne genoptages
+            journal.close(clear=completed)
+            if journal.skipped:
+                print(f"Journal: {journal.skipped} ops genbrugt fra afbrudt kørsel ({journal.path})")
+    _commit_sync_state(summary, rasmus_cards, group_by_card)
+    if deadline is not None:
+        summary["deadline"] = deadline.summary()
+    return summary
+
+def _commit_sync_state(summary: dict, rasmus_cards=None, group_by_card=None) -> None:
+    """Gem post-state til inkrementel sync; gruppen hentes kun igen hvis noget blev forsøgt."""
+    import member_rasmus_diff as mrd
+    try:
+        if any(summary.values()):
+            mrd.commit_sync_state(None, rasmus_cards)
+        elif group_by_card is not None:
+            mrd.commit_sync_state(group_by_card, rasmus_cards)
+        elif Path(mrd.GROUP_MEMBERS_FILE).exists():
+            mrd.commit_sync_state(mrd.load_group_members(mrd.GROUP_MEMBERS_FILE), rasmus_cards)
+    except (requests.RequestException, ET.ParseError, OSError, ValueError) as e:
+        print(f"⚠️  Kunne ikke gemme sync-tilstand ({e}) — næste kørsel laver fuld diff")
+
+def report_results(add_results, del_results, upd_results) -> dict:
+    """
+    Optæl og udskriv resultater fra de tre faser og gem *_errors.json.
+    Hver parameter er en iterable af (user_id, (ok, info)) i ønsket rækkefølge.
+    Returnerer tællerne som dict.
+    """
+    # add_update-brugere står i både ADD og UPD (samme resultat) — udskudte tælles pr. bruger
+    deferred: set[str] = set()
 
     # ADD
     add_ok = add_already = 0
     add_errs = []
-    for uid in to_add_ids:
-        ok, info = add_user_to_group(uid)
-        if ok and info == "already_in_group":
+    for uid, (ok, info) in add_results:
+        if not ok and info == DEFERRED:
+            deferred.add(uid)
+            print(f"ADD {uid}: udskudt (deadline)")
+        elif ok and info == "already_in_group":
             add_already += 1
             print(f"ADD {uid}: allerede i gruppen (409)")
         elif ok:
@@ -562,12 +809,11 @@ def main():
     # DELETE (afmelding fra gruppen eller fuld sletning)
     del_ok = del_already = 0
     del_errs = []
-    for uid in to_delete_ids:
-        if DELETE_STRATEGY == "group_only":
-            ok, info = remove_user_from_group(uid)
-        else:
-            ok, info = delete_user(uid)
-        if ok and info in ("already_deleted", "already_not_in_group"):
+    for uid, (ok, info) in del_results:
+        if not ok and info == DEFERRED:
+            deferred.add(uid)
+            print(f"DEL {uid}: udskudt (deadline)")
+        elif ok and info in ("already_deleted", "already_not_in_group"):
             del_already += 1
             print(f"DEL {uid}: {info.replace('_',' ')}")
         elif ok:
@@ -578,12 +824,14 @@ def main():
             del_errs.append({"user_id": uid, "error": info})
             print(f"DEL {uid}: fejl – {info}")
 
-    # UPDATE entryRemaining -> -1 (nil=true)
+    # UPDATE entryRemaining -> 1
     upd_ok = upd_err = 0
     upd_errs = []
-    for uid in to_update_ids:
-        ok, info = set_entry_remaining(uid, "1")
-        if ok:
+    for uid, (ok, info) in upd_results:
+        if not ok and info == DEFERRED:
+            deferred.add(uid)
+            print(f"UPD {uid}: udskudt (deadline)")
+        elif ok:
             upd_ok += 1
             print(f"UPD {uid}: entryRemaining sat til 1")
         else:
@@ -595,6 +843,8 @@ def main():
     print(f"Tilføjet: {add_ok}  | Allerede i gruppen: {add_already}  | ADD fejl: {len(add_errs)}")
     print(f"Slettet (brugere): {del_ok}  | Allerede slettet/ikke i gruppe: {del_already} | DEL fejl: {len(del_errs)}")
     print(f"Opdateret entryRemaining=1: {upd_ok} | UPD fejl: {upd_err}")
+    if deferred:
+        print(f"Udskudt pga. deadline: {len(deferred)}")
 
     if add_errs:
         Path("add_errors.json").write_text(json.dumps(add_errs, indent=2, ensure_ascii=False), encoding="utf-8")
@@ -606,5 +856,11 @@ def main():
         Path("update_errors.json").write_text(json.dumps(upd_errs, indent=2, ensure_ascii=False), encoding="utf-8")
         print("UPD-fejl gemt i update_errors.json")
 
+    return {
+        "added": add_ok, "already_in_group": add_already, "add_errors": len(add_errs),
+        "deleted": del_ok, "already_removed": del_already, "delete_errors": len(del_errs),
+        "updated": upd_ok, "update_errors": upd_err, "deferred": len(deferred),
+    }
+
 if __name__ == "__main__":
     main()
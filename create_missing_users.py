@@ -4,13 +4,16 @@ import argparse
 from pathlib import Path
 import xml.etree.ElementTree as ET
 import requests
-from requests.auth import HTTPBasicAuth
 import os
 import json
+import uuid
 
 # Sørg for at utils kan findes
 sys.path.append(str(Path(__file__).resolve().parent))
-from utils.xml_utils import sort_children_alphabetically
+import member_rasmus_diff
+from utils import acct_client
+from utils.card_cache import CardCache
+from utils.xml_utils import _localname, parse_card_userid_map, sort_children_alphabetically
 
 # --- ACCT config ---
 ACCT_BASE = os.getenv("ACCT_BASE", "https://test.acct.dk/rest/current").rstrip("/")
@@ -27,98 +30,16 @@ ET.register_namespace("", NS_MAIN)
 ET.register_namespace("arr", NS_ARR)
 ET.register_namespace("i", NS_XSI)
 
-auth = HTTPBasicAuth(ACCT_USER, ACCT_PASS)
-
-# Optional cache (Card -> UserID) for færre API-calls
-CACHE_FILE = "acct_card_user_cache.json"
-
-
-def _local(tag: str) -> str:
-    return tag.split("}", 1)[-1] if "}" in tag else tag
-
-
-def _find_first_text(node: ET.Element, local_names: set[str]) -> str:
-    targets = {n.lower() for n in local_names}
-    for el in node.iter():
-        if _local(el.tag).lower() in targets:
-            return (el.text or "").strip()
-    return ""
-
-
-def load_cache(path: str) -> dict[str, str]:
-    p = Path(path)
-    if not p.exists():
-        return {}
-    try:
-        obj = json.loads(p.read_text(encoding="utf-8"))
-        if isinstance(obj, dict):
-            return {str(k): str(v) for k, v in obj.items() if k and v}
-    except Exception:
-        pass
-    return {}
-
-
-def save_cache(path: str, cache: dict[str, str]) -> None:
-    Path(path).write_text(json.dumps(cache, indent=2, ensure_ascii=False), encoding="utf-8")
-
 
 def parse_users_from_xml(xml_text: str) -> dict[str, str]:
-    out: dict[str, str] = {}
-    try:
-        root = ET.fromstring(xml_text.encode("utf-8") if isinstance(xml_text, str) else xml_text)
-    except Exception:
-        return out
-
-    for node in root.iter():
-        card = _find_first_text(node, {"Card"})
-        if not card:
-            continue
-        uid = _find_first_text(node, {"UserID", "UserId", "Guid", "ID", "Id"})
-        if card and uid:
-            out[card] = uid
-    return out
+    return parse_card_userid_map(xml_text)
 
 
-def lookup_userid_by_card(card: str, cache: dict[str, str]) -> str | None:
-    card = (card or "").strip()
-    if not card:
-        return None
-    if card in cache:
-        return cache[card]
-
-    if not ACCT_USER or not ACCT_PASS:
-        raise RuntimeError("ACCT_USER/ACCT_PASS mangler i env. Sæt dem før du kører.")
+def lookup_userid_by_card(card: str, cache: CardCache) -> str | None:
+    """Samme opslag (og cache-format) som member_rasmus_diff; kræver derudover GROUP_ID."""
     if not GROUP_ID:
         raise RuntimeError("GROUP_ID mangler i env. Sæt den før du kører.")
-
-    headers = {"Accept": "application/xml"}
-    candidates = [
-        f"{ACCT_BASE}/users?card={card}",
-        f"{ACCT_BASE}/users/card/{card}",
-        f"{ACCT_BASE}/users/{card}",
-    ]
-
-    for url in candidates:
-        try:
-            r = requests.get(url, auth=auth, headers=headers, timeout=30)
-        except requests.RequestException:
-            continue
-
-        if r.status_code in (404, 204):
-            continue
-
-        if 200 <= r.status_code < 300:
-            mapping = parse_users_from_xml(r.text)
-            uid = mapping.get(card)
-            if uid:
-                cache[card] = uid
-                return uid
-            if len(mapping) == 1:
-                only_uid = next(iter(mapping.values()))
-                cache[card] = only_uid
-                return only_uid
-
-    return None
+    return member_rasmus_diff.lookup_userid_by_card(card, cache)
 
 
 def read_cards_from_rasmus(path: str, card_col="Card", name_col="Name", pid_col=None):
@@ -183,15 +104,43 @@ def build_userdata_xml(card: str, name: str, pid: str | None, group_id: str) ->
     return ET.tostring(root, encoding="utf-8", xml_declaration=True)
 
 
+def _guid(value: str | None) -> str | None:
+    """Sidste stykke af en URI (…/users/{guid}) eller værdien selv, hvis det er en GUID."""
+    tail = (value or "").strip().rstrip("/").rsplit("/", 1)[-1]
+    try:
+        uuid.UUID(tail)
+    except ValueError:
+        return None
+    return tail
+
+
+def created_user_id(location: str | None, body: bytes | str | None) -> str | None:
+    """
+    GUID for en nyoprettet bruger: fra Location-headeren (…/users/{guid}) eller et
+    <UserID>-element i svarets krop. Alt andet (202/204 uden krop, "OK",
+    <boolean>true</boolean>, …) giver None, så kortet slås op i stedet for at
+    en vilkårlig tekst havner i kort-cachen som UserID.
+    """
+    uid = _guid(location)
+    if uid or not body or not body.strip():
+        return uid
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return None
+    el = next((e for e in root.iter() if _localname(e.tag).lower() == "userid"), None)
+    return _guid(el.text) if el is not None else None
+
+
 def create_user(card: str, name: str, pid: str | None) -> tuple[bool, str | None]:
+    """(True, UserID|None) ved oprettelse, (False, "already_exists") ved 409, ellers (False, fejl)."""
     url = f"{ACCT_BASE}/users"
     body = build_userdata_xml(card, name, pid, GROUP_ID)
-    headers = {"Content-Type": "application/xml; charset=utf-8", "Accept": "application/xml"}
-    r = requests.post(url, data=body, auth=auth, headers=headers, timeout=30)
+    r = acct_client.post(url, data=body, headers=acct_client.XML_BODY_HEADERS, timeout=30)
 
     # ✅ include 202 as a success
     if r.status_code in (200, 201, 202, 204):
-        return True, None
+        return True, created_user_id(r.headers.get("Location"), r.content)
     if r.status_code == 409:
         return False, "already_exists"
 
@@ -200,76 +149,121 @@ def create_user(card: str, name: str, pid: str | None) -> tuple[bool, str | None
     except requests.HTTPError:
         return False, f"{r.status_code} {(r.text or '')[:300]}"
 
-    return True, None
+    return True, created_user_id(r.headers.get("Location"), r.content)
 
 
-def main():
-    ap = argparse.ArgumentParser(description="Opret manglende brugere fra rasmus-liste.csv (uden all_users.csv)")
-    ap.add_argument("rasmus_csv", help="fx rasmus-liste.csv (Card[,Name,Pid])")
-    ap.add_argument("--card-col", default="Card")
-    ap.add_argument("--name-col", default="Name")
-    ap.add_argument("--pid-col",  default=None)
-    ap.add_argument("--dry-run", action="store_true", help="Vis hvad der ville blive oprettet, uden at oprette")
-    args = ap.parse_args()
+def fold_into_diff(created: dict, diff: dict, group_by_card: dict, resolved: dict | None = None) -> None:
+    """
+    Opdatér diff og gruppe-tilstand i hukommelsen efter create_missing i stedet for
+    at hente /users og gruppen igen. Oprettede brugere er POST'et med GROUP_ID og
+    EntryRemaining=1, så de er medlemmer og kræver ingen handling; kort der gav 409
+    findes allerede og skal tilføjes gruppen. resolved: card -> UserID for kort uden
+    UserID i svaret (se cards_to_resolve).
+    """
+    resolved = resolved or {}
+    done = set()
+    for card in created["created"]:
+        uid = created["user_ids"].get(card) or resolved.get(card)
+        if uid:
+            group_by_card[card] = {"UserID": uid, "EntryRemaining": "1"}
+            done.add(card)
+    for card in created["already_exists"]:
+        uid = resolved.get(card)
+        if uid:
+            if uid not in diff["to_add"]:
+                diff["to_add"].append(uid)
+            done.add(card)
+    diff["missing"] = [c for c in diff["missing"] if c not in done]
 
+
+def cards_to_resolve(created: dict) -> list[str]:
+    """Kort hvis UserID ikke kom med i oprettelsessvaret (inkl. 409) — skal slås op."""
+    return [c for c in created["created"] if not created["user_ids"].get(c)] + list(created["already_exists"])
+
+
+def create_missing(rasmus: dict, cards=None, cache: CardCache | None = None,
+                   dry_run: bool = False, write: bool = True) -> dict:
+    """
+    Opret brugere for kort fra rasmus (card -> {"name", "pid"}) der ikke findes i ACCT.
+    cards: allerede kendte manglende kort (fx diff'ens "missing") — så springes
+    opslaget over; ellers slås alle kort i rasmus op.
+    Returnerer {"to_create", "created", "user_ids" (card -> UserID|None fra svaret),
+    "already_exists", "errors"};
+    write=True gemmer to_create_cards.json / create_user_errors.json.
+    """
     if not ACCT_USER or not ACCT_PASS:
         raise RuntimeError("ACCT_USER/ACCT_PASS mangler i env.")
     if not GROUP_ID:
         raise RuntimeError("GROUP_ID mangler i env.")
 
-    cache = load_cache(CACHE_FILE)
-
-    rasmus = read_cards_from_rasmus(args.rasmus_csv, args.card_col, args.name_col, args.pid_col)
+    if cache is None:
+        cache = CardCache()
 
     # Find “mangler” via API (Card findes ikke => opret)
-    to_create: list[str] = []
-    already_exists: list[str] = []
-
-    for card in rasmus.keys():
-        uid = lookup_userid_by_card(card, cache)
-        if uid:
-            already_exists.append(card)
-        else:
-            to_create.append(card)
-
-    print(f"🔎 Findes allerede i systemet (via API): {len(already_exists)}")
+    if cards is None:
+        resolved = member_rasmus_diff.resolve_cards(rasmus.keys(), cache)
+        to_create = [c for c in rasmus if not resolved.get(c)]
+        print(f"🔎 Findes allerede i systemet (via API): {len(rasmus) - len(to_create)}")
+    else:
+        to_create = [c for c in cards if c in rasmus]
     print(f"🆕 Mangler i systemet: {len(to_create)} kort (oprettes som brugere)")
 
-    save_cache(CACHE_FILE, cache)
+    cache.flush()
+    result = {"to_create": to_create, "created": [], "user_ids": {}, "already_exists": [], "errors": []}
 
-    if args.dry_run:
-        Path("to_create_cards.json").write_text(json.dumps(to_create, indent=2, ensure_ascii=False), encoding="utf-8")
-        print("📝 Dry-run: gemt liste i to_create_cards.json")
-        return
-
-    ok = 0
-    conflicts = 0
-    errs = []
+    if dry_run:
+        if write:
+            Path("to_create_cards.json").write_text(json.dumps(to_create, indent=2, ensure_ascii=False), encoding="utf-8")
+            print("📝 Dry-run: gemt liste i to_create_cards.json")
+        return result
 
+    errs = result["errors"]
     for card in to_create:
         name = rasmus[card]["name"]
         pid  = rasmus[card]["pid"]
         success, info = create_user(card, name, pid)
+        if success and info:
+            cache.put(card, info)  # UserID fra svaret — intet nyt opslag
+        elif success or info == "already_exists":
+            cache.invalidate_card(card)  # evt. negativ post er nu forkert
         if success:
-            ok += 1
+            result["created"].append(card)
+            result["user_ids"][card] = info
             print(f"✅ Oprettet bruger – Card {card} (Name: {name or card})")
         else:
             if info == "already_exists":
-                conflicts += 1
+                result["already_exists"].append(card)
                 print(f"• Springes over – Card {card} findes allerede (409)")
             else:
                 errs.append({"card": card, "error": info})
                 print(f"❌ Fejl for Card {card}: {info}")
 
+    cache.flush()
+
     print("\n--- Resultat ---")
-    print(f"Oprettet: {ok}  | Allerede fandtes (409): {conflicts}  | Fejl: {len(errs)}")
+    print(f"Oprettet: {len(result['created'])}  | Allerede fandtes (409): {len(result['already_exists'])}  | Fejl: {len(errs)}")
 
-    if errs:
+    if errs and write:
         Path("create_user_errors.json").write_text(json.dumps(errs, indent=2, ensure_ascii=False), encoding="utf-8")
         print("📝 Fejl gemt i create_user_errors.json")
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Opret manglende brugere fra rasmus-liste.csv (uden all_users.csv)")
+    ap.add_argument("rasmus_csv", help="fx rasmus-liste.csv (Card[,Name,Pid])")
+    ap.add_argument("--card-col", default="Card")
+    ap.add_argument("--name-col", default="Name")
+    ap.add_argument("--pid-col",  default=None)
+    ap.add_argument("--dry-run", action="store_true", help="Vis hvad der ville blive oprettet, uden at oprette")
+    args = ap.parse_args()
+
+    rasmus = read_cards_from_rasmus(args.rasmus_csv, args.card_col, args.name_col, args.pid_col)
+    create_missing(rasmus, dry_run=args.dry_run)
 
-    # Tip: efter oprettelser, kør diff-script igen så to_add kan mappes til UserIDs
-    print("\n➡️  Kør nu member_rasmus_diff.py igen for at få to_add.json udfyldt via API.")
+    if not args.dry_run:
+        # Tip: efter oprettelser, kør diff-script igen så to_add kan mappes til UserIDs
+        print("\n➡️  Kør nu member_rasmus_diff.py igen for at få to_add.json udfyldt via API.")
 
 
 if __name__ == "__main__":
@@ -1,8 +1,9 @@
 # find_users.py
 import csv
 import xml.etree.ElementTree as ET
-import requests
-from requests.auth import HTTPBasicAuth
+from utils import acct_client
+from utils import snapshot
+from utils.xml_utils import iter_elements
 
 # --- ACCT config ---
 import os
@@ -17,10 +18,9 @@ NS = {
     "n": "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary",
     "i": "http://www.w3.org/2001/XMLSchema-instance",
 }
-auth = HTTPBasicAuth(ACCT_USER, ACCT_PASS)
 
 def get_xml(url: str) -> ET.Element:
-    r = requests.get(url, auth=auth, headers={"Accept": "application/xml"}, timeout=30)
+    r = acct_client.get(url)
     r.raise_for_status()
     return ET.fromstring(r.text)
 
@@ -40,38 +40,55 @@ def get_entry_remaining(user_el: ET.Element) -> str:
     value = (er.text or "").strip()
     return value if value else "0"
 
+def parse_user(u: ET.Element):
+    """Én <User> → {guid, card, name, entry_remaining}, eller None uden GUID."""
+    user_id_uri = (u.findtext("n:UserID", default="", namespaces=NS) or "").strip()
+    guid = user_id_uri.rsplit("/", 1)[-1] if user_id_uri else ""
+    if not guid:  # kræv mindst en GUID
+        return None
+    return {
+        "guid": guid,
+        "card": (u.findtext("n:Card", default="", namespaces=NS) or "").strip(),
+        "name": (u.findtext("n:Name", default="", namespaces=NS) or "").strip(),
+        "entry_remaining": get_entry_remaining(u),
+    }
+
 def parse_users(xml_root: ET.Element):
     """Returnér liste af dicts: {guid, card, name, entry_remaining} fra <UserCollection>."""
     users = []
     for u in xml_root.findall("n:User", NS):
-        user_id_uri = (u.findtext("n:UserID", default="", namespaces=NS) or "").strip()
-        guid = user_id_uri.rsplit("/", 1)[-1] if user_id_uri else ""
-        card = (u.findtext("n:Card", default="", namespaces=NS) or "").strip()
-        name = (u.findtext("n:Name", default="", namespaces=NS) or "").strip()
-        entry_remaining = get_entry_remaining(u)
-        if guid:  # kræv mindst en GUID
-            users.append({
-                "guid": guid,
-                "card": card,
-                "name": name,
-                "entry_remaining": entry_remaining,
-            })
+        rec = parse_user(u)
+        if rec:
+            users.append(rec)
     return users
 
+def stream_users(url: str, handle=parse_user):
+    """
+    Streamer <User>-records fra <UserCollection>: svaret læses i chunks og
+    hvert element ryddes efter brug, så hukommelsen er flad uanset antal brugere.
+    """
+    with acct_client.get(url, stream=True) as r:
+        r.raise_for_status()
+        yield from iter_elements(r.iter_content(chunk_size=64 * 1024), f"{{{NS['n']}}}User", handle)
+
 def main():
     print(" Henter alle brugere…")
-    root = get_xml(f"{ACCT_BASE}/users")
-    users = parse_users(root)
-    print(f"• Fundet {len(users)} brugere i /users")
 
+    # hver række skrives så snart den er parset fra svaret (flad hukommelse)
+    # hele kataloget i snapshottet kun på opfordring (USER_SNAPSHOT_ALL_USERS) — se utils/snapshot.py
     wrote = 0
+    snap = snapshot.shared() if snapshot.record_all_users() else None
+    handle = snapshot.recording(parse_user, snap) if snap is not None else parse_user
     with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["Card", "Name", "UserID", "EntryRemaining"])
-        for u in users:
+        for u in stream_users(f"{ACCT_BASE}/users", handle):
             w.writerow([u["card"], u["name"], u["guid"], u["entry_remaining"]])
             wrote += 1
+    if snap is not None:
+        snap.save()
 
+    print(f"• Fundet {wrote} brugere i /users")
     print(f" Skrev {wrote} rækker til {OUTPUT_CSV}")
 
 if __name__ == "__main__":
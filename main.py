@@ -1,60 +1,84 @@
 import os
 import sys
-import datetime
-import logging
-from google.cloud import storage
-
-# --- IMPORTER DINE EKSISTERENDE SCRIPTS ---
-# Bemærk: Vi bruger navnet med underscores her
-import rasmus_liste_til_csv  
-import build_members_csv
-import member_rasmus_diff
-import create_missing_users
-import changing_state_of_group
+import json
+from pathlib import Path
+
+# Stage-modulerne (requests, ElementTree, ...) og google.cloud.storage importeres
+# først når de bruges, så en kold start af Cloud Function'en ikke betaler for dem
+# ved import af main. Budgettet holdes af tests/test_import_budget.py; profilér med
+#   python -m utils.import_profile main
 
 # --- KONFIGURATION ---
 BUCKET_NAME = os.getenv("BUCKET_NAME")  # Indstilles i Cloud Function Environment vars
+# "threads" (default): stage-moduler efter hinanden, apply via worker-pool
+# "async": diff → opret → anvend på én event loop (async_pipeline, kræver aiohttp)
+SYNC_ENGINE = os.getenv("SYNC_ENGINE", "threads")
 
 def upload_files_to_bucket(file_list):
-    """Uploader filer fra /tmp til Google Cloud Storage for historik"""
-    if not BUCKET_NAME:
+    """
+    Uploader filer fra /tmp til bucket'et for historik: parallelt, gzip'et og
+    indholdsadresseret (uændrede filer uploades ikke igen) + et manifest pr. kørsel.
+    Se utils/artifact_store.py (ARTIFACT_BACKEND=local til test uden GCS).
+    """
+    from utils import artifact_store
+    backend = artifact_store.backend_from_env()
+    if backend is None:
         print("Skipping upload: BUCKET_NAME env var mangler.")
         return
 
-    client = storage.Client()
-    bucket = client.bucket(BUCKET_NAME)
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
-    
-    print(f"Uploader logs til: gs://{BUCKET_NAME}/logs/{timestamp}/")
-
-    for filename in file_list:
-        if os.path.exists(filename):
-            blob = bucket.blob(f"logs/{timestamp}/{filename}")
-            blob.upload_from_filename(filename)
-            print(f" -> Uploaded {filename}")
-        else:
-            print(f" -> Fandt ikke {filename}, skipper.")
+    manifest = artifact_store.upload_artifacts(file_list, backend)
+    files = manifest["files"].values()
+    new = [e for e in files if e["uploaded"]]
+    print(f"Uploader logs: {len(files)} filer, {len(new)} nye blobs "
+          f"({sum(e['size'] for e in new)} → {sum(e['gz_size'] for e in new)} bytes gzip), "
+          f"{len(files) - len(new)} uændrede sprunget over")
+    for name in manifest["missing"]:
+        print(f" -> Fandt ikke {name}, skipper.")
+    print(f" -> Manifest: {manifest['manifest']}")
 
-def run_script_with_args(script_module, args):
-    """Snyder sys.argv så scripts med argparse tror de kaldes fra kommandolinjen"""
-    original_argv = sys.argv
-    try:
-        sys.argv = ["script_name"] + args
-        script_module.main()
-    except SystemExit as e:
-        # argparse kalder sys.exit(), vi fanger den så hele processen ikke dør
-        if e.code != 0:
-            print(f"Advarsel: {script_module.__name__} exit code {e.code}")
-    except Exception as e:
-        print(f"Fejl i {script_module.__name__}: {e}")
-        raise e
-    finally:
-        sys.argv = original_argv
+HTTP_STATS_FILE = "acct_http_stats.json"
+
+def write_http_stats(http_stats):
+    """Gem og udskriv kørslens HTTP-statistik (AIMD-loft, throttling, genforsøg)."""
+    if not http_stats:
+        return
+    Path(HTTP_STATS_FILE).write_text(json.dumps(http_stats, indent=2, ensure_ascii=False), encoding="utf-8")
+    ad = http_stats.get("adaptive") or {}
+    print(f"HTTP: genforsøg={http_stats.get('retries', 0)} throttled={ad.get('throttled', 0)} "
+          f"loft {ad.get('initial_limit', '-')}→{ad.get('final_limit', '-')} "
+          f"(min {ad.get('min_limit_seen', '-')}, max {ad.get('max_limit_seen', '-')})")
+
+RESPONSE_COUNTS = ("adds", "deletes", "updates", "missing_cards", "created",
+                   "added", "deleted", "updated", "add_errors", "delete_errors", "update_errors", "deferred")
+
+def response_body(status: str, summary: dict) -> str:
+    """JSON-svar fra entry_point: status, tællere og kørslens metrikker (utils.metrics)."""
+    return json.dumps({
+        "status": status,
+        "counts": {k: summary[k] for k in RESPONSE_COUNTS if k in summary},
+        "metrics": summary.get("metrics_report"),
+    }, ensure_ascii=False)
+
+def _profile_requested(request) -> bool | None:
+    """?profile=1 i requesten slår profilering til; ellers afgør SYNC_PROFILE (None)."""
+    args = getattr(request, "args", None) or {}
+    value = (args.get("profile") or "").strip().lower()
+    return True if value in ("1", "true", "yes", "on") else None
+
+def _select_engine(request) -> str:
+    """?engine=async i requesten overstyrer SYNC_ENGINE."""
+    args = getattr(request, "args", None) or {}
+    engine = (args.get("engine") or SYNC_ENGINE or "threads").strip().lower()
+    return engine if engine in ("threads", "async") else "threads"
 
 def entry_point(request):
     """Dette er funktionen Google kalder"""
     try:
-        print("Starter synkronisering...")
+        # tidsbudget fra FUNCTION_TIMEOUT_SEC (minus tid til upload), regnet fra nu
+        from utils.deadline import for_function
+        deadline = for_function()
+        engine = _select_engine(request)
+        print(f"Starter synkronisering... (motor: {engine})")
         
         # 1. SKIFT TIL /tmp - Dette er tricket!
         # Cloud Functions må kun skrive i /tmp. Ved at skifte her,
@@ -62,37 +86,21 @@ def entry_point(request):
         os.chdir("/tmp")
         print(f"Working directory changed to: {os.getcwd()}")
 
-        # 2. KØR SCRIPTS I RÆKKEFØLGE
-        
-        # A. Hent Rasmus listen
-        print("\n--- Kører: rasmus_liste_til_csv ---")
-        rasmus_liste_til_csv.main()
-
-        # C. Hent nuværende gruppemedlemmer
-        print("\n--- Kører: build_members_csv ---")
-        build_members_csv.main()
-
-        # D. Lav diff (sammenlign lister)
-        print("\n--- Kører: member_rasmus_diff ---")
-        member_rasmus_diff.main()
-
-        # E. Opret manglende brugere
-        # create_missing_users bruger argparse, så vi simulerer argumenter:
-        # python create_missing_users.py rasmus-liste.csv all_users.csv --card-col Card
-        print("\n--- Kører: create_missing_users ---")
-        run_script_with_args(create_missing_users, [
-            "rasmus-liste.csv", 
-            "--card-col", "Card"
-        ])
-
-        # F. Udfør ændringer (Add/Remove/Update)
-        # changing_state_of_group kigger selv efter json-filerne i working dir
-        print("\n--- Kører: changing_state_of_group ---")
-        changing_state_of_group.main()
+        # 2. KØR TRINENE (samme orkestrering som run_sync: genforsøg pr. trin,
+        #    rapport i reports/ og arkiv i logs/)
+        import orchestrator
+        summary = orchestrator.run(create_missing=True, engine=engine, env_file=None, deadline=deadline,
+                                   profile=_profile_requested(request))
+        http_stats = summary.get("http")
+
+        # AIMD-justeringer og genforsøg mod ACCT i denne kørsel
+        write_http_stats(http_stats)
 
         # 3. UPLOAD LOGS TIL BUCKET
+        import plan_operations
         files_to_save = [
             "rasmus-liste.csv",
+            "rasmus-liste.meta.json",
             "all_users.csv",
             "group_members.csv",
             "to_add.json",
@@ -102,11 +110,22 @@ def entry_point(request):
             "delete_errors.json",
             "create_user_errors.json",
             "update_errors.json",
-            "missing_cards.json"
+            "missing_cards.json",
+            plan_operations.PLAN_JSON,
+            "apply_plan.remaining.json",
+            HTTP_STATS_FILE,
+            summary["report"],
+            summary["metrics"],
+            summary["log"],
+            *summary.get("profiles", []),  # <trin>.pstats/.txt + profile_summary.json hvis profileret
         ]
         upload_files_to_bucket(files_to_save)
 
-        return "Sync Success", 200
+        if summary.get("deferred"):
+            status = f"Sync Partial: {summary['deferred']} brugere udskudt til næste kørsel (deadline)"
+        else:
+            status = "Sync Success"
+        return response_body(status, summary), 200, {"Content-Type": "application/json"}
 
     except Exception as e:
         print(f"KRITISK FEJL: {str(e)}")
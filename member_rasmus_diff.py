@@ -6,7 +6,13 @@ from typing import Dict, Optional, Set, Tuple
 import xml.etree.ElementTree as ET
 
 import requests
-from requests.auth import HTTPBasicAuth
+
+import build_members_csv
+import find_users
+from utils import acct_client, sync_state
+from utils.card_cache import CACHE_FILE, CardCache
+from utils.concurrency import dedupe, jobs_from_env, run_bounded
+from utils.xml_utils import parse_card_userid_map
 
 GROUP_MEMBERS_FILE = "group_members.csv"   # Card,Name,UserID,EntryRemaining
 RASMUS_FILE        = "rasmus-liste.csv"    # Card
@@ -16,123 +22,142 @@ ADD_JSON           = "to_add.json"         # {"to_add":    [<UserID>, ...]}
 UPDATE_JSON        = "to_update.json"      # {"to_update": [<UserID>, ...]}
 MISSING_JSON       = "missing_cards.json"  # Cards i Rasmus uden mapping i ACCT
 
-# Optional cache (Card -> UserID) for færre API-calls
-CACHE_FILE         = "acct_card_user_cache.json"
-
 # --- ACCT config ---
 ACCT_BASE = os.getenv("ACCT_BASE", "https://test.acct.dk/rest/current").rstrip("/")
 ACCT_USER = os.getenv("ACCT_USER", "")
 ACCT_PASS = os.getenv("ACCT_PASS", "")
 
+# Antal samtidige kort-opslag, og antal ukendte kort hvorfra ét fuldt /users-udtræk er billigere
+RESOLVE_JOBS = jobs_from_env("RESOLVE_JOBS", 16)
+RESOLVE_EXPORT_THRESHOLD = acct_client.env_int("RESOLVE_EXPORT_THRESHOLD", 200, minimum=0)
+
 # Namespaces (bedste bud – vi parser også “namespace-agnostisk”)
 NS_MAIN = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
 ET.register_namespace("", NS_MAIN)
 
-auth = HTTPBasicAuth(ACCT_USER, ACCT_PASS)
-
-
-def _local(tag: str) -> str:
-    return tag.split("}", 1)[-1] if "}" in tag else tag
-
-
-def _find_first_text(node: ET.Element, local_names: Set[str]) -> str:
-    for el in node.iter():
-        if _local(el.tag).lower() in {n.lower() for n in local_names}:
-            return (el.text or "").strip()
-    return ""
-
-
-def load_cache(path: str) -> Dict[str, str]:
-    p = Path(path)
-    if not p.exists():
-        return {}
-    try:
-        obj = json.loads(p.read_text(encoding="utf-8"))
-        if isinstance(obj, dict):
-            return {str(k): str(v) for k, v in obj.items() if k and v}
-    except Exception:
-        pass
-    return {}
-
-
-def save_cache(path: str, cache: Dict[str, str]) -> None:
-    Path(path).write_text(json.dumps(cache, indent=2, ensure_ascii=False), encoding="utf-8")
-
 
 def parse_users_from_xml(xml_text: str) -> Dict[str, str]:
     """
-    Robust parser: forsøger at finde records med felterne Card og (UserID|Guid|Id).
+    Robust parser: finder records med felterne Card og (UserID|Guid|Id) i ét gennemløb.
     Returnerer mapping: Card -> UserID/Guid/Id (string).
     """
-    out: Dict[str, str] = {}
-    try:
-        root = ET.fromstring(xml_text.encode("utf-8") if isinstance(xml_text, str) else xml_text)
-    except Exception:
-        return out
+    return parse_card_userid_map(xml_text)
 
-    # Vi prøver at finde “record-noder” ved at lede efter noder der indeholder både Card og UserID/Guid/Id
-    for node in root.iter():
-        card = ""
-        uid = ""
 
-        # hurtigt filter: kun noder der har et Card child et sted under sig
-        card = _find_first_text(node, {"Card"})
-        if not card:
-            continue
+def candidate_urls(card: str) -> list[str]:
+    """Et par almindelige opslags-patterns for Card (GET er safe)."""
+    return [
+        f"{ACCT_BASE}/users?card={card}",
+        f"{ACCT_BASE}/users/card/{card}",
+        f"{ACCT_BASE}/users/{card}",
+    ]
 
-        uid = _find_first_text(node, {"UserID", "UserId", "Guid", "ID", "Id"})
-        if card and uid:
-            out[card] = uid
 
-    return out
+def pick_userid(mapping: Dict[str, str], card: str) -> Optional[str]:
+    """
+    Vælg UserID for card i et opslagssvar; hvis svaret indeholder præcis 1 bruger, tag dens uid.
+    ACCT returnerer UserID som URI (…/users/{guid}) — vi returnerer kun GUID'en.
+    """
+    uid = mapping.get(card)
+    if not uid and len(mapping) == 1:
+        uid = next(iter(mapping.values()))
+    return uid.rsplit("/", 1)[-1] if uid else None
 
 
-def lookup_userid_by_card(card: str, cache: Dict[str, str]) -> Optional[str]:
+def lookup_userid_by_card(card: str, cache: CardCache) -> Optional[str]:
     card = (card or "").strip()
     if not card:
         return None
-    if card in cache:
-        return cache[card]
+    hit, uid = cache.lookup(card)
+    if hit:
+        return uid
 
     if not ACCT_USER or not ACCT_PASS:
         raise RuntimeError("ACCT_USER/ACCT_PASS mangler i env. Sæt dem før du kører.")
 
-    headers = {"Accept": "application/xml"}
-
-    # Prøv et par almindelige patterns (GET er safe)
-    candidates = [
-        f"{ACCT_BASE}/users?card={card}",
-        f"{ACCT_BASE}/users/card/{card}",
-        f"{ACCT_BASE}/users/{card}",
-    ]
-
-    for url in candidates:
+    definitive = True  # alle kandidater svarede — så må "ikke fundet" caches
+    for url in candidate_urls(card):
         try:
-            r = requests.get(url, auth=auth, headers=headers, timeout=30)
+            r = acct_client.get(url, timeout=30)
         except requests.RequestException:
+            definitive = False
             continue
 
         if r.status_code in (404, 204):
             continue
 
         if 200 <= r.status_code < 300:
-            mapping = parse_users_from_xml(r.text)
-            uid = mapping.get(card)
+            uid = pick_userid(parse_users_from_xml(r.text), card)
             if uid:
-                cache[card] = uid
+                cache.put(card, uid)
                 return uid
 
-            # fallback: hvis response indeholder præcis 1 bruger, tag dens uid
-            if len(mapping) == 1:
-                only_uid = next(iter(mapping.values()))
-                cache[card] = only_uid
-                return only_uid
-
             continue
 
+        if r.status_code >= 500:
+            definitive = False
+
+    if definitive:
+        cache.put(card, None)
     return None
 
 
+def resolve_via_export(cards, cache: CardCache) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Slå mange kort op med ét streamet /users-udtræk og match lokalt.
+    Kort der ikke er i udtrækket caches som ikke-fundet. None hvis udtrækket fejler.
+    """
+    wanted = set(cards)
+    found: Dict[str, Optional[str]] = {}
+    try:
+        for u in find_users.stream_users(f"{ACCT_BASE}/users"):
+            if u["card"] in wanted:
+                found[u["card"]] = u["guid"]
+    except (requests.RequestException, ET.ParseError) as e:
+        print(f"⚠️  /users-udtræk fejlede ({e}) — slår kortene op enkeltvis")
+        return None
+    for card in wanted:
+        cache.put(card, found.get(card))
+        found.setdefault(card, None)
+    return found
+
+
+def resolve_cards(cards, cache: CardCache, jobs: int = RESOLVE_JOBS,
+                  export_threshold: int = RESOLVE_EXPORT_THRESHOLD) -> Dict[str, Optional[str]]:
+    """
+    Card -> UserID (None hvis ikke fundet) for alle cards.
+    Dubletter fjernes og cachen spørges først; resten slås op samtidigt
+    (højst jobs ad gangen), eller via ét /users-udtræk når der er mindst
+    export_threshold ukendte kort.
+    """
+    result: Dict[str, Optional[str]] = {}
+    unresolved: list[str] = []
+    for card in dedupe((c or "").strip() for c in cards):
+        if not card:
+            continue
+        hit, uid = cache.lookup(card)
+        if hit:
+            result[card] = uid
+        else:
+            unresolved.append(card)
+    if not unresolved:
+        return result
+
+    if not ACCT_USER or not ACCT_PASS:
+        raise RuntimeError("ACCT_USER/ACCT_PASS mangler i env. Sæt dem før du kører.")
+
+    if len(unresolved) >= export_threshold:
+        print(f"• {len(unresolved)} ukendte kort — henter hele /users i stedet for enkeltopslag")
+        exported = resolve_via_export(unresolved, cache)
+        if exported is not None:
+            result.update(exported)
+            return result
+
+    for card, uid in run_bounded(lambda c: lookup_userid_by_card(c, cache), unresolved, jobs):
+        result[card] = uid
+    return result
+
+
 def load_rasmus_cards(path: str) -> Set[str]:
     cards: Set[str] = set()
     with open(path, newline="", encoding="utf-8") as f:
@@ -169,37 +194,26 @@ def load_group_members(path: str) -> Dict[str, Dict[str, str]]:
     return by_card
 
 
-def main():
-    cache = load_cache(CACHE_FILE)
+def needs_reset(entry: str) -> bool:
+    e = (entry or "").strip()
+    return e != "1"  # reset alt der ikke er præcis "1" (0, -1, tom)
+
 
-    rasmus_cards = load_rasmus_cards(RASMUS_FILE)
-    group_by_card = load_group_members(GROUP_MEMBERS_FILE)
+def compute_diff(rasmus_cards: Set[str], group_by_card: Dict[str, Dict[str, str]]) -> Tuple[list, list, list]:
+    """
+    Diff by Card. Returnerer (to_delete UserIDs, to_add Cards, to_update UserIDs).
+    to_add er Cards, da de først skal slås op til UserIDs.
+    """
     group_cards = set(group_by_card.keys())
 
-    # Diffs by Card
     to_delete_cards = sorted(group_cards - rasmus_cards)
     to_add_cards = sorted(rasmus_cards - group_cards)
 
     # to_delete: kan altid mappes fra group_members.csv
     to_delete = sorted({group_by_card[c]["UserID"] for c in to_delete_cards if c in group_by_card})
 
-    # to_add: slå Card -> UserID op via API
-    to_add: list[str] = []
-    missing: list[str] = []
-    for c in to_add_cards:
-        uid = lookup_userid_by_card(c, cache)
-        if uid:
-            to_add.append(uid)
-        else:
-            missing.append(c)
-    to_add = sorted(set(to_add))
-
-    # to_update: EntryRemaining == "0" for current members, excluding anything slated for delete
+    # to_update: EntryRemaining != "1" for current members, excluding anything slated for delete
     to_delete_set = set(to_delete)
-    def needs_reset(entry: str) -> bool:
-        e = (entry or "").strip()
-        return e != "1"  # reset alt der ikke er præcis "1" (0, -1, tom)
-
     to_update = sorted({
         data["UserID"]
         for _, data in group_by_card.items()
@@ -207,14 +221,61 @@ def main():
         and data["UserID"] not in to_delete_set
         and needs_reset(data.get("EntryRemaining", ""))
     })
+    return to_delete, to_add_cards, to_update
+
 
-    # Write JSON outputs
+def unchanged_since_sync(rasmus_changed: bool, rasmus_cards: Set[str],
+                         group_by_card: Dict[str, Dict[str, str]]) -> bool:
+    """
+    True når Rasmus-downloaden var uændret (rasmus_liste_til_csv) og den gemte
+    sync-tilstand svarer til både Rasmus-listen og gruppen uden udestående kort:
+    så er der intet at diff'e, oprette eller anvende.
+    """
+    return not rasmus_changed and sync_state.unchanged(sync_state.load(), rasmus_cards, group_by_card)
+
+
+def incremental_diff(rasmus_cards: Set[str], group_by_card: Dict[str, Dict[str, str]]) -> Tuple[list, list, list]:
+    """
+    compute_diff mod sidste kørsels gemte tilstand (utils.sync_state):
+    uændrede hashes og intet udestående → tomme lister; ellers diff'es kun
+    de kort hvis rækker har ændret sig. Uden gemt tilstand: fuld diff.
+    """
+    state = sync_state.load()
+    if state is None:
+        return compute_diff(rasmus_cards, group_by_card)
+    if sync_state.unchanged(state, rasmus_cards, group_by_card):
+        print("• Rasmus-liste og gruppe er uændrede siden sidste kørsel — intet at gøre")
+        return [], [], []
+    changed = sync_state.changed_cards(state, rasmus_cards, group_by_card)
+    print(f"• Inkrementel diff: {len(changed)} ændrede/udestående kort "
+          f"(af {len(rasmus_cards | set(group_by_card))})")
+    return compute_diff(rasmus_cards & changed, {c: r for c, r in group_by_card.items() if c in changed})
+
+
+def commit_sync_state(group_by_card: Optional[Dict[str, Dict[str, str]]] = None,
+                      rasmus_cards: Optional[Set[str]] = None) -> None:
+    """
+    Gem post-state efter ADD/DEL/UPD til næste inkrementelle kørsel.
+    group_by_card=None: gruppen hentes igen (der er sket ændringer).
+    """
+    if not sync_state.enabled():
+        return
+    if rasmus_cards is None:
+        if not Path(RASMUS_FILE).exists():
+            return
+        rasmus_cards = load_rasmus_cards(RASMUS_FILE)
+    if group_by_card is None:
+        group_by_card = build_members_csv.members_by_card(build_members_csv.stream_users(
+            f"{build_members_csv.ACCT_BASE}/groups/{build_members_csv.GROUP_ID}/users"))
+    state = sync_state.save(rasmus_cards, group_by_card, needs_reset)
+    print(f"• Sync-tilstand gemt ({len(state['pending'])} udestående kort)")
+
+
+def write_diff_outputs(to_add: list, to_delete: list, to_update: list, missing: list) -> None:
     Path(ADD_JSON).write_text(json.dumps({"to_add": to_add}, indent=2, ensure_ascii=False), encoding="utf-8")
     Path(DELETE_JSON).write_text(json.dumps({"to_delete": to_delete}, indent=2, ensure_ascii=False), encoding="utf-8")
     Path(UPDATE_JSON).write_text(json.dumps({"to_update": to_update}, indent=2, ensure_ascii=False), encoding="utf-8")
 
-    save_cache(CACHE_FILE, cache)
-
     print(f" to_add.json:    {len(to_add)} UserIDs")
     print(f" to_delete.json: {len(to_delete)} UserIDs")
     print(f" to_update.json: {len(to_update)} UserIDs (EntryRemaining=0, excl. to_delete)")
@@ -223,6 +284,34 @@ def main():
         Path(MISSING_JSON).write_text(json.dumps(sorted(missing), indent=2, ensure_ascii=False), encoding="utf-8")
         print(f"⚠️  {len(missing)} Cards fra rasmus-liste blev ikke fundet via API → {MISSING_JSON}")
         print("   Kør create_missing_users.py først, og kør derefter member_rasmus_diff.py igen.")
+    else:
+        Path(MISSING_JSON).unlink(missing_ok=True)  # ingen forældet liste fra en tidligere kørsel
+
+
+def diff_stage(rasmus_cards: Set[str], group_by_card: Dict[str, Dict[str, str]],
+               cache: Optional[CardCache] = None, write: bool = True) -> Dict[str, list]:
+    """
+    Diff + Card -> UserID-opslag i hukommelsen.
+    Returnerer {"to_add": UserIDs, "to_delete": UserIDs, "to_update": UserIDs, "missing": Cards};
+    write=True skriver desuden to_*.json / missing_cards.json til arkivet.
+    """
+    if cache is None:
+        cache = CardCache()
+    to_delete, to_add_cards, to_update = incremental_diff(rasmus_cards, group_by_card)
+
+    # to_add: slå Card -> UserID op via API
+    resolved = resolve_cards(to_add_cards, cache)
+    to_add = sorted({uid for uid in resolved.values() if uid})
+    missing = [c for c in to_add_cards if not resolved.get(c)]
+
+    cache.flush()
+    if write:
+        write_diff_outputs(to_add, to_delete, to_update, missing)
+    return {"to_add": to_add, "to_delete": to_delete, "to_update": to_update, "missing": missing}
+
+
+def main():
+    diff_stage(load_rasmus_cards(RASMUS_FILE), load_group_members(GROUP_MEMBERS_FILE))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+# orchestrator.py
+"""
+Daglig synk & rapport i én Python-proces (afløser for shell-kæden i run_sync).
+
+Samme flag som run_sync:
+  --create-missing / --opret-manglende   opret også brugere der mangler i ACCT
+  --dry-run / --tørkørsel                simulér kun (ingen ændringer i ACCT)
+  --profile                              cProfile + tracemalloc pr. trin (utils.stage_profile)
+
+Trinene køres af pipeline.run (eller async_pipeline.run med --engine async)
+med genforsøg pr. trin i samme proces; derefter skrives samme rapport-CSV
+(reports/report_<ts>.csv) og samme arkiv af artefakter (logs/) som før,
+samt reports/metrics_<ts>.json med HTTP pr. endpoint og tid pr. trin
+(utils.metrics).
+Al output spejles til logs/run_<ts>.log.
+
+Bruges også fra main.entry_point (run(..., env_file=None)).
+
+Kør:  python orchestrator.py [--create-missing] [--dry-run] [--engine threads|async]
+"""
+import argparse
+import csv
+import os
+import shutil
+import sys
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+LOG_DIR = "logs"
+REPORT_DIR = "reports"
+REPORT_FIELDS = ["timestamp", "adds", "deleted", "updates", "missing_cards",
+                 "http_retries", "http_throttled", "http_limit_min", "http_limit_final"]
+# kopieres til logs/<navn>_<ts><endelse> efter kørslen
+ARCHIVE_FILES = ["to_add.json", "to_delete.json", "to_update.json", "missing_cards.json",
+                 "apply_plan.json", "apply_plan.remaining.json", "group_members.csv", "rasmus-liste.csv"]
+
+
+class _Tee:
+    """Skriv til både den oprindelige strøm og logfilen."""
+    def __init__(self, stream, logfile):
+        self.stream, self.logfile = stream, logfile
+
+    def write(self, s):
+        self.stream.write(s)
+        self.logfile.write(s)
+        return len(s)
+
+    def flush(self):
+        self.stream.flush()
+        self.logfile.flush()
+
+
+def load_env_file(path: str = ".env") -> bool:
+    """KEY=VALUE-linjer fra .env ind i os.environ (som 'set -a; source .env')."""
+    p = Path(path)
+    if not p.is_file():
+        return False
+    for line in p.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, value = line.removeprefix("export ").split("=", 1)
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        os.environ[key.strip()] = value
+    return True
+
+
+def report_row(ts: str, summary: dict) -> dict:
+    """Rapportrække: planlagte ændringer (som to_*.json) + HTTP-statistik for kørslen."""
+    http = summary.get("http") or {}
+    ad = http.get("adaptive") or {}
+    return {
+        "timestamp": ts,
+        "adds": summary.get("adds", 0),
+        "deleted": summary.get("deletes", 0),
+        "updates": summary.get("updates", 0),
+        "missing_cards": summary.get("missing_cards", 0),
+        "http_retries": http.get("retries", 0),
+        "http_throttled": ad.get("throttled", 0),
+        "http_limit_min": ad.get("min_limit_seen", ""),
+        "http_limit_final": ad.get("final_limit", ""),
+    }
+
+
+def write_report(path: Path, row: dict) -> None:
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        w.writeheader()
+        w.writerow(row)
+
+
+def archive(ts: str, log_dir: Path) -> list[str]:
+    """Kopiér diff-artefakter til log_dir med tidsstempel; returnerer de arkiverede stier."""
+    out = []
+    for name in ARCHIVE_FILES:
+        src = Path(name)
+        if src.exists():
+            dst = log_dir / f"{src.stem}_{ts}{src.suffix}"
+            shutil.copy2(src, dst)
+            out.append(str(dst))
+    return out
+
+
+def run(create_missing: bool = False, dry_run: bool = False, engine: str = "threads",
+        env_file: str | None = ".env", log_dir: str = LOG_DIR, report_dir: str = REPORT_DIR,
+        tee: bool = True, deadline=None, profile: bool | None = None) -> dict:
+    """
+    Kør hele synk'en og skriv rapport + arkiv. Returnerer summary med 'report', 'metrics',
+    'metrics_report' (dict'en fra utils.metrics), 'log' og 'archived'.
+    deadline (utils.deadline.Deadline) bruges af apply i trådmotoren.
+    profile (default SYNC_PROFILE): profilér hvert trin; filerne står i summary['profiles'].
+    """
+    ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    logs, reports = Path(log_dir), Path(report_dir)
+    logs.mkdir(parents=True, exist_ok=True)
+    reports.mkdir(parents=True, exist_ok=True)
+    log_path = logs / f"run_{ts}.log"
+
+    logfile = log_path.open("a", encoding="utf-8")
+    saved = sys.stdout, sys.stderr
+    saved_stats_file = os.environ.get("ACCT_STATS_FILE")
+    if tee:
+        sys.stdout, sys.stderr = _Tee(sys.stdout, logfile), _Tee(sys.stderr, logfile)
+    try:
+        # miljøet skal være på plads før stage-modulerne importeres (de læser env ved import)
+        env_loaded = load_env_file(env_file) if env_file else None
+        # stats-filen gælder kun denne kørsel; env gendannes bagefter, så en varm
+        # instans ikke bliver ved med at skrive til første kørsels fil
+        stats_file = os.environ.get("ACCT_STATS_FILE") or str(logs / f"acct_stats_{ts}.jsonl")
+        os.environ["ACCT_STATS_FILE"] = stats_file
+        from pipeline import log
+        from utils import acct_client, metrics, snapshot, stage_profile
+        # en varm Cloud Function-instans genbruger processen: start med ny session,
+        # nye retry-/AIMD-tællere, tomme metrikker og tomt snapshot
+        acct_client.reset_session()
+        metrics.reset()
+        snapshot.reset_shared()
+        start = time.monotonic()
+
+        log("INFO", "=== LIF / Lystrup Svømning — Daglig synk & rapport ===")
+        log("INFO", f"Flag: opret_manglende={str(create_missing).lower()}, dry_run={str(dry_run).lower()}, motor={engine}")
+        log("INFO", f"Logfil: {log_path}")
+        if env_loaded:
+            log("INFO", f"Miljø indlæst fra {env_file}")
+        elif env_file:
+            log("WARN", f"{env_file} blev ikke fundet — bruger miljøvariabler fra shell")
+        profile = stage_profile.enabled() if profile is None else profile
+        if profile:
+            log("INFO", f"Profilering slået til: {stage_profile.start(logs / f'profile_{ts}')}")
+
+        try:
+            if engine == "async":
+                import async_pipeline
+                import pipeline
+                import rasmus_liste_til_csv
+                rasmus_changed = pipeline.stage("rasmus", rasmus_liste_til_csv.main)
+                summary = pipeline.stage("async_pipeline", async_pipeline.run,
+                                         create_missing=create_missing, dry_run=dry_run,
+                                         rasmus_changed=rasmus_changed, retries=1)
+            else:
+                import pipeline
+                summary = pipeline.run(create_missing=create_missing, dry_run=dry_run, deadline=deadline)
+        except Exception as e:
+            traceback.print_exc()
+            log("ERROR", f"Pipeline fejlede: {e}")
+            log("ERROR", f"Se log: {log_path}")
+            raise
+        finally:
+            profiles = stage_profile.finish()
+            # kørslens HTTP-statistik skrives her (ikke først ved exit) og sessionen lukkes,
+            # så atexit-hooken i acct_client ikke skriver den igen
+            acct_client.write_stats(stats_file, "orchestrator")
+            acct_client.reset_session()
+
+        report = reports / f"report_{ts}.csv"
+        write_report(report, report_row(ts, summary))
+        metrics.record_stage("total", time.monotonic() - start)
+        metrics_path = reports / f"metrics_{ts}.json"
+        summary["metrics_report"] = metrics.write_report(metrics_path, {"timestamp": ts, "engine": engine})
+        metrics.print_summary(summary["metrics_report"])
+        summary["archived"] = archive(ts, logs)
+        summary["profiles"] = profiles
+        summary["report"], summary["metrics"], summary["log"] = str(report), str(metrics_path), str(log_path)
+        log("INFO", f"Rapport skrevet: {report} (metrikker: {metrics_path})")
+        log("INFO", f"Artefakter arkiveret i: {logs}")
+        log("INFO", "Færdig.")
+        return summary
+    finally:
+        sys.stdout, sys.stderr = saved
+        logfile.close()
+        if saved_stats_file is None:
+            os.environ.pop("ACCT_STATS_FILE", None)
+        else:
+            os.environ["ACCT_STATS_FILE"] = saved_stats_file
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Daglig synk & rapport (Rasmus-liste → ACCT-gruppe)")
+    ap.add_argument("--create-missing", "--opret-manglende", action="store_true",
+                    help="opret også brugere, der mangler i systemet")
+    ap.add_argument("--dry-run", "--tørkørsel", action="store_true", help="simulerer kun (ingen ændringer i ACCT)")
+    ap.add_argument("--engine", choices=("threads", "async"), default=os.getenv("SYNC_ENGINE", "threads"))
+    ap.add_argument("--profile", action="store_true", default=None,
+                    help="cProfile + tracemalloc pr. trin; gemmes i logs/profile_<ts>/ (env SYNC_PROFILE)")
+    args = ap.parse_args(argv)
+    try:
+        run(create_missing=args.create_missing, dry_run=args.dry_run, engine=args.engine, profile=args.profile)
+    except Exception:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# pipeline.py
+"""
+Trådbaseret sync med trinene kædet i hukommelsen.
+
+Hvert trin er en funktion der tager og returnerer almindelige strukturer:
+  rasmus_liste_til_csv.fetch_rasmus      → (card -> {"name", "pid"}, changed)
+  build_members_csv.fetch_group_members  → card -> {"UserID", "EntryRemaining"}
+  member_rasmus_diff.diff_stage          → {"to_add", "to_delete", "to_update", "missing"}
+  create_missing_users.create_missing    → {"to_create", "created", "user_ids", "already_exists", "errors"}
+  plan_operations.build_plan             → plan
+  changing_state_of_group.apply_plan     → tællere fra report_results
+Intet trin læser et andet trins fil igen. group_members.csv, to_*.json og
+apply_plan.json skrives kun til arkivet (write_artifacts); rasmus-liste.csv
+skrives altid, da betingede downloads bygger på den.
+
+Er Rasmus-listen uændret (changed=False) og svarer den gemte sync-tilstand
+til gruppen uden udestående kort, stopper kørslen efter gruppe-eksporten:
+diff, opret, plan og anvend springes over.
+
+Med en deadline (utils.deadline.Deadline, fx fra main.entry_point) udskyder
+apply de ops der ikke kan nå at blive færdige; de gemmes som rest-plan og
+står som udestående i sync-tilstanden, så næste kørsels diff tager dem.
+
+Et trin der fejler (undtagelse) prøves igen med 2s, 4s, ... pause, op til
+STAGE_RETRIES gange — i samme proces, så HTTP-pool, kort-cache og snapshot
+er varme. Enkelt-kald har desuden deres egne genforsøg i utils.acct_client.
+
+Kør:  python pipeline.py [--create-missing] [--dry-run]
+"""
+import argparse
+import time
+from datetime import datetime
+
+import build_members_csv as bm
+import changing_state_of_group as cs
+import create_missing_users as cm
+import member_rasmus_diff as mrd
+import plan_operations as planner
+import rasmus_liste_til_csv as rl
+from utils import acct_client, metrics, stage_profile
+from utils.card_cache import CardCache
+from utils.concurrency import dedupe
+
+# forsøg pr. trin (som py_run i run_sync)
+STAGE_RETRIES = {"rasmus": 3, "group": 3, "diff": 1, "create": 2, "plan": 1, "apply": 2}
+STAGE_DELAY = 2.0
+
+# udskiftelig i tests
+_sleep = time.sleep
+
+
+def log(level: str, msg: str) -> None:
+    print(f"{datetime.now().astimezone().isoformat(timespec='seconds')} {level:<5} {msg}", flush=True)
+
+
+def stage(label: str, fn, *args, retries: int | None = None, **kwargs):
+    """
+    Kør et trin med timing og genforsøg; sidste fejl kastes videre. Vægurstiden
+    registreres i utils.metrics; er profilering slået til, køres trinet (inkl.
+    genforsøg) under utils.stage_profile.
+    """
+    return stage_profile.profiled(label, _stage, label, fn, *args, retries=retries, **kwargs)
+
+
+def _stage(label: str, fn, *args, retries: int | None = None, **kwargs):
+    attempts = max(1, retries if retries is not None else STAGE_RETRIES.get(label, 1))
+    delay = STAGE_DELAY
+    log("INFO", f"KØR {label}")
+    start = time.monotonic()
+    for attempt in range(1, attempts + 1):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts:
+                metrics.record_stage(label, time.monotonic() - start, attempt, ok=False)
+                log("ERROR", f"FEJL {label} efter {attempts} forsøg: {e}")
+                raise
+            log("WARN", f"Forsøg {attempt}/{attempts} fejlede for {label}: {e}")
+            _sleep(delay)
+            delay *= 2
+            continue
+        elapsed = time.monotonic() - start
+        metrics.record_stage(label, elapsed, attempt)
+        log("INFO", f"OK  {label} (forsøg {attempt}/{attempts}, {elapsed:.1f}s)")
+        return result
+
+
+def run(create_missing: bool = True, dry_run: bool = False, write_artifacts: bool = True,
+        deadline=None) -> dict:
+    """Hele kørslen i én proces. Returnerer samme summary-form som async_pipeline.run."""
+    rasmus, rasmus_changed = stage("rasmus", rl.fetch_rasmus)
+    rasmus_cards = set(rasmus)
+    cache = CardCache()
+
+    group_by_card = stage("group", bm.fetch_group_members, write=write_artifacts)
+    if mrd.unchanged_since_sync(rasmus_changed, rasmus_cards, group_by_card):
+        log("INFO", "Rasmus-listen og gruppen er uændrede siden sidste kørsel — springer diff, opret og anvend over")
+        if write_artifacts:
+            # ingen forældede to_*.json/apply_plan.json fra en tidligere kørsel i arkivet
+            mrd.write_diff_outputs([], [], [], [])
+            planner.write_plan(planner.build_plan([], [], []))
+        return {"adds": 0, "deletes": 0, "updates": 0, "missing_cards": 0, "created": 0,
+                "rasmus_changed": False, "http": acct_client.stats()}
+    diff = stage("diff", mrd.diff_stage, rasmus_cards, group_by_card, cache, write=write_artifacts)
+    summary = {"adds": len(diff["to_add"]), "deletes": len(diff["to_delete"]),
+               "updates": len(diff["to_update"]), "missing_cards": len(diff["missing"]),
+               "created": 0, "rasmus_changed": rasmus_changed}
+
+    # manglende kort er allerede slået op af diff'en — create_missing opretter dem direkte
+    # (POST'es med GROUP_ID; 409 ved et genforsøg tælles som "findes allerede").
+    # Diff og gruppe opdateres i hukommelsen ud fra svarene — ingen ny eksport.
+    if create_missing and diff["missing"]:
+        created = stage("create", cm.create_missing, rasmus, diff["missing"], cache,
+                        dry_run=dry_run, write=write_artifacts)
+        summary["created"] = len(created["created"])
+        if created["created"] or created["already_exists"]:
+            cm.fold_into_diff(created, diff, group_by_card, mrd.resolve_cards(cm.cards_to_resolve(created), cache))
+            cache.flush()
+            if write_artifacts:
+                mrd.write_diff_outputs(diff["to_add"], diff["to_delete"], diff["to_update"], diff["missing"])
+            summary.update(adds=len(diff["to_add"]), missing_cards=len(diff["missing"]))
+
+    plan = planner.build_plan(dedupe(diff["to_add"]), dedupe(diff["to_delete"]), dedupe(diff["to_update"]))
+    if write_artifacts:
+        planner.write_plan(plan)
+    planner.print_summary(plan)
+
+    if dry_run:
+        log("INFO", "Tørkørsel: ingen ændringer sendt til ACCT (se planen i apply_plan.json)")
+    else:
+        summary.update(stage("apply", cs.apply_plan, plan, rasmus_cards=rasmus_cards,
+                             group_by_card=group_by_card, deadline=deadline, cache=cache))
+        if summary.get("deferred"):
+            log("WARN", f"Deadline nået: {summary['deferred']} brugere udskudt til næste kørsel ({cs.REMAINING_PLAN_FILE})")
+    summary["http"] = acct_client.stats()
+    return summary
+
+
+def main(argv: list[str] | None = None) -> dict:
+    ap = argparse.ArgumentParser(description="Rasmus → diff → opret → anvend i én proces")
+    ap.add_argument("--create-missing", "--opret-manglende", action="store_true")
+    ap.add_argument("--dry-run", "--tørkørsel", action="store_true")
+    ap.add_argument("--no-artifacts", action="store_true", help="skriv ikke group_members.csv/to_*.json/apply_plan.json")
+    args = ap.parse_args(argv)
+    return run(create_missing=args.create_missing, dry_run=args.dry_run, write_artifacts=not args.no_artifacts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# plan_operations.py
+"""
+Planlægger mellem member_rasmus_diff og changing_state_of_group.
+
+Samler to_add / to_delete / to_update til én handling pr. bruger, så en
+bruger der står i flere lister kun får én læs-ændr-skriv mod /users/{guid}:
+  add         tilføj GROUP_ID (EntryRemaining bevares)
+  remove      fjern fra GROUP_ID (eller slet brugeren, jf. DELETE_STRATEGY)
+  update      sæt EntryRemaining=1
+  add_update  tilføj GROUP_ID og sæt EntryRemaining=1 i samme PUT
+Konflikter: står en bruger i både to_add og to_delete, vinder add (brugeren
+er på Rasmus-listen); står den i to_delete og to_update, vinder delete.
+
+Planen gemmes som apply_plan.json, så den kan læses i en tørkørsel, og
+anvendes med: python changing_state_of_group.py --plan apply_plan.json
+
+Kør:  python plan_operations.py [to_add.json to_delete.json to_update.json] [--out apply_plan.json]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+PLAN_JSON = "apply_plan.json"
+ACTIONS = ("add", "remove", "update", "add_update")
+
+GROUP_ID = os.getenv("GROUP_ID", "")
+DELETE_STRATEGY = os.getenv("DELETE_STRATEGY", "group_only")
+
+
+def build_plan(to_add, to_delete, to_update) -> dict:
+    """Kompilér de tre lister til én handling pr. bruger (rækkefølge: første forekomst)."""
+    sources: dict[str, list[str]] = {}
+    for name, ids in (("to_add", to_add), ("to_delete", to_delete), ("to_update", to_update)):
+        for uid in ids:
+            lst = sources.setdefault(uid, [])
+            if name not in lst:
+                lst.append(name)
+
+    users, conflicts = [], []
+    for uid, src in sources.items():
+        add, delete, update = "to_add" in src, "to_delete" in src, "to_update" in src
+        if add and delete:
+            conflicts.append({"user_id": uid, "sources": src, "resolution": "add"})
+            delete = False
+        if delete:
+            if update:
+                conflicts.append({"user_id": uid, "sources": src, "resolution": "remove"})
+            users.append({"user_id": uid, "action": "remove",
+                          "groups": {"add": [], "remove": [GROUP_ID]}, "entry_remaining": None, "sources": src})
+        elif add:
+            users.append({"user_id": uid, "action": "add_update" if update else "add",
+                          "groups": {"add": [GROUP_ID], "remove": []},
+                          "entry_remaining": "1" if update else None, "sources": src})
+        else:
+            users.append({"user_id": uid, "action": "update",
+                          "groups": {"add": [], "remove": []}, "entry_remaining": "1", "sources": src})
+
+    counts = {a: 0 for a in ACTIONS}
+    for u in users:
+        counts[u["action"]] += 1
+    counts["conflicts"] = len(conflicts)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "group_id": GROUP_ID,
+        "delete_strategy": DELETE_STRATEGY,
+        "counts": counts,
+        "users": users,
+        "conflicts": conflicts,
+    }
+
+
+def subplan(plan: dict, user_ids) -> dict:
+    """Delplan med kun de givne brugere (fx dem en deadline udskød), i planens rækkefølge."""
+    keep = set(user_ids)
+    users = [u for u in plan.get("users", []) if u["user_id"] in keep]
+    counts = {a: 0 for a in ACTIONS}
+    for u in users:
+        counts[u["action"]] += 1
+    counts["conflicts"] = 0
+    return {
+        **plan,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "parent_created": plan.get("created"),
+        "counts": counts,
+        "users": users,
+        "conflicts": [],
+    }
+
+
+def plan_ids(plan: dict, *actions: str) -> list[str]:
+    """GUIDs med en af de givne handlinger, i planens rækkefølge."""
+    return [u["user_id"] for u in plan.get("users", []) if u.get("action") in actions]
+
+
+def write_plan(plan: dict, path: str = PLAN_JSON) -> None:
+    Path(path).write_text(json.dumps(plan, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def load_plan(path: str = PLAN_JSON) -> dict:
+    plan = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(plan, dict) or not isinstance(plan.get("users"), list):
+        raise ValueError(f"{path}: ikke en gyldig plan (mangler 'users').")
+    if plan.get("group_id") and GROUP_ID and plan["group_id"] != GROUP_ID:
+        raise ValueError(f"{path}: planen er lavet til gruppe {plan['group_id']}, ikke {GROUP_ID}.")
+    return plan
+
+
+def print_summary(plan: dict) -> None:
+    c = plan["counts"]
+    print(f" Plan: {len(plan['users'])} brugere | add={c['add']} remove={c['remove']} "
+          f"update={c['update']} add_update={c['add_update']} (én PUT i stedet for to)")
+    if c["conflicts"]:
+        print(f"⚠️  {c['conflicts']} konflikter mellem listerne — se 'conflicts' i planen")
+
+
+def main(argv: list[str] | None = None) -> dict:
+    from changing_state_of_group import load_ids_from_json_or_csv
+
+    ap = argparse.ArgumentParser(description="Saml to_add/to_delete/to_update til én plan pr. bruger")
+    ap.add_argument("to_add", nargs="?", default="to_add.json")
+    ap.add_argument("to_delete", nargs="?", default="to_delete.json")
+    ap.add_argument("to_update", nargs="?", default="to_update.json")
+    ap.add_argument("--out", default=PLAN_JSON)
+    args = ap.parse_args(sys.argv[1:] if argv is None else argv)
+
+    lists = [load_ids_from_json_or_csv(Path(p)) for p in (args.to_add, args.to_delete, args.to_update)]
+    plan = build_plan(*lists)
+    write_plan(plan, args.out)
+    print_summary(plan)
+    print(f" Skrev {args.out}")
+    return plan
+
+
+if __name__ == "__main__":
+    main()
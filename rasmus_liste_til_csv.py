@@ -1,21 +1,208 @@
 # rasmus-liste-til_csv.py
-import io
+"""
+Henter Rasmus' Google Sheet som CSV (→ rasmus-liste.csv).
+
+Valideringerne fra sidste download (ETag/Last-Modified) og et sha256 af
+svaret gemmes i rasmus-liste.meta.json. Næste kørsel sender en betinget
+forespørgsel; ved 304 eller samme indhold genskrives rasmus-liste.csv ikke.
+
+Svaret læses i chunks med csv-modulet (ingen pandas): kort normaliseres og
+dedupliceres, krævede kolonner tjekkes, og filen skrives i samme gennemløb.
+Metafilens "changed" (input_unchanged()) fortæller de efterfølgende trin om
+inputtet er ændret; main()/fetch_rasmus() returnerer det samme. Er listen
+uændret og sync-tilstanden ligeså, springer pipelines diff/opret/anvend over.
+"""
+import codecs
+import csv
+import hashlib
+import json
 import os
-import pandas as pd
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
 import requests
 import certifi
 
+from utils import metrics
+
 FILE_ID   = os.getenv("RASMUS_SHEET_FILE_ID", "1pT6J-H4mCcCi7_kQeoUvpoepayKcndbx")
 SHEET_GID = os.getenv("RASMUS_SHEET_GID", "")  # tom = første ark
 qs = "export?format=csv" + (f"&gid={SHEET_GID}" if SHEET_GID else "")
 url = f"https://docs.google.com/spreadsheets/d/{FILE_ID}/{qs}"
 
-def main():
-    r = requests.get(url, timeout=30, verify=certifi.where())
-    r.raise_for_status()
-    df = pd.read_csv(io.StringIO(r.text))
-    df.to_csv("rasmus-liste.csv", index=False, encoding="utf-8")
-    print("Downloaded og gemt som rasmus-liste.csv")
+OUT_FILE  = "rasmus-liste.csv"
+META_FILE = "rasmus-liste.meta.json"
+CHUNK_SIZE = 64 * 1024
+# kommasepareret liste af kolonner arket desuden skal have; kortkolonnen er
+# 'Card' hvis den findes, ellers første kolonne (som read_cards_from_rasmus)
+REQUIRED_COLUMNS = [c.strip() for c in os.getenv("RASMUS_REQUIRED_COLUMNS", "").split(",")
+                    if c.strip() and c.strip().lower() != "card"]
+
+
+def load_meta(path: str = META_FILE) -> dict:
+    try:
+        meta = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def save_meta(meta: dict, path: str = META_FILE) -> None:
+    p = Path(path)
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, p)
+
+
+def input_unchanged(path: str = META_FILE) -> bool:
+    """True hvis sidste download ikke ændrede rasmus-liste.csv."""
+    return load_meta(path).get("changed") is False
+
+
+def conditional_headers(meta: dict) -> dict:
+    """If-None-Match/If-Modified-Since — kun når den lokale kopi stadig findes."""
+    if not Path(OUT_FILE).exists():
+        return {}
+    h = {}
+    if meta.get("etag"):
+        h["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        h["If-Modified-Since"] = meta["last_modified"]
+    return h
+
+
+def normalize_card(value: str | None) -> str:
+    """Kortnummer uden mellemrum; '12345.0' (tal-formateret celle) → '12345'."""
+    card = "".join((value or "").split()).lstrip("'")
+    if card.endswith(".0") and card[:-2].isdigit():
+        card = card[:-2]
+    return card
+
+
+def _lines(chunks, digest):
+    """Bytes-chunks → tekstlinjer (med linjeskift), mens sha256 opdateres."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    rest = ""
+    for chunk in chunks:
+        digest.update(chunk)
+        *lines, rest = (rest + decoder.decode(chunk)).split("\n")
+        # sidste stykke kan være en ufuldstændig linje — gemmes til næste chunk
+        for line in lines:
+            yield line + "\n"
+    rest += decoder.decode(b"", final=True)
+    if rest:
+        yield rest
+
+
+def ingest(chunks, out_path: str, into: dict | None = None) -> tuple[str, dict]:
+    """
+    Læs CSV-svaret inkrementelt og skriv den normaliserede fil i samme gennemløb:
+    kolonnenavne trimmes, kortkolonnen ('Card', ellers første kolonne) omdøbes til
+    'Card', kort normaliseres, og rækker uden kort eller med et kort der allerede
+    er set springes over.
+    into: udfyldes med card -> {"name", "pid"} (samme form som read_cards_from_rasmus).
+    Returnerer (sha256 af svaret, optælling). ValueError hvis arket ingen kolonner
+    har, eller en kolonne fra REQUIRED_COLUMNS mangler.
+    """
+    digest = hashlib.sha256()
+    reader = csv.reader(_lines(chunks, digest))
+    header = [h.strip() for h in next(reader, [])]
+    if not any(header):
+        raise ValueError("Rasmus-arket skal have en kolonne med kortnumre (fx 'Card').")
+    by_lower = {h.lower(): i for i, h in enumerate(header)}
+    missing = [c for c in REQUIRED_COLUMNS if c.lower() not in by_lower]
+    if missing:
+        raise ValueError(f"Rasmus-arket mangler kolonne(r): {', '.join(missing)} (har: {', '.join(header)})")
+    card_i = by_lower.get("card", 0)
+    name_i = by_lower.get("name")
+    header[card_i] = "Card"
+
+    seen: set[str] = set()
+    stats = {"rows": 0, "written": 0, "blank": 0, "duplicates": 0}
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        for row in reader:
+            stats["rows"] += 1
+            card = normalize_card(row[card_i] if card_i < len(row) else "")
+            if not card:
+                stats["blank"] += 1
+                continue
+            if card in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(card)
+            row = [c.strip() for c in row] + [""] * (len(header) - len(row))
+            row[card_i] = card
+            w.writerow(row[:len(header)])
+            if into is not None:
+                into[card] = {"name": row[name_i] if name_i is not None else "", "pid": ""}
+            stats["written"] += 1
+    return digest.hexdigest(), stats
+
+
+def _read_local() -> dict:
+    from create_missing_users import read_cards_from_rasmus
+    return read_cards_from_rasmus(OUT_FILE)
+
+
+def fetch_rasmus() -> tuple[dict, bool]:
+    """
+    Hent arket og returnér (card -> {"name", "pid"}, changed).
+    rasmus-liste.csv skrives altid når indholdet er ændret — den er kopien
+    som betingede forespørgsler bygger på.
+    """
+    meta = load_meta()
+    start = time.monotonic()
+    r = requests.get(url, timeout=30, verify=certifi.where(), headers=conditional_headers(meta), stream=True)
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    received = 0
+
+    def chunks():
+        nonlocal received
+        for chunk in r.iter_content(CHUNK_SIZE):
+            received += len(chunk)
+            yield chunk
+
+    with r:
+        if r.status_code == 304:
+            metrics.record_http("GET", url, 304, time.monotonic() - start)
+            save_meta({**meta, "changed": False, "checked": now})
+            print("Rasmus-listen er uændret (304) — beholder rasmus-liste.csv")
+            return _read_local(), False
+        if r.status_code >= 400:
+            metrics.record_http("GET", url, r.status_code, time.monotonic() - start)
+        r.raise_for_status()
+
+        tmp = OUT_FILE + ".tmp"
+        rasmus: dict = {}
+        try:
+            digest, stats = ingest(chunks(), tmp, rasmus)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        finally:
+            # hele downloaden (inkl. parsing undervejs) tælles som kaldets latens
+            metrics.record_http("GET", url, r.status_code, time.monotonic() - start, received)
+
+    validators = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    if digest == meta.get("sha256") and Path(OUT_FILE).exists():
+        Path(tmp).unlink()
+        save_meta({**meta, **validators, "changed": False, "checked": now})
+        print("Rasmus-listen er uændret (samme indhold) — beholder rasmus-liste.csv")
+        return rasmus, False
+
+    os.replace(tmp, OUT_FILE)
+    save_meta({**validators, "sha256": digest, "changed": True, "checked": now, "fetched": now})
+    print(f"Downloaded og gemt som rasmus-liste.csv ({stats['written']} kort; "
+          f"{stats['duplicates']} dubletter og {stats['blank']} tomme rækker sprunget over)")
+    return rasmus, True
+
+
+def main() -> bool:
+    """Hent arket; returnér True hvis rasmus-liste.csv blev (gen)skrevet."""
+    return fetch_rasmus()[1]
 
 if __name__ == "__main__":
     main()
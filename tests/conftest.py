@@ -6,13 +6,25 @@ ACCT_BASE = "https://test.acct.dk/rest/current"
 GROUP_ID  = "e9d39db7-b38f-43db-bfe1-d9a3a8f4b177"
 
 @pytest.fixture(autouse=True)
-def acct_env(monkeypatch):
+def acct_env(monkeypatch, tmp_path):
+    from utils import snapshot
     monkeypatch.setenv("ACCT_BASE", ACCT_BASE)
     monkeypatch.setenv("ACCT_USER", "user")
     monkeypatch.setenv("ACCT_PASS", "pass")
     monkeypatch.setenv("GROUP_ID", GROUP_ID)
     # default strategi så tests ikke sletter brugere
     monkeypatch.setenv("DELETE_STRATEGY", "group_only")
+    # hver test får sit eget (tomme) bruger-snapshot
+    monkeypatch.setenv("USER_SNAPSHOT_FILE", str(tmp_path/"user_snapshot.json"))
+    snapshot.reset_shared()
+    # og ingen gemt sync-tilstand fra tidligere kørsler
+    monkeypatch.setenv("SYNC_STATE_FILE", str(tmp_path/"sync_state.json"))
+    # og apply-journal i tmp, så bekræftede ops ikke deles mellem tests
+    monkeypatch.setenv("APPLY_JOURNAL_FILE", str(tmp_path/"apply_journal.jsonl"))
+    # og kort-cachen, så tests uden chdir ikke skriver i repo-roden
+    monkeypatch.setenv("CARD_CACHE_FILE", str(tmp_path/"acct_card_user_cache.json"))
+    # og lærte EntryRemaining-modes
+    monkeypatch.setenv("ENTRY_MODE_FILE", str(tmp_path/"entry_mode_memory.json"))
     yield
 
 def xml_user(card: str, name: str, entry: str | None):
@@ -0,0 +1,40 @@
+# tests/test_acct_client.py
+import responses
+
+from tests.conftest import ACCT_BASE
+
+
+def _fresh_client(monkeypatch, **env):
+    from utils import acct_client
+    for k, v in env.items():
+        monkeypatch.setenv(k, v)
+    acct_client.reset_session()
+    return acct_client
+
+
+def test_session_is_shared_and_pooled(monkeypatch):
+    ac = _fresh_client(monkeypatch, ACCT_POOL_SIZE="7")
+    s1 = ac.get_session()
+    s2 = ac.get_session()
+    assert s1 is s2
+    adapter = s1.get_adapter(f"{ACCT_BASE}/users")
+    assert adapter._pool_maxsize == 7
+    assert s1.auth.username == "user" and s1.auth.password == "pass"
+    ac.reset_session()
+
+
+@responses.activate
+def test_requests_carry_default_headers_and_auth(monkeypatch):
+    ac = _fresh_client(monkeypatch)
+    seen = {}
+
+    def cb(req):
+        seen.update(req.headers)
+        return (200, {}, "<ok/>")
+
+    responses.add_callback(responses.GET, f"{ACCT_BASE}/users", callback=cb)
+    r = ac.get(f"{ACCT_BASE}/users")
+    assert r.status_code == 200
+    assert seen["Accept"] == "application/xml"
+    assert seen["Authorization"].startswith("Basic ")
+    ac.reset_session()
@@ -0,0 +1,94 @@
+# tests/test_adaptive.py
+import time
+import responses
+
+from tests.conftest import ACCT_BASE
+from utils.adaptive import AimdController, parse_retry_after
+
+
+def _drive(ctl, status, n=1, latency=0.01, retry_after=None):
+    for _ in range(n):
+        ctl.acquire()
+        ctl.release(status, latency, retry_after)
+
+
+def test_additive_increase_while_healthy():
+    ctl = AimdController(initial=2, max_limit=5)
+    _drive(ctl, 200, n=50)
+    st = ctl.stats()
+    assert st["final_limit"] == 5
+    assert st["increases"] == 3
+
+
+def test_multiplicative_decrease_once_per_cooldown():
+    ctl = AimdController(initial=16, cooldown=60)
+    _drive(ctl, 429, n=5)   # byge af 429 fra samme vindue → kun én halvering
+    st = ctl.stats()
+    assert st["final_limit"] == 8
+    assert st["decreases"] == 1 and st["throttled"] == 5
+
+
+def test_retry_after_pauses_new_requests():
+    ctl = AimdController(initial=4)
+    _drive(ctl, 503, retry_after=0.2)
+    t0 = time.monotonic()
+    ctl.acquire()
+    assert time.monotonic() - t0 >= 0.15
+    ctl.release(200, 0.01)
+    assert ctl.stats()["retry_after_pauses"] == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("") is None
+    assert parse_retry_after("nonsense") is None
+
+
+@responses.activate
+def test_client_retries_429_and_reports_stats(monkeypatch):
+    from utils import acct_client
+    acct_client.reset_session()
+    slept = []
+    monkeypatch.setattr(acct_client, "_sleep", slept.append)
+
+    url = f"{ACCT_BASE}/users/x"
+    responses.add(responses.GET, url, status=429, headers={"Retry-After": "0"})
+    responses.add(responses.GET, url, status=200, body="<ok/>")
+
+    r = acct_client.get(url)
+    assert r.status_code == 200
+    st = acct_client.stats()
+    assert st["retries"] == 1
+    assert st["adaptive"]["throttled"] == 1
+    assert len(responses.calls) == 2
+    acct_client.reset_session()
+
+
+@responses.activate
+def test_client_does_not_retry_post_on_503(monkeypatch):
+    from utils import acct_client
+    acct_client.reset_session()
+    monkeypatch.setattr(acct_client, "_sleep", lambda s: None)
+    responses.add(responses.POST, f"{ACCT_BASE}/users", status=503)
+    assert acct_client.post(f"{ACCT_BASE}/users", data=b"<x/>").status_code == 503
+    assert len(responses.calls) == 1
+    acct_client.reset_session()
+
+
+@responses.activate
+def test_client_closes_streamed_response_before_retry(monkeypatch):
+    import requests
+    from utils import acct_client
+    acct_client.reset_session()
+    monkeypatch.setattr(acct_client, "_sleep", lambda s: None)
+    closed = []
+    orig_close = requests.Response.close
+    monkeypatch.setattr(requests.Response, "close", lambda self: (closed.append(self.status_code), orig_close(self)))
+
+    url = f"{ACCT_BASE}/groups/g/users"
+    responses.add(responses.GET, url, status=503)
+    responses.add(responses.GET, url, status=200, body="<ok/>")
+    r = acct_client.get(url, stream=True)
+    assert r.status_code == 200
+    assert closed == [503]
+    acct_client.reset_session()
@@ -0,0 +1,164 @@
+# tests/test_apply_journal.py
+import importlib
+import json
+
+import responses
+
+from tests.conftest import ACCT_BASE, GROUP_ID, xml_groups_array
+from utils import apply_journal
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+
+
+def _cs(monkeypatch, calls, fail=()):
+    import changing_state_of_group as mod
+    importlib.reload(mod)
+
+    def op(name):
+        def run(uid):
+            calls.append((name, uid))
+            return (False, "boom") if uid in fail else (True, None)
+        return run
+
+    monkeypatch.setattr(mod, "add_user_to_group", op("add"))
+    monkeypatch.setattr(mod, "_add_update_op", op("add_update"))
+    monkeypatch.setattr(mod, "_remove_op", op("remove"))
+    monkeypatch.setattr(mod, "_update_op", op("update"))
+    monkeypatch.setattr(mod, "_commit_sync_state", lambda *a, **k: None)
+    return mod
+
+
+def _plan():
+    import plan_operations as planner
+    return planner.build_plan(["a1", "a2", "au"], ["d1", "d2"], ["u1", "au"])
+
+
+class Crash(BaseException):
+    """Simulerer at processen dør midt i et apply (slipper forbi _safe)."""
+
+
+def _crash_at(name, crash_uid, calls):
+    def run(uid):
+        if uid == crash_uid:
+            raise Crash()
+        calls.append((name, uid))
+        return True, None
+    return run
+
+
+def test_plan_hash_tracks_run_id_and_content():
+    p1 = _plan()
+    p2 = dict(p1)
+    assert apply_journal.plan_hash(p1) == apply_journal.plan_hash(p2)
+    p2["created"] = "1999-01-01T00:00:00+00:00"
+    assert apply_journal.plan_hash(p1) != apply_journal.plan_hash(p2)
+    p3 = dict(p1, users=p1["users"][1:])
+    assert apply_journal.plan_hash(p1) != apply_journal.plan_hash(p3)
+
+
+def test_retry_of_interrupted_plan_skips_confirmed_ops(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    cs = _cs(monkeypatch, calls, fail={"a2"})
+    monkeypatch.setattr(cs, "_remove_op", _crash_at("remove", "d2", calls))
+    plan = _plan()
+    try:
+        cs.apply_plan(plan, jobs=1)
+    except Crash:
+        pass
+    lines = [json.loads(line) for line in (tmp_path/"apply_journal.jsonl").read_text().splitlines()]
+    assert {(r["f"], r["u"]) for r in lines} == {("add", "a1"), ("add", "au"), ("remove", "d1")}
+
+    # samme plan igen (fx pipeline-trinets retry): kun det der ikke blev bekræftet kaldes
+    calls.clear()
+    cs = _cs(monkeypatch, calls)
+    second = cs.apply_plan(plan, jobs=2)
+    assert sorted(calls) == [("add", "a2"), ("remove", "d2"), ("update", "u1")]
+    assert second["added"] == 3 and second["deleted"] == 2 and second["updated"] == 2
+    # kørt igennem: journalen er ryddet
+    assert not (tmp_path/"apply_journal.jsonl").exists()
+
+
+def test_identical_plan_in_a_later_run_is_applied_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    cs = _cs(monkeypatch, calls)
+    plan = _plan()
+    cs.apply_plan(plan, jobs=2)
+    first = sorted(calls)
+
+    # næste dags kørsel med samme diff (ny plan) — og selv præcis samme plan — kalder ACCT igen
+    for again in (_plan(), plan):
+        calls.clear()
+        cs.apply_plan(again, jobs=2)
+        assert sorted(calls) == first
+
+
+@responses.activate
+def test_identical_plan_twice_puts_entry_remaining_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("VERIFY_POLICY", "none")
+    import changing_state_of_group as mod
+    import plan_operations as planner
+    importlib.reload(mod)
+    monkeypatch.setattr(mod, "_commit_sync_state", lambda *a, **k: None)
+    user = (f'<User xmlns="{NS}"><Card>C1</Card><Name>N</Name>'
+            f'<EntryRemaining>0</EntryRemaining><UserID>{ACCT_BASE}/users/u1</UserID></User>')
+    responses.add(responses.GET, f"{ACCT_BASE}/users/u1", body=user)
+    responses.add(responses.GET, f"{ACCT_BASE}/users/u1/groups", body=xml_groups_array([GROUP_ID]))
+    responses.add(responses.PUT, f"{ACCT_BASE}/users/u1", status=202)
+
+    plan = planner.build_plan([], [], ["u1"])
+    for _ in range(2):
+        assert mod.apply_plan(plan, jobs=1)["updated"] == 1
+    assert sum(c.request.method == "PUT" for c in responses.calls) == 2
+
+
+def test_list_path_resumes_until_the_lists_change(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    cs = _cs(monkeypatch, calls)
+    (tmp_path/"to_add.json").write_text(json.dumps({"to_add": ["x1", "x2"]}), encoding="utf-8")
+    args = ["to_add.json", "to_delete.json", "to_update.json", "--jobs", "1"]
+
+    monkeypatch.setattr(cs, "add_user_to_group", _crash_at("add", "x2", calls))
+    try:
+        cs.main(args)
+    except Crash:
+        pass
+    calls.clear()
+    cs = _cs(monkeypatch, calls)
+    cs.main(args)
+    assert calls == [("add", "x2")]
+
+    # samme lister igen efter et helt apply: alt kaldes igen
+    calls.clear()
+    cs.main(args)
+    assert calls == [("add", "x1"), ("add", "x2")]
+
+
+def test_batches_fsync_and_tolerates_torn_line(tmp_path):
+    path = tmp_path/"j.jsonl"
+    j = apply_journal.ApplyJournal("k", path=str(path), batch=3, interval=3600)
+    j.record("add", "u1", (True, None))
+    j.record("add", "u2", (True, "already_in_group"))
+    assert path.read_text() == ""  # endnu ikke en hel batch
+    j.record("add", "u3", (True, None))
+    assert len(path.read_text().splitlines()) == 3
+    j.record("add", "u4", (True, None))
+    j.close()
+
+    with path.open("a") as f:
+        f.write('{"p": "k", "f": "add", "u": "u5"')  # afbrudt skrivning
+    again = apply_journal.ApplyJournal("k", path=str(path))
+    assert again.done("add", "u2") == (True, "already_in_group")
+    assert again.done("add", "u5") is None
+    assert len(again) == 4
+    again.close()
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setenv("APPLY_JOURNAL", "0")
+    assert apply_journal.open_for(_plan()) is None
+    op = lambda uid: (True, None)
+    assert apply_journal.journaled(op, None, "add") is op
@@ -0,0 +1,36 @@
+# tests/test_artifact_store.py
+import gzip
+
+from utils.artifact_store import LocalBackend, blob_key, restore, upload_artifacts
+
+
+def test_upload_is_compressed_deduplicated_and_restorable(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "group_members.csv").write_text("Card,Name\n" + "1,A\n" * 500, encoding="utf-8")
+    (src / "to_add.json").write_text('{"to_add": []}', encoding="utf-8")
+    (src / "to_delete.json").write_text('{"to_add": []}', encoding="utf-8")  # samme indhold
+    backend = LocalBackend(tmp_path / "bucket")
+    files = [str(src / n) for n in ("group_members.csv", "to_add.json", "to_delete.json", "mangler.json")]
+
+    first = upload_artifacts(files, backend, run_id="r1", jobs=4)
+    entries = first["files"]
+    assert sorted(entries) == ["group_members.csv", "to_add.json", "to_delete.json"]
+    assert first["missing"] == [str(src / "mangler.json")]
+    # samme indhold → én blob, uploadet én gang
+    assert entries["to_add.json"]["blob"] == entries["to_delete.json"]["blob"]
+    assert sum(e["uploaded"] for e in entries.values()) == 2
+    csv_entry = entries["group_members.csv"]
+    assert csv_entry["gz_size"] < csv_entry["size"]
+    blob = tmp_path / "bucket" / blob_key(csv_entry["sha256"])
+    assert gzip.decompress(blob.read_bytes()) == (src / "group_members.csv").read_bytes()
+
+    # næste kørsel med uændrede filer: kun manifestet skrives
+    (src / "to_add.json").write_text('{"to_add": ["u1"]}', encoding="utf-8")
+    second = upload_artifacts(files, backend, run_id="r2", jobs=4)
+    assert {n: e["uploaded"] for n, e in second["files"].items()} == \
+        {"group_members.csv": False, "to_add.json": True, "to_delete.json": False}
+
+    out = restore(backend, "r2", tmp_path / "restored")
+    assert len(out) == 3
+    assert (tmp_path / "restored" / "to_add.json").read_text(encoding="utf-8") == '{"to_add": ["u1"]}'
@@ -0,0 +1,160 @@
+# tests/test_async_pipeline.py
+import csv
+import json
+import asyncio
+import importlib
+import xml.etree.ElementTree as ET
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from tests.conftest import xml_groups_array, GROUP_ID
+import async_pipeline
+import build_members_csv, changing_state_of_group, create_missing_users, member_rasmus_diff
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+ARR = "http://schemas.microsoft.com/2003/10/Serialization/Arrays"
+
+
+def _fake_acct(users: dict):
+    """users: {guid: {"card", "name", "entry", "groups": set}} — minimal ACCT-stand-in."""
+    def collection(guids, base):
+        rows = [f'<UserCollection xmlns="{NS}" xmlns:i="http://www.w3.org/2001/XMLSchema-instance">']
+        for g in guids:
+            u = users[g]
+            rows.append(f'<User><Card>{u["card"]}</Card><EntryRemaining>{u["entry"]}</EntryRemaining>'
+                        f'<Name>{u["name"]}</Name><UserID>{base}/users/{g}</UserID></User>')
+        rows.append("</UserCollection>")
+        return "\n".join(rows)
+
+    async def group_users(req):
+        base = str(req.url.origin())
+        return web.Response(text=collection([g for g, u in users.items() if GROUP_ID in u["groups"]], base))
+
+    async def users_by_card(req):
+        card = req.query.get("card", "")
+        base = str(req.url.origin())
+        return web.Response(text=collection([g for g, u in users.items() if u["card"] == card], base))
+
+    async def get_user(req):
+        u = users.get(req.match_info["guid"])
+        if not u:
+            return web.Response(status=404)
+        return web.Response(text=f'<User xmlns="{NS}"><Card>{u["card"]}</Card>'
+                                 f'<EntryRemaining>{u["entry"]}</EntryRemaining><Name>{u["name"]}</Name></User>')
+
+    async def get_groups(req):
+        return web.Response(text=xml_groups_array(sorted(users[req.match_info["guid"]]["groups"])))
+
+    async def put_user(req):
+        u = users[req.match_info["guid"]]
+        root = ET.fromstring(await req.read())
+        g = root.find(f"{{{NS}}}Groups")
+        u["groups"] = {(e.text or "").strip() for e in g} if g is not None else set()
+        er = root.find(f"{{{NS}}}EntryRemaining")
+        if er is not None and er.text:
+            u["entry"] = er.text
+        return web.Response(status=202)
+
+    async def del_membership(req):
+        u = users.get(req.match_info["guid"])
+        if not u or GROUP_ID not in u["groups"]:
+            return web.Response(status=404)
+        u["groups"].discard(GROUP_ID)
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_get("/rest/groups/{gid}/users", group_users)
+    app.router.add_delete("/rest/groups/{gid}/users/{guid}", del_membership)
+    app.router.add_get("/rest/users", users_by_card)
+    app.router.add_get("/rest/users/{guid}", get_user)
+    app.router.add_get("/rest/users/{guid}/groups", get_groups)
+    app.router.add_put("/rest/users/{guid}", put_user)
+    return app
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+
+def test_run_pipeline_end_to_end(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    users = {
+        "uid_A": {"card": "A", "name": "A", "entry": "1", "groups": {GROUP_ID}},
+        "uid_B": {"card": "B", "name": "B", "entry": "0", "groups": {GROUP_ID, "other"}},
+        "uid_C": {"card": "C", "name": "C", "entry": "1", "groups": {GROUP_ID}},
+        "uid_D": {"card": "D", "name": "D", "entry": "1", "groups": {"other"}},
+    }
+    _write_csv(tmp_path/"rasmus-liste.csv", [["Card", "Name"], ["A", "A"], ["B", "B"], ["D", "D"]])
+
+    async def scenario():
+        server = TestServer(_fake_acct(users))
+        await server.start_server()
+        try:
+            monkeypatch.setenv("ACCT_BASE", str(server.make_url("/rest")))
+            for m in (build_members_csv, changing_state_of_group, create_missing_users, member_rasmus_diff):
+                importlib.reload(m)
+            importlib.reload(async_pipeline)
+            monkeypatch.setattr(async_pipeline.asyncio, "sleep", _no_sleep)
+            return await async_pipeline.run_pipeline(create_missing=False)
+        finally:
+            await server.close()
+
+    summary = asyncio.run(scenario())
+
+    assert json.loads((tmp_path/"to_add.json").read_text())["to_add"] == ["uid_D"]
+    assert json.loads((tmp_path/"to_delete.json").read_text())["to_delete"] == ["uid_C"]
+    assert json.loads((tmp_path/"to_update.json").read_text())["to_update"] == ["uid_B"]
+    assert summary["added"] == 1 and summary["deleted"] == 1 and summary["updated"] == 1
+    assert users["uid_D"]["groups"] == {GROUP_ID, "other"}
+    assert GROUP_ID not in users["uid_C"]["groups"]
+    assert users["uid_B"]["entry"] == "1" and users["uid_B"]["groups"] == {GROUP_ID, "other"}
+
+
+_real_sleep = asyncio.sleep
+
+
+async def _no_sleep(_delay):
+    await _real_sleep(0)
+
+
+def test_users_export_is_parsed_from_streamed_chunks(monkeypatch):
+    from utils import acct_async
+    users = {f"uid_{i}": {"card": f"K{i}", "name": f"N{i}", "entry": "1", "groups": set()} for i in range(3000)}
+    chunks = []
+    real_iter = acct_async.StreamedResponse.iter_chunked
+
+    async def counting(self, size=64 * 1024):
+        async for chunk in real_iter(self, size):
+            chunks.append(len(chunk))
+            yield chunk
+
+    monkeypatch.setattr(acct_async.StreamedResponse, "iter_chunked", counting)
+
+    async def all_users(req):
+        base = str(req.url.origin())
+        body = "".join(f'<User><Card>{u["card"]}</Card><UserID>{base}/users/{g}</UserID></User>'
+                       for g, u in users.items())
+        return web.Response(text=f'<UserCollection xmlns="{NS}">{body}</UserCollection>')
+
+    async def scenario(tmp_cache):
+        app = web.Application()
+        app.router.add_get("/rest/users", all_users)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            monkeypatch.setattr(member_rasmus_diff, "ACCT_BASE", str(server.make_url("/rest")))
+            monkeypatch.setattr(member_rasmus_diff, "RESOLVE_EXPORT_THRESHOLD", 2)
+            async with acct_async.AsyncAcctClient() as client:
+                return await async_pipeline.resolve_cards(client, ["K5", "K2999", "ukendt"], tmp_cache)
+        finally:
+            await server.close()
+
+    from utils.card_cache import CardCache
+    result = asyncio.run(scenario(CardCache()))
+    assert result == {"K5": "uid_5", "K2999": "uid_2999", "ukendt": None}
+    assert len(chunks) > 1 and sum(chunks) > 64 * 1024
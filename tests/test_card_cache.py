@@ -0,0 +1,80 @@
+# tests/test_card_cache.py
+import json
+
+from utils import card_cache
+from utils.card_cache import CardCache, invalidating
+
+
+def _clock(monkeypatch, t):
+    monkeypatch.setattr(card_cache, "_now", lambda: t[0])
+
+
+def test_positive_and_negative_entries_expire_separately(tmp_path, monkeypatch):
+    t = [1000.0]
+    _clock(monkeypatch, t)
+    c = CardCache(tmp_path/"c.json", ttl=100, negative_ttl=10)
+    c.put("A", "uid_A")
+    c.put("B", None)
+    assert c.lookup("A") == (True, "uid_A")
+    assert c.lookup("B") == (True, None)
+    t[0] += 20
+    assert c.lookup("B") == (False, None)
+    assert c.lookup("A") == (True, "uid_A")
+    t[0] += 100
+    assert c.lookup("A") == (False, None)
+
+
+def test_flush_appends_and_reload_replays_tombstones(tmp_path):
+    path = tmp_path/"c.json"
+    c = CardCache(path)
+    c.put("A", "uid_A")
+    c.put("B", "uid_B")
+    c.flush()
+    # en anden proces (fx changing_state_of_group) glemmer brugeren uden at indlæse cachen
+    other = CardCache(path)
+    other.invalidate_user("uid_B")
+    other.flush()
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3 and json.loads(lines[-1]) == {"u": "uid_B", "d": 1}
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"c":"C","u":"uid')   # afbrudt skrivning
+    again = CardCache(path)
+    assert again.lookup("A") == (True, "uid_A")
+    assert again.lookup("B") == (False, None)
+    assert len(again) == 1
+
+
+def test_legacy_file_is_migrated_and_compacted(tmp_path):
+    path = tmp_path/"c.json"
+    path.write_text(json.dumps({"A": "https://x/users/uid_A"}, indent=2), encoding="utf-8")
+    c = CardCache(path)
+    assert c.lookup("A") == (True, "uid_A")
+    c.flush()
+    assert [json.loads(l)["u"] for l in path.read_text(encoding="utf-8").splitlines()] == ["uid_A"]
+
+
+def test_bounded_size_evicts_oldest(tmp_path):
+    c = CardCache(tmp_path/"c.json", max_entries=2)
+    for card in ("A", "B", "C"):
+        c.put(card, "uid_" + card)
+    assert c.lookup("A") == (False, None)
+    assert len(c) == 2
+
+
+def test_invalidating_drops_written_users(tmp_path):
+    c = CardCache(tmp_path/"c.json")
+    c.put("A", "uid_A")
+    c.put("B", "uid_B")
+    results = [("uid_A", (True, None)), ("uid_B", (False, "500"))]
+    assert list(invalidating(results, c)) == results
+    assert c.lookup("A") == (False, None)
+    assert c.lookup("B") == (True, "uid_B")
+
+
+def test_cache_path_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("CARD_CACHE_FILE", str(tmp_path/"env_cache.json"))
+    c = card_cache.CardCache()
+    c.put("K", "uid_K")
+    c.flush()
+    assert (tmp_path/"env_cache.json").exists()
+    assert card_cache.CardCache(tmp_path/"other.json").path == tmp_path/"other.json"
@@ -68,6 +68,23 @@ def test_add_user_to_group_adds_union_and_preserves_nil(monkeypatch):
     assert ok is True
     assert info in (None, "already_in_group")
 
+@responses.activate
+def test_add_user_to_group_fails_when_recheck_lacks_group(monkeypatch):
+    import changing_state_of_group as mod
+    importlib.reload(mod)
+    responses.add(responses.GET, f"{ACCT_BASE}/users/{GUID}",
+                  body=xml_user("1234567890", "Alice", "0"), status=200, content_type="application/xml")
+    # pre-check: kun en anden gruppe
+    responses.add(responses.GET, f"{ACCT_BASE}/users/{GUID}/groups",
+                  body=xml_groups_array(["other-group"]), status=200, content_type="application/xml")
+    responses.add(responses.PUT, f"{ACCT_BASE}/users/{GUID}", status=202)
+    # re-check: PUT'en blev accepteret, men gruppen er der stadig ikke
+    responses.add(responses.GET, f"{ACCT_BASE}/users/{GUID}/groups",
+                  body=xml_groups_array(["other-group"]), status=200, content_type="application/xml")
+
+    assert mod.add_user_to_group(GUID, verify=True) == (False, "not_in_group_after_put")
+    assert mod.add_user_to_group(GUID, verify=False) == (True, None)
+
 @responses.activate
 def test_add_user_to_group_already_in_group_short_circuits(monkeypatch):
     import changing_state_of_group as mod
@@ -0,0 +1,52 @@
+# tests/test_changing_state_concurrency.py
+import json
+import time
+import random
+import threading
+import importlib
+
+
+def test_main_parallel_is_deterministic_and_bounded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import changing_state_of_group as mod
+    importlib.reload(mod)
+
+    ids = [f"uid{i:02d}" for i in range(20)]
+    (tmp_path/"to_add.json").write_text(json.dumps({"to_add": ids}), encoding="utf-8")
+
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_add(uid):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(random.uniform(0.001, 0.01))
+        with lock:
+            active -= 1
+        # hver tredje fejler, uid05 kaster
+        if uid == "uid05":
+            raise RuntimeError("boom")
+        if int(uid[3:]) % 3 == 0:
+            return False, f"err-{uid}"
+        return True, None
+
+    monkeypatch.setattr(mod, "add_user_to_group", fake_add)
+    mod.main(["to_add.json", "to_delete.json", "to_update.json", "--jobs", "4"])
+
+    errs = json.loads((tmp_path/"add_errors.json").read_text(encoding="utf-8"))
+    # fejl i input-rækkefølge, exception omsat til fejl-entry
+    assert [e["user_id"] for e in errs] == ["uid00", "uid03", "uid05", "uid06", "uid09",
+                                            "uid12", "uid15", "uid18"]
+    assert errs[2]["error"] == "exception: boom"
+    assert 1 < peak <= 4
+
+
+def test_jobs_from_env(monkeypatch):
+    import changing_state_of_group as mod
+    importlib.reload(mod)
+    monkeypatch.setenv("APPLY_JOBS", "3")
+    assert mod.parse_args([]).jobs == 3
+    assert mod.parse_args(["--jobs", "5"]).jobs == 5
@@ -0,0 +1,113 @@
+# tests/test_deadline.py
+import importlib
+import json
+
+from utils import deadline as dl
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_estimate_learns_and_expiry_is_sticky(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(dl, "_clock", clock)
+    d = dl.Deadline(10, reserve=1, initial_estimate=2)
+    assert d.estimate("add") == 2
+
+    def slow(uid):
+        clock.t += 3
+        return True, None
+
+    guarded = d.guard(slow, "add")
+    assert guarded("u1") == (True, None)     # 10 tilbage, estimat 2
+    assert d.estimate("add") == 3 + 4 * 1.5  # første observation: afvigelse = halvdelen
+    assert guarded("u2") == (False, dl.DEFERRED)
+    clock.t -= 100                           # selv med tid nok igen: stadig udskudt
+    assert guarded("u3") == (False, dl.DEFERRED)
+    assert d.deferred == [("add", "u2"), ("add", "u3")]
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.delenv("APPLY_DEADLINE", raising=False)
+    assert dl.Deadline.from_env() is None
+    monkeypatch.setenv("APPLY_DEADLINE", "90")
+    assert 89 < dl.Deadline.from_env().remaining() <= 90
+    monkeypatch.setenv("FUNCTION_TIMEOUT_SEC", "540")
+    monkeypatch.setenv("DEADLINE_UPLOAD_RESERVE", "40")
+    assert 499 < dl.for_function().remaining() <= 500
+
+
+def test_apply_plan_runs_deletes_first_and_saves_remaining_plan(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("APPLY_JOURNAL", "0")
+    import changing_state_of_group as cs
+    import plan_operations as planner
+    importlib.reload(planner)
+    importlib.reload(cs)
+    clock = FakeClock()
+    monkeypatch.setattr(dl, "_clock", clock)
+
+    calls = []
+
+    def op(name):
+        def run(uid):
+            calls.append((name, uid))
+            clock.t += 1
+            return True, None
+        return run
+
+    monkeypatch.setattr(cs, "add_user_to_group", op("add"))
+    monkeypatch.setattr(cs, "_add_update_op", op("add_update"))
+    monkeypatch.setattr(cs, "_remove_op", op("remove"))
+    monkeypatch.setattr(cs, "_update_op", op("update"))
+    monkeypatch.setattr(cs, "_commit_sync_state", lambda *a, **k: None)
+
+    plan = planner.build_plan(["a1", "a2", "a3"], ["d1", "d2"], ["u1", "u2"])
+    # 5,5s: reserve 0,5 + estimat ≈ 1 → DEL (2 ops), ADD a1, a2 og ikke mere
+    d = dl.Deadline(5.5, reserve=0.5, initial_estimate=1)
+    summary = cs.apply_plan(plan, jobs=1, deadline=d)
+
+    assert calls[:2] == [("remove", "d1"), ("remove", "d2")]
+    assert [c[0] for c in calls[2:]] == ["add"] * len(calls[2:])
+    assert summary["deleted"] == 2 and summary["deferred"] == 7 - len(calls)
+    assert summary["add_errors"] == 0 and summary["update_errors"] == 0
+    assert summary["deadline"]["deferred"] == summary["deferred"]
+    assert not (tmp_path/"add_errors.json").exists()
+
+    rest = json.loads((tmp_path/cs.REMAINING_PLAN_FILE).read_text(encoding="utf-8"))
+    done = {uid for _, uid in calls}
+    assert [u["user_id"] for u in rest["users"]] == [u["user_id"] for u in plan["users"] if u["user_id"] not in done]
+    assert rest["counts"]["update"] == 2 and rest["parent_created"] == plan["created"]
+
+    # næste kørsel uden deadline når det hele og fjerner rest-planen
+    cs.apply_plan(planner.load_plan(cs.REMAINING_PLAN_FILE), jobs=2)
+    assert not (tmp_path/cs.REMAINING_PLAN_FILE).exists()
+
+
+def test_deferred_add_update_user_is_counted_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("APPLY_JOURNAL", "0")
+    import changing_state_of_group as cs
+    import plan_operations as planner
+    importlib.reload(planner)
+    importlib.reload(cs)
+    monkeypatch.setattr(cs, "_commit_sync_state", lambda *a, **k: None)
+    calls = []
+    monkeypatch.setattr(cs, "_add_update_op", lambda uid: calls.append(uid) or (True, None))
+
+    # b står i både to_add og to_update (add_update); deadline er allerede nået
+    plan = planner.build_plan(["b"], [], ["b"])
+    assert planner.plan_ids(plan, "add_update") == ["b"]
+    d = dl.Deadline(0, reserve=1, initial_estimate=1)
+    summary = cs.apply_plan(plan, jobs=1, deadline=d)
+
+    assert calls == []
+    assert summary["deferred"] == 1 and summary["deadline"]["deferred"] == 1
+    assert summary["update_errors"] == 0
+    rest = json.loads((tmp_path/cs.REMAINING_PLAN_FILE).read_text(encoding="utf-8"))
+    assert [(u["user_id"], u["action"]) for u in rest["users"]] == [("b", "add_update")]
@@ -0,0 +1,95 @@
+# tests/test_entry_persistence.py
+import importlib
+import json
+from pathlib import Path
+import xml.etree.ElementTree as ET
+
+import pytest
+import responses
+
+from tests.conftest import ACCT_BASE, xml_groups_array
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+
+
+def test_poll_delays_back_off_within_budget():
+    import changing_state_of_group as mod
+    assert mod.poll_delays(budget=1.0, initial=0.1) == pytest.approx([0.0, 0.1, 0.2, 0.4, 0.3])
+    assert mod.poll_delays(budget=0.0, initial=0.1) == [0.0]
+
+
+@responses.activate
+def test_learned_mode_is_tried_first_and_persisted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import changing_state_of_group as mod
+    importlib.reload(mod)
+    slept = []
+    monkeypatch.setattr(mod, "_sleep", slept.append)
+
+    # denne ACCT persisterer kun PUT'er helt uden <EntryRemaining> (mode "none")
+    entry = {"u1": "0", "u2": "0"}
+    puts = []
+
+    def get_user(req):
+        uid = req.url.rsplit("/", 1)[-1]
+        return 200, {}, f'<User xmlns="{NS}"><Card>C-{uid}</Card><EntryRemaining>{entry[uid]}</EntryRemaining></User>'
+
+    def put_user(req):
+        uid = req.url.rsplit("/", 1)[-1]
+        mode = "text" if ET.fromstring(req.body).find(f"{{{NS}}}EntryRemaining") is not None else "none"
+        puts.append((uid, mode))
+        if mode == "none":
+            entry[uid] = "1"
+        return 202, {}, ""
+
+    for uid in entry:
+        responses.add_callback(responses.GET, f"{ACCT_BASE}/users/{uid}", callback=get_user)
+        responses.add(responses.GET, f"{ACCT_BASE}/users/{uid}/groups", body=xml_groups_array(["g1"]))
+        responses.add_callback(responses.PUT, f"{ACCT_BASE}/users/{uid}", callback=put_user)
+
+    assert mod.set_entry_remaining("u1", "1", verify=True) == (True, None)
+    assert puts == [("u1", "text"), ("u1", "none")]
+    # "text" blev opgivet efter budgettet; "none" bekræftet ved første GET
+    assert sum(slept) == pytest.approx(mod.ENTRY_VERIFY_BUDGET)
+
+    assert mod.set_entry_remaining("u2", "1", verify=True) == (True, None)
+    assert puts[2:] == [("u2", "none")]
+
+    mod.save_entry_modes()
+    assert json.loads(Path(mod.entry_mode_file()).read_text()) == {"1": "none"}
+
+
+@responses.activate
+def test_rejected_put_is_not_polled_and_budget_is_shared(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import changing_state_of_group as mod
+    importlib.reload(mod)
+    slept = []
+    monkeypatch.setattr(mod, "_sleep", slept.append)
+    user = f'<User xmlns="{NS}"><Card>C</Card><EntryRemaining>0</EntryRemaining></User>'
+
+    # begge modes afvises: ingen verifikations-GET'er, ingen ventetid, PUT-fejlen returneres
+    responses.add(responses.GET, f"{ACCT_BASE}/users/u3", body=user)
+    responses.add(responses.GET, f"{ACCT_BASE}/users/u3/groups", body=xml_groups_array(["g1"]))
+    responses.add(responses.PUT, f"{ACCT_BASE}/users/u3", status=422, body="nej")
+    ok, info = mod.set_entry_remaining("u3", "1", verify=True)
+    assert not ok and info.startswith("422")
+    assert slept == []
+    assert sum(c.request.method == "GET" and c.request.url.endswith("/users/u3") for c in responses.calls) == 1
+
+    # PUT'erne accepteres men persisteres aldrig: ventetiden holdes inden for ét budget
+    responses.add(responses.GET, f"{ACCT_BASE}/users/u4", body=user)
+    responses.add(responses.GET, f"{ACCT_BASE}/users/u4/groups", body=xml_groups_array(["g1"]))
+    responses.add(responses.PUT, f"{ACCT_BASE}/users/u4", status=202)
+    assert mod.set_entry_remaining("u4", "1", verify=True) == (False, "persist_failed")
+    assert sum(slept) == pytest.approx(mod.ENTRY_VERIFY_BUDGET)
+
+
+def test_entry_mode_file_from_env(tmp_path, monkeypatch):
+    import changing_state_of_group as mod
+    path = tmp_path/"modes"/"entry.json"
+    path.parent.mkdir()
+    monkeypatch.setenv("ENTRY_MODE_FILE", str(path))
+    mod.remember_entry_mode("0", "text")
+    mod.save_entry_modes()
+    assert json.loads(path.read_text()) == {"0": "text"}
@@ -0,0 +1,42 @@
+# tests/test_fake_acct.py
+import pytest
+
+from benchmarks.fake_acct import FakeAcctServer, make_directory
+
+# moduler der læser ACCT_BASE/GROUP_ID ved import
+CONFIGURED = ("build_members_csv", "member_rasmus_diff", "create_missing_users", "changing_state_of_group")
+
+
+@pytest.fixture
+def fake_acct(tmp_path, monkeypatch):
+    """Lokal fake-ACCT; stage-modulernes konfiguration peges derhen og gendannes af monkeypatch."""
+    import importlib
+    import pipeline
+    # importeres før env ændres, så det er testens konfiguration der gendannes bagefter
+    modules = [importlib.import_module(name) for name in CONFIGURED]
+    monkeypatch.chdir(tmp_path)
+    fake = make_directory(40, churn=0.1)
+    with FakeAcctServer(fake) as srv:
+        monkeypatch.setenv("ACCT_BASE", srv.base)
+        monkeypatch.setenv("GROUP_ID", fake.group_id)
+        for mod in modules:
+            monkeypatch.setattr(mod, "ACCT_BASE", srv.base)
+            monkeypatch.setattr(mod, "GROUP_ID", fake.group_id, raising=False)
+        monkeypatch.setattr(pipeline.rl, "url", srv.root + "/sheet.csv")
+        yield fake
+
+
+def test_pipeline_converges_against_fake_acct(fake_acct):
+    import pipeline
+    fake = fake_acct
+
+    first = pipeline.run(create_missing=True, write_artifacts=False)
+    assert {k: first[k] for k in ("created", "added", "deleted", "updated")} == \
+        {"created": 4, "added": 4, "deleted": 4, "updated": 4}
+    members = {u["card"] for u in fake.users.values() if fake.group_id in u["groups"]}
+    assert members == {card for card, _ in fake.rasmus}
+
+    calls = sum(fake.calls.values())
+    second = pipeline.run(create_missing=True, write_artifacts=False)
+    assert (second["adds"], second["deletes"], second["updates"]) == (0, 0, 0)
+    assert sum(fake.calls.values()) - calls <= 2
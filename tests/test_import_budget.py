@@ -0,0 +1,33 @@
+# tests/test_import_budget.py
+import os
+import subprocess
+import sys
+
+from utils import import_profile
+
+# kold start: import main må højst koste så mange ms (bedste af tre kørsler)
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "150"))
+HEAVY = ("requests", "google.cloud.storage", "aiohttp", "xml.etree.ElementTree", "pandas")
+
+
+def test_import_main_is_within_budget():
+    best = min(import_profile.total_ms(import_profile.profile("main"), "main") for _ in range(3))
+    assert best <= IMPORT_BUDGET_MS, (
+        f"import main tog {best:.1f} ms (budget {IMPORT_BUDGET_MS:g} ms) — "
+        f"se python -m utils.import_profile main")
+
+
+def test_import_main_does_not_load_heavy_dependencies():
+    code = "import sys, main; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY,)
+    out = subprocess.run([sys.executable, "-c", code], cwd=import_profile.REPO_ROOT,
+                         capture_output=True, text=True, check=True).stdout.strip()
+    assert out == ""
+
+
+def test_parse_importtime():
+    rows = import_profile.parse_importtime(
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     json.decoder\n"
+        "import time:       300 |        420 |   json\n")
+    assert [(r["module"], r["cumulative_us"], r["depth"]) for r in rows] == [("json.decoder", 120, 2), ("json", 420, 1)]
+    assert import_profile.total_ms(rows, "json") == 0.42
@@ -0,0 +1,69 @@
+# tests/test_metrics.py
+import json
+
+import responses
+
+from tests.conftest import ACCT_BASE
+from utils import metrics
+
+
+def test_endpoint_key_templates_ids_and_query():
+    guid = "e9d39db7-b38f-43db-bfe1-d9a3a8f4b177"
+    assert metrics.endpoint_key("get", f"{ACCT_BASE}/users/{guid}/groups") == \
+        "GET test.acct.dk/rest/current/users/{guid}/groups"
+    assert metrics.endpoint_key("GET", f"{ACCT_BASE}/users?card=123456") == "GET test.acct.dk/rest/current/users?card="
+    assert metrics.endpoint_key("GET", "https://docs.google.com/spreadsheets/d/1pT6J-H4mCcCi7_kQeoUvpoepayKcndbx/export") \
+        == "GET docs.google.com/spreadsheets/d/{id}/export"
+
+
+def test_percentiles_histogram_and_reservoir():
+    m = metrics.Metrics(max_samples=50)
+    for ms in range(1, 101):
+        m.record_http("GET", f"{ACCT_BASE}/users", 200, ms / 1000, bytes_in=10)
+    m.record_http("GET", f"{ACCT_BASE}/users", None, 20.0, retry=True)
+    ep = m.report()["http"]["GET test.acct.dk/rest/current/users"]
+    assert ep["count"] == 101 and ep["errors"] == 1 and ep["retries"] == 1
+    assert ep["status"] == {"200": 100, "error": 1} and ep["bytes_in"] == 1000
+    assert ep["latency_ms"]["histogram"] == {"≤10": 10, "≤25": 15, "≤50": 25, "≤100": 50, ">10000": 1}
+    assert len(m._http["GET test.acct.dk/rest/current/users"].samples) == 50
+    assert metrics.percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
+    assert metrics.percentile([1.0, 2.0, 3.0, 4.0], 99) == 4.0
+
+
+@responses.activate
+def test_acct_client_records_each_attempt(monkeypatch):
+    from utils import acct_client
+    monkeypatch.setenv("ACCT_ADAPTIVE", "0")
+    acct_client.reset_session()
+    monkeypatch.setattr(acct_client, "_sleep", lambda s: None)
+    metrics.reset()
+    url = f"{ACCT_BASE}/users/e9d39db7-b38f-43db-bfe1-d9a3a8f4b177"
+    responses.add(responses.PUT, url, status=503)
+    responses.add(responses.PUT, url, body="<ok/>", status=200)
+
+    assert acct_client.put(url, data=b"<UserData/>").status_code == 200
+    ep = metrics.report()["http"]["PUT test.acct.dk/rest/current/users/{guid}"]
+    assert ep["count"] == 2 and ep["retries"] == 1 and ep["status"] == {"200": 1, "503": 1}
+    assert ep["bytes_out"] == 2 * len(b"<UserData/>") and ep["bytes_in"] == len(b"<ok/>")
+    acct_client.reset_session()
+
+
+def test_orchestrator_writes_metrics_report(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import orchestrator
+    import pipeline
+
+    def fake_run(create_missing, dry_run, deadline=None):
+        pipeline.stage("group", lambda: None)
+        metrics.record_http("GET", f"{ACCT_BASE}/groups/g/users", 200, 0.02, bytes_in=123)
+        return {"adds": 0}
+
+    monkeypatch.setattr(pipeline, "run", fake_run)
+    summary = orchestrator.run(env_file=None, tee=False)
+    rep = json.loads(open(summary["metrics"], encoding="utf-8").read())
+    assert rep == summary["metrics_report"]
+    assert set(rep["stages"]) == {"group", "total"} and rep["totals"]["bytes_in"] == 123
+
+    import main
+    body = json.loads(main.response_body("Sync Success", summary))
+    assert body["counts"] == {"adds": 0} and body["metrics"]["totals"]["requests"] == 1
@@ -0,0 +1,92 @@
+# tests/test_orchestrator.py
+import csv
+import os
+from pathlib import Path
+
+import pytest
+
+
+def test_run_writes_report_archive_and_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import orchestrator
+    import pipeline
+    (tmp_path / ".env").write_text("# kommentar\nexport SYNC_TEST_VALUE='fra env'\n", encoding="utf-8")
+    (tmp_path / "to_add.json").write_text('{"to_add": ["u1"]}', encoding="utf-8")
+    monkeypatch.delenv("SYNC_TEST_VALUE", raising=False)
+    monkeypatch.setenv("ACCT_STATS_FILE", str(tmp_path / "stats.jsonl"))
+
+    from utils import snapshot
+    snapshot.shared().record("uid-fra-sidste-kørsel", {"card": "K", "name": "N", "entry_nil": False, "entry_text": "1"})
+
+    def fake_run(create_missing, dry_run, deadline=None):
+        print("trin kørt")
+        assert create_missing and dry_run
+        # en varm instans starter med et tomt snapshot i hukommelsen
+        assert snapshot.shared().get("uid-fra-sidste-kørsel") is None
+        return {"adds": 1, "deletes": 2, "updates": 3, "missing_cards": 4, "deleted": 0,
+                "http": {"retries": 5, "adaptive": {"throttled": 1, "min_limit_seen": 2, "final_limit": 8}}}
+
+    monkeypatch.setattr(pipeline, "run", fake_run)
+    summary = orchestrator.run(create_missing=True, dry_run=True)
+
+    assert os.environ["SYNC_TEST_VALUE"] == "fra env"
+    with open(summary["report"], newline="", encoding="utf-8") as f:
+        row, = csv.DictReader(f)
+    assert row == {"timestamp": row["timestamp"], "adds": "1", "deleted": "2", "updates": "3", "missing_cards": "4",
+                   "http_retries": "5", "http_throttled": "1", "http_limit_min": "2", "http_limit_final": "8"}
+    assert [Path(p).name for p in summary["archived"]] == [f"to_add_{row['timestamp']}.json"]
+    assert "trin kørt" in Path(summary["log"]).read_text(encoding="utf-8")
+
+
+def test_warm_instance_runs_get_their_own_stats(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import json
+    import orchestrator
+    import pipeline
+    from utils import acct_client, metrics
+    monkeypatch.delenv("ACCT_STATS_FILE", raising=False)
+
+    def fake_run(create_missing, dry_run, deadline=None):
+        # tællere fra en tidligere kørsel i samme proces må ikke være med
+        assert acct_client.stats()["retries"] == 0
+        assert metrics.report()["http"] == {}
+        acct_client._count_retry()
+        metrics.record_http("GET", "https://acct/users/x", 200, 0.1)
+        return {"adds": 0, "deletes": 0, "updates": 0, "missing_cards": 0, "http": acct_client.stats()}
+
+    monkeypatch.setattr(pipeline, "run", fake_run)
+    first = orchestrator.run(env_file=None, log_dir=str(tmp_path / "logs1"), tee=False)
+    assert "ACCT_STATS_FILE" not in os.environ
+    second = orchestrator.run(env_file=None, log_dir=str(tmp_path / "logs2"), tee=False)
+    assert "ACCT_STATS_FILE" not in os.environ
+
+    for summary, logs in ((first, "logs1"), (second, "logs2")):
+        lines = [json.loads(l) for f in (tmp_path / logs).glob("acct_stats_*.jsonl")
+                 for l in f.read_text(encoding="utf-8").splitlines()]
+        assert [(r["stage"], r["retries"]) for r in lines] == [("orchestrator", 1)]
+        assert summary["http"]["retries"] == 1
+
+
+def test_main_accepts_danish_aliases(monkeypatch):
+    import orchestrator
+    seen = {}
+    monkeypatch.setattr(orchestrator, "run", lambda **kw: seen.update(kw))
+    assert orchestrator.main(["--opret-manglende", "--tørkørsel"]) == 0
+    assert seen["create_missing"] and seen["dry_run"]
+
+
+def test_stage_retries_with_backoff(monkeypatch):
+    import pipeline
+    sleeps, calls = [], []
+    monkeypatch.setattr(pipeline, "_sleep", sleeps.append)
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise OSError("midlertidig")
+        return "ok"
+
+    assert pipeline.stage("group", flaky, retries=3) == "ok"
+    assert sleeps == [2.0, 4.0]
+    with pytest.raises(OSError):
+        pipeline.stage("diff", lambda: (_ for _ in ()).throw(OSError("altid")), retries=2)
@@ -0,0 +1,28 @@
+# tests/test_parse_card_userid_map.py
+from utils.xml_utils import parse_card_userid_map
+from benchmarks.bench_parse_users import make_collection, legacy_parse
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+
+
+def test_single_user_document():
+    xml = f'<User xmlns="{NS}"><Card>123</Card><Name>A</Name><UserID>https://x/users/g1</UserID></User>'
+    assert parse_card_userid_map(xml) == {"123": "https://x/users/g1"}
+
+
+def test_collection_skips_users_without_id_and_last_duplicate_wins():
+    xml = (f'<UserCollection xmlns="{NS}">'
+           '<User><Card>A</Card><UserID>u1</UserID></User>'
+           '<User><Card>B</Card></User>'
+           '<User><Card>A</Card><Guid>u3</Guid></User>'
+           '</UserCollection>')
+    assert parse_card_userid_map(xml.encode("utf-8")) == {"A": "u3"}
+
+
+def test_invalid_xml_gives_empty_mapping():
+    assert parse_card_userid_map("<not-xml") == {}
+
+
+def test_matches_legacy_parser_on_collection():
+    data = make_collection(200)
+    assert parse_card_userid_map(data) == legacy_parse(data)
@@ -0,0 +1,131 @@
+# tests/test_pipeline.py
+import importlib
+import json
+import re
+
+import pytest
+import responses
+
+from tests.conftest import ACCT_BASE, GROUP_ID
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+
+
+def _user(card, guid, entry):
+    return (f"<User><Card>{card}</Card><Name>N{card}</Name><EntryRemaining>{entry}</EntryRemaining>"
+            f"<UserID>{ACCT_BASE}/users/{guid}</UserID></User>")
+
+
+@responses.activate
+def test_run_chains_stages_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import build_members_csv, changing_state_of_group, create_missing_users, member_rasmus_diff, pipeline
+    for mod in (build_members_csv, member_rasmus_diff, create_missing_users, changing_state_of_group, pipeline):
+        importlib.reload(mod)
+    # Rasmus: A (i gruppen, EntryRemaining=0), B (findes i ACCT, ikke i gruppen), C (ukendt)
+    monkeypatch.setattr(pipeline.rl, "fetch_rasmus",
+                        lambda: ({c: {"name": c, "pid": ""} for c in "ABC"}, True))
+    group = _user("A", "uid_A", "0") + _user("X", "uid_X", "1")
+    responses.add(responses.GET, f"{ACCT_BASE}/groups/{GROUP_ID}/users",
+                  body=f'<UserCollection xmlns="{NS}">{group}</UserCollection>', status=200)
+    responses.add(responses.GET, f"{ACCT_BASE}/users?card=B",
+                  body=f'<UserCollection xmlns="{NS}">{_user("B", "uid_B", "1")}</UserCollection>', status=200)
+    responses.add(responses.GET, re.compile(rf"{re.escape(ACCT_BASE)}/users.*C"), status=404)
+
+    summary = pipeline.run(create_missing=True, dry_run=True, write_artifacts=False)
+
+    assert {k: summary[k] for k in ("adds", "deletes", "updates", "missing_cards", "created")} == \
+        {"adds": 1, "deletes": 1, "updates": 1, "missing_cards": 1, "created": 0}
+    # ingen mellemfiler mellem trinene — kun caches
+    assert {p.name for p in tmp_path.iterdir()} <= {member_rasmus_diff.CACHE_FILE, "user_snapshot.json"}
+
+
+@responses.activate
+def test_unchanged_sheet_and_sync_state_skip_diff_and_apply(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import build_members_csv, member_rasmus_diff, pipeline
+    from utils import sync_state
+    for mod in (build_members_csv, member_rasmus_diff, pipeline):
+        importlib.reload(mod)
+    rasmus = {"A": {"name": "A", "pid": ""}}
+    sync_state.save({"A"}, {"A": {"UserID": "uid_A", "EntryRemaining": "1"}}, member_rasmus_diff.needs_reset)
+    changed = []
+    monkeypatch.setattr(pipeline.rl, "fetch_rasmus", lambda: (rasmus, changed.pop()))
+    monkeypatch.setattr(pipeline.mrd, "diff_stage", lambda *a, **k: (_ for _ in ()).throw(AssertionError("diff kørt")))
+    responses.add(responses.GET, f"{ACCT_BASE}/groups/{GROUP_ID}/users",
+                  body=f'<UserCollection xmlns="{NS}">{_user("A", "uid_A", "1")}</UserCollection>', status=200)
+
+    changed.append(False)
+    summary = pipeline.run(create_missing=True, write_artifacts=True)
+    assert {k: summary[k] for k in ("adds", "deletes", "updates", "missing_cards", "created")} == \
+        dict.fromkeys(("adds", "deletes", "updates", "missing_cards", "created"), 0)
+    assert len(responses.calls) == 1
+    assert json.loads((tmp_path / member_rasmus_diff.ADD_JSON).read_text(encoding="utf-8")) == {"to_add": []}
+
+    # ændret ark → diff'en køres, selvom sync-tilstanden er uændret
+    changed.append(True)
+    with pytest.raises(AssertionError, match="diff kørt"):
+        pipeline.run(create_missing=True, write_artifacts=False)
+
+
+def test_created_user_id_from_location_or_body():
+    import create_missing_users as cm
+    g1, g2 = "3f2504e0-4f89-11d3-9a0c-0305e82c3301", "9b1deb4d-3b7d-4bad-9bdd-2b0d7b3dcb6d"
+    assert cm.created_user_id(f"{ACCT_BASE}/users/{g1}", b"") == g1
+    assert cm.created_user_id(None, f'<User xmlns="{NS}"><UserID>{ACCT_BASE}/users/{g2}</UserID></User>'.encode()) == g2
+    assert cm.created_user_id(None, f"<User><UserID>{g2}</UserID></User>") == g2
+    assert cm.created_user_id(None, b"") is None
+    assert cm.created_user_id(None, b"Created ok") is None
+
+
+def test_created_user_id_rejects_non_guid_answers():
+    import create_missing_users as cm
+    assert cm.created_user_id(None, b"OK") is None
+    assert cm.created_user_id(None, b'<boolean xmlns="http://schemas.microsoft.com/2003/10/Serialization/">true</boolean>') is None
+    assert cm.created_user_id(None, b'<string xmlns="http://schemas.microsoft.com/2003/10/Serialization/">g-3</string>') is None
+    assert cm.created_user_id(None, f'<User xmlns="{NS}"><UserID>{ACCT_BASE}/users/g-2</UserID></User>'.encode()) is None
+    assert cm.created_user_id(f"{ACCT_BASE}/users/uid_C", b"") is None
+
+
+@responses.activate
+def test_created_without_guid_is_looked_up_not_cached(tmp_path):
+    import create_missing_users as cm
+    import member_rasmus_diff as mrd
+    importlib.reload(mrd)
+    importlib.reload(cm)
+    cache = mrd.CardCache(tmp_path / "cache.json")
+    responses.add(responses.POST, f"{ACCT_BASE}/users", status=201, body=b"OK")
+    responses.add(responses.POST, f"{ACCT_BASE}/users", status=201, body=b"<boolean>true</boolean>")
+
+    created = cm.create_missing({c: {"name": c, "pid": ""} for c in "EF"}, ["E", "F"], cache)
+    assert created["created"] == ["E", "F"] and created["user_ids"] == {"E": None, "F": None}
+    assert cm.cards_to_resolve(created) == ["E", "F"]
+    assert cache.lookup("E") == (False, None) and cache.lookup("F") == (False, None)
+
+
+@responses.activate
+def test_created_users_are_folded_into_diff_without_reexport(tmp_path):
+    import create_missing_users as cm
+    import member_rasmus_diff as mrd
+    importlib.reload(mrd)
+    importlib.reload(cm)
+    cache = mrd.CardCache(tmp_path / "cache.json")
+    # C oprettes (201 + Location); D giver 409 og findes så ved opslag
+    uid_c = "3f2504e0-4f89-11d3-9a0c-0305e82c3301"
+    responses.add(responses.POST, f"{ACCT_BASE}/users", status=201, headers={"Location": f"{ACCT_BASE}/users/{uid_c}"})
+    responses.add(responses.POST, f"{ACCT_BASE}/users", status=409)
+    responses.add(responses.GET, f"{ACCT_BASE}/users?card=D",
+                  body=f'<UserCollection xmlns="{NS}">{_user("D", "uid_D", "1")}</UserCollection>', status=200)
+
+    created = cm.create_missing({c: {"name": c, "pid": ""} for c in "CD"}, ["C", "D"], cache)
+    assert created["user_ids"] == {"C": uid_c} and created["already_exists"] == ["D"]
+    assert cache.lookup("C") == (True, uid_c)
+    assert cm.cards_to_resolve(created) == ["D"]
+
+    diff = {"to_add": [], "to_delete": [], "to_update": [], "missing": ["C", "D"]}
+    group = {"A": {"UserID": "uid_A", "EntryRemaining": "1"}}
+    cm.fold_into_diff(created, diff, group, mrd.resolve_cards(cm.cards_to_resolve(created), cache))
+    # C er allerede medlem (POST'et med GROUP_ID); D skal tilføjes — ingen gruppe-eksport
+    assert diff == {"to_add": ["uid_D"], "to_delete": [], "to_update": [], "missing": []}
+    assert group["C"] == {"UserID": uid_c, "EntryRemaining": "1"}
+    assert [c.request.method for c in responses.calls] == ["POST", "POST", "GET"]
@@ -0,0 +1,64 @@
+# tests/test_plan_operations.py
+import importlib
+import json
+import xml.etree.ElementTree as ET
+
+import responses
+
+from tests.conftest import ACCT_BASE, GROUP_ID, xml_groups_array
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+ARR = "http://schemas.microsoft.com/2003/10/Serialization/Arrays"
+
+
+def _planner():
+    import plan_operations as mod
+    importlib.reload(mod)
+    return mod
+
+
+def test_build_plan_merges_and_resolves_conflicts():
+    mod = _planner()
+    plan = mod.build_plan(["a", "both", "clash"], ["d", "clash", "du"], ["u", "both", "du"])
+    actions = {u["user_id"]: u["action"] for u in plan["users"]}
+    assert actions == {"a": "add", "both": "add_update", "clash": "add", "d": "remove",
+                       "du": "remove", "u": "update"}
+    assert plan["counts"] == {"add": 2, "remove": 2, "update": 1, "add_update": 1, "conflicts": 2}
+    assert {c["user_id"]: c["resolution"] for c in plan["conflicts"]} == {"clash": "add", "du": "remove"}
+    # planen kan skrives og læses igen (tørkørsel)
+    assert json.loads(json.dumps(plan)) == plan
+
+
+@responses.activate
+def test_apply_plan_sends_one_put_for_add_update(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    planner = _planner()
+    import changing_state_of_group as cs
+    importlib.reload(cs)
+    monkeypatch.setattr(cs, "_sleep", lambda s: None)
+
+    uid = "both"
+    planner.write_plan(planner.build_plan([uid], [], [uid]))
+    state = {"entry": "0", "groups": ["g1"]}
+    puts = []
+
+    def get_user(req):
+        return 200, {}, f'<User xmlns="{NS}"><Card>C</Card><EntryRemaining>{state["entry"]}</EntryRemaining></User>'
+
+    def put_user(req):
+        root = ET.fromstring(req.body)
+        puts.append(req.body)
+        state["groups"] = [(e.text or "") for e in root.find(f"{{{NS}}}Groups").findall(f"{{{ARR}}}string")]
+        state["entry"] = root.find(f"{{{NS}}}EntryRemaining").text
+        return 202, {}, ""
+
+    responses.add_callback(responses.GET, f"{ACCT_BASE}/users/{uid}", callback=get_user)
+    responses.add_callback(responses.GET, f"{ACCT_BASE}/users/{uid}/groups",
+                           callback=lambda req: (200, {}, xml_groups_array(state["groups"])))
+    responses.add_callback(responses.PUT, f"{ACCT_BASE}/users/{uid}", callback=put_user)
+
+    summary = cs.main(["--plan", planner.PLAN_JSON])
+
+    assert len(puts) == 1
+    assert sorted(state["groups"]) == sorted(["g1", GROUP_ID]) and state["entry"] == "1"
+    assert summary["added"] == 1 and summary["updated"] == 1
@@ -0,0 +1,107 @@
+# tests/test_rasmus_download.py
+import csv
+import hashlib
+import importlib
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+BODY = b"Card,Name\n111,Anna\n222,Bo\n"
+
+
+class SheetStub(BaseHTTPRequestHandler):
+    """Lokal stand-in for Sheets-eksporten: ETag + 304 på If-None-Match."""
+    body = BODY
+    etag = '"v1"'
+    send_etag = True
+    seen: list = []
+
+    def do_GET(self):
+        SheetStub.seen.append(dict(self.headers))
+        if self.send_etag and self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.body)))
+        if self.send_etag:
+            self.send_header("ETag", self.etag)
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def sheet(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    SheetStub.seen = []
+    SheetStub.send_etag = True
+    srv = HTTPServer(("127.0.0.1", 0), SheetStub)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    import rasmus_liste_til_csv as mod
+    importlib.reload(mod)
+    monkeypatch.setattr(mod, "url", f"http://127.0.0.1:{srv.server_port}/export?format=csv")
+    yield mod
+    srv.shutdown()
+
+
+def test_304_keeps_local_copy(sheet, tmp_path):
+    assert sheet.main() is True
+    assert sheet.load_meta()["etag"] == '"v1"'
+    out = tmp_path / sheet.OUT_FILE
+    out.write_text("urørt", encoding="utf-8")
+
+    assert sheet.main() is False
+    assert SheetStub.seen[-1].get("If-None-Match") == '"v1"'
+    assert out.read_text(encoding="utf-8") == "urørt"
+    assert sheet.input_unchanged()
+
+
+def test_same_body_without_validators_is_unchanged(sheet, tmp_path):
+    SheetStub.send_etag = False
+    assert sheet.main() is True
+    mtime = (tmp_path / sheet.OUT_FILE).stat().st_mtime_ns
+    assert sheet.main() is False
+    assert (tmp_path / sheet.OUT_FILE).stat().st_mtime_ns == mtime
+    assert not (tmp_path / (sheet.OUT_FILE + ".tmp")).exists()
+    # uden lokal kopi sendes ingen betingede headers, og filen skrives igen
+    (tmp_path / sheet.OUT_FILE).unlink()
+    assert sheet.main() is True
+    assert "If-None-Match" not in SheetStub.seen[-1]
+    assert not sheet.input_unchanged()
+
+
+def test_ingest_normalizes_dedupes_and_checks_columns(tmp_path):
+    import rasmus_liste_til_csv as mod
+    importlib.reload(mod)
+    body = ('\ufeff card ,Name,Note\r\n"12 345",Anna,"to\nlinjer"\r\n12345.0,Dublet,x\r\n'
+            ',Tom,\r\n777,"Bo, B",\r\n').encode("utf-8")
+    out = tmp_path / "out.csv"
+    # små chunks, så linjer (og \r\n) deles over chunk-grænser
+    digest, stats = mod.ingest((body[i:i + 5] for i in range(0, len(body), 5)), str(out))
+    assert digest == hashlib.sha256(body).hexdigest()
+    assert stats == {"rows": 4, "written": 2, "blank": 1, "duplicates": 1}
+    with open(out, newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [["Card", "Name", "Note"], ["12345", "Anna", "to\nlinjer"], ["777", "Bo, B", ""]]
+
+    with pytest.raises(ValueError, match="Card"):
+        mod.ingest([b"\n"], str(out))
+
+
+def test_ingest_falls_back_to_first_column(tmp_path, monkeypatch):
+    import rasmus_liste_til_csv as mod
+    monkeypatch.setattr(mod, "REQUIRED_COLUMNS", ["Name"])
+    out = tmp_path / "out.csv"
+    into = {}
+    _, stats = mod.ingest([b"Kortnr,Name\n 111 ,Anna\n222,Bo\n"], str(out), into)
+    assert stats["written"] == 2
+    assert into == {"111": {"name": "Anna", "pid": ""}, "222": {"name": "Bo", "pid": ""}}
+    with open(out, newline="", encoding="utf-8") as f:
+        assert next(csv.reader(f)) == ["Card", "Name"]
+
+    with pytest.raises(ValueError, match="Name"):
+        mod.ingest([b"Kortnr,Navn\n111,Anna\n"], str(out))
@@ -0,0 +1,54 @@
+# tests/test_resolve_cards.py
+import importlib
+import re
+
+import responses
+
+from tests.conftest import ACCT_BASE
+from utils.card_cache import CardCache
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+
+
+def _users(*pairs) -> str:
+    rows = "".join(f"<User><Card>{c}</Card><UserID>{ACCT_BASE}/users/{g}</UserID></User>" for c, g in pairs)
+    return f'<UserCollection xmlns="{NS}">{rows}</UserCollection>'
+
+
+def _mrd():
+    import member_rasmus_diff as mod
+    importlib.reload(mod)
+    return mod
+
+
+@responses.activate
+def test_resolve_cards_dedupes_and_uses_cache(tmp_path):
+    mrd = _mrd()
+    cache = CardCache(tmp_path/"c.json")
+    cache.put("CACHED", "uid_cached")
+    responses.add(responses.GET, f"{ACCT_BASE}/users?card=A", body=_users(("A", "uid_A")), status=200)
+    responses.add(responses.GET, re.compile(rf"{re.escape(ACCT_BASE)}/users.*B"), status=404)
+
+    out = mrd.resolve_cards(["A", "B", "A", "CACHED", " "], cache, jobs=4, export_threshold=10)
+
+    assert out == {"CACHED": "uid_cached", "A": "uid_A", "B": None}
+    assert sum(1 for c in responses.calls if "A" in c.request.url) == 1
+    # B blev afvist af alle kandidat-URL'er → negativ post, ingen nye kald
+    n = len(responses.calls)
+    assert mrd.resolve_cards(["B"], cache, jobs=4, export_threshold=10) == {"B": None}
+    assert len(responses.calls) == n
+
+
+@responses.activate
+def test_resolve_cards_switches_to_full_export_above_threshold(tmp_path):
+    mrd = _mrd()
+    cache = CardCache(tmp_path/"c.json")
+    responses.add(responses.GET, f"{ACCT_BASE}/users",
+                  body=_users(("A", "uid_A"), ("B", "uid_B"), ("Z", "uid_Z")), status=200)
+
+    out = mrd.resolve_cards(["A", "B", "C"], cache, jobs=4, export_threshold=3)
+
+    assert out == {"A": "uid_A", "B": "uid_B", "C": None}
+    assert len(responses.calls) == 1
+    assert cache.lookup("C") == (True, None)
+    assert cache.lookup("Z") == (False, None)
@@ -0,0 +1,92 @@
+# tests/test_stage_profile.py
+import json
+import pstats
+from pathlib import Path
+
+
+def _busy(n):
+    return sum(i * i for i in range(n))
+
+
+def test_stages_are_profiled_including_pool_workers(tmp_path):
+    import pipeline
+    from utils import stage_profile
+    from utils.concurrency import run_bounded
+
+    stage_profile.start(tmp_path / "prof", top=5)
+    try:
+        assert pipeline.stage("diff", lambda: [b"x" * 100_000 for _ in range(20)]) is not None
+        results = pipeline.stage("apply", lambda: list(run_bounded(_busy, [20_000] * 8, 4)))
+    finally:
+        files = stage_profile.finish()
+    assert len(results) == 8
+    assert {Path(f).name for f in files} == {"diff.pstats", "diff.txt", "apply.pstats", "apply.txt",
+                                             "profile_summary.json"}
+
+    summary = json.loads((tmp_path / "prof" / "profile_summary.json").read_text(encoding="utf-8"))
+    assert summary["diff"]["peak_bytes"] >= 20 * 100_000
+    assert summary["apply"]["worker_threads"] >= 2
+    # worker-trådenes kald er lagt sammen med trinets
+    funcs = {name for (_, _, name) in pstats.Stats(str(tmp_path / "prof" / "apply.pstats")).stats}
+    assert "_busy" in funcs
+    assert (tmp_path / "prof" / "apply.txt").read_text(encoding="utf-8").startswith("trin apply: ")
+    assert not stage_profile.active()
+
+
+def test_disabled_is_passthrough(tmp_path):
+    import pipeline
+    from utils import stage_profile
+    assert not stage_profile.active()
+    assert pipeline.stage("group", lambda: 42) == 42
+    assert stage_profile.finish() == []
+
+
+def test_orchestrator_profile_flag(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import orchestrator
+    import pipeline
+
+    monkeypatch.setattr(pipeline, "run",
+                        lambda create_missing, dry_run, deadline=None: pipeline.stage("rasmus", _busy, 1000) and {})
+    summary = orchestrator.run(env_file=None, tee=False, profile=True)
+    names = {Path(p).name for p in summary["profiles"]}
+    assert {"rasmus.pstats", "rasmus.txt", "profile_summary.json"} <= names
+    assert all(Path(p).parent.name.startswith("profile_") for p in summary["profiles"])
+
+
+def test_run_bounded_does_not_import_profilers():
+    import subprocess
+    import sys
+    code = ("import sys; from utils.concurrency import run_bounded; list(run_bounded(abs, [-1, -2], 2)); "
+            "print(','.join(m for m in ('cProfile', 'pstats', 'tracemalloc', 'utils.stage_profile') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).resolve().parent.parent,
+                         capture_output=True, text=True, check=True).stdout.strip()
+    assert out == ""
+
+
+def test_concurrent_stage_in_other_thread_runs_unprofiled(tmp_path, capsys):
+    import threading
+    from utils import stage_profile
+
+    inside, release = threading.Event(), threading.Event()
+    other = []
+
+    def slow():
+        inside.set()
+        release.wait(5)
+
+    stage_profile.start(tmp_path / "prof")
+    try:
+        t = threading.Thread(target=stage_profile.profiled, args=("apply", slow))
+        t.start()
+        inside.wait(5)
+        th = threading.Thread(target=lambda: other.append(stage_profile.profiled("group", lambda: 7)))
+        th.start()
+        th.join(5)
+        release.set()
+        t.join(5)
+    finally:
+        files = stage_profile.finish()
+    assert other == [7]
+    assert {Path(f).name for f in files} == {"apply.pstats", "apply.txt", "profile_summary.json"}
+    assert "Profil group: ikke profileret (trin apply" in capsys.readouterr().out
@@ -0,0 +1,103 @@
+# tests/test_stream_users.py
+import csv
+import importlib
+import tracemalloc
+import xml.etree.ElementTree as ET
+import responses
+
+from tests.conftest import ACCT_BASE, GROUP_ID
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+XSI = "http://www.w3.org/2001/XMLSchema-instance"
+
+
+def _collection(n: int) -> bytes:
+    rows = [f'<UserCollection xmlns="{NS}" xmlns:i="{XSI}">']
+    for i in range(n):
+        entry = '<EntryRemaining i:nil="true"/>' if i % 2 else f"<EntryRemaining>{i % 3}</EntryRemaining>"
+        rows.append(f"<User><Card>C{i}</Card>{entry}<Name>N{i}</Name>"
+                    f"<UserID>{ACCT_BASE}/users/guid-{i}</UserID></User>")
+    rows.append("<User><Card>no-guid</Card></User>")  # springes over
+    rows.append("</UserCollection>")
+    return "".join(rows).encode("utf-8")
+
+
+def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_stream_matches_tree_parse():
+    import find_users as mod
+    importlib.reload(mod)
+    from utils.xml_utils import iter_elements
+
+    data = _collection(50)
+    expected = mod.parse_users(ET.fromstring(data))
+    streamed = list(iter_elements(_chunks(data, 37), f"{{{NS}}}User", mod.parse_user))
+    assert streamed == expected
+    assert len(streamed) == 50
+
+
+def test_stream_memory_is_flat():
+    import find_users as mod
+    from utils.xml_utils import iter_elements
+
+    def peak(n):
+        data = _collection(n)
+        tracemalloc.start()
+        for _ in iter_elements(_chunks(data, 64 * 1024), f"{{{NS}}}User", mod.parse_user):
+            pass
+        _, p = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return p
+
+    # 10x flere brugere må ikke give ~10x peak (træet ryddes løbende)
+    assert peak(10000) < 3 * peak(1000)
+
+
+@responses.activate
+def test_build_members_csv_main_streams_to_csv(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import build_members_csv as mod
+    importlib.reload(mod)
+    responses.add(responses.GET, f"{ACCT_BASE}/groups/{GROUP_ID}/users",
+                  body=_collection(3), status=200, content_type="application/xml")
+    mod.main()
+    with open(tmp_path/"group_members.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Card", "Name", "UserID", "EntryRemaining"]
+    assert rows[1:] == [["C0", "N0", "guid-0", "0"], ["C1", "N1", "guid-1", "nil"], ["C2", "N2", "guid-2", "2"]]
+
+
+@responses.activate
+def test_fetch_group_members_returns_by_card_and_writes_while_streaming(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import build_members_csv as mod
+    importlib.reload(mod)
+    responses.add(responses.GET, f"{ACCT_BASE}/groups/{GROUP_ID}/users",
+                  body=_collection(3), status=200, content_type="application/xml")
+    by_card = mod.fetch_group_members(write=True)
+    assert by_card["C1"] == {"UserID": "guid-1", "EntryRemaining": "nil"}
+    assert len(by_card) == 3
+    with open(tmp_path/"group_members.csv", newline="", encoding="utf-8") as f:
+        assert len(list(csv.reader(f))) == 4
+
+
+@responses.activate
+def test_find_users_snapshot_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import find_users as mod
+    from utils import snapshot
+    importlib.reload(mod)
+    responses.add(responses.GET, f"{ACCT_BASE}/users", body=_collection(3), status=200,
+                  content_type="application/xml")
+
+    mod.main()
+    assert snapshot.shared().get("guid-1") is None
+    assert not (tmp_path/"user_snapshot.json").exists()
+
+    monkeypatch.setenv("USER_SNAPSHOT_ALL_USERS", "1")
+    mod.main()
+    assert snapshot.shared().get("guid-1")["card"] == "C1"
+    assert (tmp_path/"user_snapshot.json").exists()
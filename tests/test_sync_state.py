@@ -0,0 +1,61 @@
+# tests/test_sync_state.py
+import importlib
+
+from utils import sync_state
+
+
+def _mrd():
+    import member_rasmus_diff as mod
+    importlib.reload(mod)
+    return mod
+
+
+def _group(**rows):
+    return {card: {"UserID": uid, "EntryRemaining": entry} for card, (uid, entry) in rows.items()}
+
+
+def test_hashes_ignore_order():
+    a = {"C1": {"UserID": "u1", "EntryRemaining": "1"}, "C2": {"UserID": "u2", "EntryRemaining": "0"}}
+    b = dict(reversed(list(a.items())))
+    assert sync_state.group_hash(a) == sync_state.group_hash(b)
+    assert sync_state.rasmus_hash(["C2", "C1"]) == sync_state.rasmus_hash({"C1", "C2"})
+
+
+def test_incremental_diff_skips_unchanged_and_restricts_to_changed(monkeypatch):
+    mrd = _mrd()
+    calls = []
+    real = mrd.compute_diff
+    monkeypatch.setattr(mrd, "compute_diff", lambda r, g: calls.append((set(r), set(g))) or real(r, g))
+
+    rasmus = {"C1", "C2", "C3"}
+    group = _group(C1=("u1", "1"), C2=("u2", "1"), C9=("u9", "1"))
+    # ingen gemt tilstand → fuld diff
+    assert mrd.incremental_diff(rasmus, group) == (["u9"], ["C3"], [])
+    assert calls[-1] == (rasmus, set(group))
+
+    # post-state efter apply: C3 tilføjet, C9 fjernet
+    post = _group(C1=("u1", "1"), C2=("u2", "1"), C3=("u3", "1"))
+    mrd.commit_sync_state(post, rasmus)
+    n = len(calls)
+    assert mrd.incremental_diff(rasmus, post) == ([], [], [])
+    assert len(calls) == n  # ingen diff overhovedet
+
+    # én ændret række og ét nyt kort → kun de kort diff'es
+    changed = _group(C1=("u1", "0"), C2=("u2", "1"), C3=("u3", "1"))
+    assert mrd.incremental_diff(rasmus | {"C4"}, changed) == ([], ["C4"], ["u1"])
+    assert calls[-1] == ({"C1", "C4"}, {"C1"})
+
+
+def test_pending_cards_are_rediffed_and_state_is_scoped_to_group(monkeypatch):
+    mrd = _mrd()
+    # sidste kørsel efterlod C2 uden medlemskab (fx fejlet ADD) og C1 med EntryRemaining=0
+    rasmus = {"C1", "C2"}
+    group = _group(C1=("u1", "0"))
+    state = sync_state.save(rasmus, group, mrd.needs_reset)
+    assert state["pending"] == ["C1", "C2"]
+    assert mrd.incremental_diff(rasmus, group) == ([], ["C2"], ["u1"])
+
+    monkeypatch.setenv("GROUP_ID", "anden-gruppe")
+    assert sync_state.load() is None
+    monkeypatch.setenv("SYNC_INCREMENTAL", "0")
+    assert sync_state.load() is None
@@ -0,0 +1,54 @@
+# tests/test_user_snapshot.py
+import importlib
+
+import responses
+
+from tests.conftest import ACCT_BASE, GROUP_ID, xml_groups_array
+from utils import snapshot
+from utils.snapshot import UserSnapshot
+
+GUID = "01234567-89ab-cdef-0123-456789abcdef"
+FIELDS = {"card": "C1", "name": "N1", "entry_nil": False, "entry_text": "0"}
+
+
+def test_staleness_rules(tmp_path, monkeypatch):
+    t = [1000.0]
+    monkeypatch.setattr(snapshot, "_now", lambda: t[0])
+    monkeypatch.setenv("USER_SNAPSHOT_MAX_AGE", "60")
+    path = tmp_path/"snap.json"
+
+    s = UserSnapshot(path)
+    s.record("a", FIELDS)
+    s.record("b", FIELDS)
+    s.invalidate("b")
+    assert s.get("a") == FIELDS and s.get("b") is None
+    s.save()
+
+    # ny proces: invaliderede poster er ikke gemt; for gamle poster ignoreres
+    assert UserSnapshot(path).get("a") == FIELDS
+    assert UserSnapshot(path).get("b") is None
+    t[0] += 61
+    assert UserSnapshot(path).get("a") is None
+
+    # snapshot fra et andet ACCT-miljø bruges ikke
+    t[0] = 1000.0
+    monkeypatch.setenv("ACCT_BASE", "https://prod.acct.dk/rest/current")
+    assert UserSnapshot(path).get("a") is None
+
+
+@responses.activate
+def test_remove_fallback_uses_snapshot_instead_of_get_user():
+    import changing_state_of_group as mod
+    importlib.reload(mod)
+    snapshot.shared().record(GUID, FIELDS)
+
+    responses.add(responses.DELETE, f"{ACCT_BASE}/groups/{GROUP_ID}/users/{GUID}", status=405)
+    responses.add(responses.GET, f"{ACCT_BASE}/users/{GUID}/groups", body=xml_groups_array([GROUP_ID, "g2"]))
+    responses.add(responses.PUT, f"{ACCT_BASE}/users/{GUID}", status=202)
+    responses.add(responses.GET, f"{ACCT_BASE}/users/{GUID}/groups", body=xml_groups_array(["g2"]))
+
+    assert mod.remove_user_from_group(GUID) == (True, None)
+    assert not any(c.request.url == f"{ACCT_BASE}/users/{GUID}" and c.request.method == "GET"
+                   for c in responses.calls)
+    # efter PUT er posten invalideret
+    assert snapshot.shared().get(GUID) is None
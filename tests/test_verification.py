@@ -0,0 +1,60 @@
+# tests/test_verification.py
+import importlib
+
+import pytest
+import responses
+
+from tests.conftest import ACCT_BASE, GROUP_ID, xml_groups_array
+from utils.verification import VerifyPolicy, parse_policy
+
+NS = "http://schemas.datacontract.org/2004/07/AcctPublicRestCommunicationLibrary"
+
+
+def test_parse_policy_variants():
+    assert parse_policy(None).mode == "per_op"
+    assert parse_policy("batch").batch
+    p = parse_policy("sampled(25%)")
+    assert p.mode == "sampled" and p.percent == 25
+    assert parse_policy("sampled:5").percent == 5
+    assert parse_policy("sampled").percent == 10
+    with pytest.raises(ValueError):
+        parse_policy("sometimes")
+
+
+def test_sampled_is_deterministic_and_roughly_proportional():
+    p = VerifyPolicy("sampled", 20)
+    uids = [f"guid-{i}" for i in range(2000)]
+    picked = [u for u in uids if p.inline(u)]
+    assert picked == [u for u in uids if p.inline(u)]
+    assert 300 < len(picked) < 500
+    assert not VerifyPolicy("batch").inline("x") and VerifyPolicy("per_op").inline("x")
+
+
+def _members(*rows) -> str:
+    users = "".join(f"<User><Card>{g}</Card><EntryRemaining>{e}</EntryRemaining>"
+                    f"<UserID>{ACCT_BASE}/users/{g}</UserID></User>" for g, e in rows)
+    return f'<UserCollection xmlns="{NS}">{users}</UserCollection>'
+
+
+@responses.activate
+def test_verify_batch_rechecks_only_mismatches(monkeypatch):
+    monkeypatch.setenv("VERIFY_POLICY", "batch")
+    import changing_state_of_group as mod
+    importlib.reload(mod)
+
+    responses.add(responses.GET, f"{ACCT_BASE}/groups/{GROUP_ID}/users",
+                  body=_members(("added", "1"), ("lagging", "1"), ("updated", "1")), status=200)
+    # "ghost" mangler i udtrækket og er heller ikke i gruppen ved gen-tjek
+    responses.add(responses.GET, f"{ACCT_BASE}/users/ghost/groups", body=xml_groups_array([]), status=200)
+
+    add, dele, upd = mod.verify_batch(
+        [("added", (True, None)), ("ghost", (True, None)), ("failed", (False, "500"))],
+        [("gone", (True, None))],
+        [("updated", (True, None))],
+    )
+
+    assert add == [("added", (True, None)), ("ghost", (False, "verify_failed: not_in_group")),
+                   ("failed", (False, "500"))]
+    assert dele == [("gone", (True, None))]
+    assert upd == [("updated", (True, None))]
+    assert len(responses.calls) == 2
@@ -0,0 +1,196 @@
+# utils/acct_async.py
+"""
+asyncio-klient til ACCT (aiohttp).
+
+Modstykke til utils.acct_client: én ClientSession med keep-alive connector,
+Basic Auth, default headers og timeout. Antallet af samtidige kald styres af
+semaforer (ikke tråde), så tusindvis af operationer kan være "i gang" på én
+event loop uden tusindvis af OS-tråde.
+
+Konfiguration (env):
+  ACCT_ASYNC_LIMIT   max samtidige læsninger og åbne forbindelser (default 100)
+  ACCT_MAX_WRITES    max samtidige PUT/POST/DELETE (samme som acct_client)
+  ACCT_TIMEOUT       default timeout i sekunder (samme som acct_client)
+  ACCT_ADAPTIVE*, ACCT_MAX_RETRIES  som i acct_client (egen AIMD-controller pr. klient)
+
+aiohttp importeres først ved brug, så den synkrone pipeline ikke kræver den.
+"""
+import asyncio
+import base64
+import os
+import time
+
+from requests.structures import CaseInsensitiveDict
+
+from utils import acct_client, metrics
+from utils.adaptive import THROTTLE_STATUSES, parse_retry_after
+
+
+class AcctRequestError(Exception):
+    """Netværks-/timeoutfejl mod ACCT (svarer til requests.RequestException)."""
+
+
+class Response:
+    """Læst svar: status_code, content (bytes), headers og text som hos requests."""
+
+    def __init__(self, status_code: int, content: bytes, headers: dict):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+
+class StreamedResponse:
+    """
+    Ulæst svar (request(..., stream=True)): status_code og headers er klar,
+    kroppen læses med iter_chunked(). Brug som ``async with`` (eller kald
+    release()), så forbindelsen gives tilbage til poolen.
+    """
+
+    def __init__(self, r, errors: tuple = ()):
+        self._r = r
+        self._errors = errors + (asyncio.TimeoutError,)
+        self.status_code = r.status
+        self.headers = CaseInsensitiveDict(r.headers)
+
+    async def iter_chunked(self, size: int = 64 * 1024):
+        """Kroppen i chunks; afbrudt forbindelse/timeout undervejs bliver til AcctRequestError."""
+        try:
+            async for chunk in self._r.content.iter_chunked(size):
+                yield chunk
+        except self._errors as e:
+            raise AcctRequestError(f"{self._r.method} {self._r.url}: {e!r}") from e
+
+    def release(self) -> None:
+        self._r.release()
+
+    async def __aenter__(self) -> "StreamedResponse":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+def async_limit() -> int:
+    return acct_client.env_int("ACCT_ASYNC_LIMIT", 100)
+
+
+class AsyncAcctClient:
+    """
+    Brug som ``async with AsyncAcctClient() as client: r = await client.get(url)``.
+    Skal oprettes inde i den event loop den bruges i.
+    """
+
+    def __init__(self, limit: int | None = None, max_writes: int | None = None):
+        self.limit = limit or async_limit()
+        self.max_writes = max_writes or acct_client.max_writes()
+        self._session = None
+        self._read_slots = asyncio.Semaphore(self.limit)
+        self._write_slots = asyncio.Semaphore(self.max_writes)
+        self.controller = acct_client.new_controller()
+        self.retries = 0
+
+    async def __aenter__(self) -> "AsyncAcctClient":
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise RuntimeError("aiohttp mangler — installer den for at bruge async-motoren (pip install aiohttp)") from e
+        self._aiohttp = aiohttp
+        creds = f'{os.getenv("ACCT_USER", "")}:{os.getenv("ACCT_PASS", "")}'.encode("utf-8")
+        self._session = aiohttp.ClientSession(
+            headers={**acct_client.DEFAULT_HEADERS, "Authorization": "Basic " + base64.b64encode(creds).decode("ascii")},
+            connector=aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit),
+            timeout=aiohttp.ClientTimeout(total=acct_client.default_timeout()),
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method: str, url: str, *, data: bytes | None = None,
+                      headers: dict | None = None, timeout: float | None = None,
+                      stream: bool = False) -> Response | StreamedResponse:
+        """stream=True: returnér efter headers (StreamedResponse) i stedet for at læse hele kroppen."""
+        if self._session is None:
+            raise RuntimeError("AsyncAcctClient skal bruges som 'async with'")
+        aiohttp = self._aiohttp
+        slots = self._read_slots if method.upper() in acct_client.READ_METHODS else self._write_slots
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        ctl = self.controller
+        method = method.upper()
+        attempt = 0
+        while True:
+            retry_after = None
+            async with slots:
+                if ctl is not None:
+                    await ctl.acquire_async()
+                start = time.monotonic()
+                try:
+                    if stream:
+                        resp = StreamedResponse(
+                            await self._session.request(method, url, data=data, headers=headers, **kwargs),
+                            (aiohttp.ClientError,))
+                        try:
+                            size = int(resp.headers.get("Content-Length") or 0)
+                        except ValueError:
+                            size = 0
+                    else:
+                        async with self._session.request(method, url, data=data, headers=headers, **kwargs) as r:
+                            body = await r.read()
+                            resp = Response(r.status, body, CaseInsensitiveDict(r.headers))
+                        size = len(body)
+                except BaseException as e:
+                    elapsed = time.monotonic() - start
+                    if ctl is not None:
+                        ctl.release(None, elapsed, timeout=isinstance(e, asyncio.TimeoutError))
+                    retry = (isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError))
+                             and acct_client.should_retry(method, None, attempt))
+                    metrics.record_http(method, url, None, elapsed, 0, len(data or b""), retry=retry)
+                    if not isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                        raise
+                    if not retry:
+                        raise AcctRequestError(f"{method} {url}: {e!r}") from e
+                    resp = None
+                else:
+                    elapsed = time.monotonic() - start
+                    if resp.status_code in THROTTLE_STATUSES:
+                        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                    if ctl is not None:
+                        ctl.release(resp.status_code, elapsed, retry_after)
+                    retry = (resp.status_code in THROTTLE_STATUSES
+                             and acct_client.should_retry(method, resp.status_code, attempt))
+                    metrics.record_http(method, url, resp.status_code, elapsed, size, len(data or b""),
+                                        retry=retry)
+                    if not retry:
+                        return resp
+                    if stream:
+                        resp.release()
+            self.retries += 1
+            await asyncio.sleep(acct_client.retry_delay(attempt, retry_after, ctl))
+            attempt += 1
+
+    def stats(self) -> dict:
+        """Samme form som acct_client.stats()."""
+        return {
+            "adaptive": self.controller.stats() if self.controller is not None else None,
+            "retries": self.retries,
+        }
+
+    async def get(self, url: str, **kwargs) -> Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> Response:
+        return await self.request("DELETE", url, **kwargs)
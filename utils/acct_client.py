@@ -0,0 +1,276 @@
+# utils/acct_client.py
+"""
+Fælles HTTP-klient til ACCT.
+
+Alle stages deler én keep-alive ``requests.Session`` med connection pool,
+Basic Auth, default headers og default timeout, så en kørsel ikke betaler
+TCP/TLS-handshake for hvert kald.
+
+Konfiguration (env):
+  ACCT_USER / ACCT_PASS   Basic Auth
+  ACCT_POOL_SIZE          antal keep-alive forbindelser pr. host (default 20)
+  ACCT_TIMEOUT            default timeout i sekunder (default 30)
+  ACCT_MAX_READS          max samtidige GET-kald (default = pool size)
+  ACCT_MAX_WRITES         max samtidige PUT/POST/DELETE-kald (default 8)
+  ACCT_MAX_RETRIES        genforsøg ved 429/503/timeouts (default 2)
+  ACCT_ADAPTIVE           "0" slår AIMD-controlleren fra (default "1")
+  ACCT_ADAPTIVE_INITIAL / ACCT_ADAPTIVE_MIN / ACCT_ADAPTIVE_MAX
+                          start-, mindste- og største loft for samtidige kald (4 / 1 / 64)
+  ACCT_STATS_FILE         hvis sat: tilføj kørslens HTTP-statistik som JSON-linje ved exit
+                          (orchestrator.run skriver selv én linje pr. kørsel)
+
+Hvert forsøg registreres også pr. endpoint i utils.metrics (antal, status,
+latens, bytes, genforsøg).
+
+Grænserne for læsninger og skrivninger er adskilte, så mange parallelle
+GETs ikke kan presse ACCT med lige så mange samtidige skrivninger.
+Inden for dem styrer utils.adaptive.AimdController det faktiske antal
+samtidige kald ud fra ACCT's svar (latency, 429/5xx, Retry-After).
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from utils import metrics
+from utils.adaptive import THROTTLE_STATUSES, AimdController, parse_retry_after
+
+DEFAULT_HEADERS = {"Accept": "application/xml"}
+XML_BODY_HEADERS = {"Content-Type": "application/xml; charset=utf-8", "Accept": "application/xml"}
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Metoder der må gentages efter 503/timeout (PUT erstatter hele UserData, DELETE er idempotent)
+IDEMPOTENT_METHODS = READ_METHODS | {"PUT", "DELETE"}
+
+_session: requests.Session | None = None
+_read_slots: threading.BoundedSemaphore | None = None
+_write_slots: threading.BoundedSemaphore | None = None
+_controller: AimdController | None = None
+_retries = 0
+_stats_hook_registered = False
+_lock = threading.Lock()
+
+# udskiftelig i tests
+_sleep = time.sleep
+
+
+def env_int(name: str, default: int, minimum: int = 1) -> int:
+    try:
+        return max(minimum, int(os.getenv(name, "") or default))
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def pool_size() -> int:
+    return env_int("ACCT_POOL_SIZE", 20)
+
+
+def default_timeout() -> float:
+    return env_float("ACCT_TIMEOUT", 30.0)
+
+
+def max_reads() -> int:
+    return env_int("ACCT_MAX_READS", pool_size())
+
+
+def max_writes() -> int:
+    return env_int("ACCT_MAX_WRITES", 8)
+
+
+def max_retries() -> int:
+    return env_int("ACCT_MAX_RETRIES", 2, minimum=0)
+
+
+def new_controller() -> AimdController | None:
+    """AIMD-controller konfigureret fra env, eller None hvis ACCT_ADAPTIVE=0."""
+    if os.getenv("ACCT_ADAPTIVE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    return AimdController(
+        initial=env_int("ACCT_ADAPTIVE_INITIAL", 4),
+        min_limit=env_int("ACCT_ADAPTIVE_MIN", 1),
+        max_limit=env_int("ACCT_ADAPTIVE_MAX", 64),
+    )
+
+
+def should_retry(method: str, status: int | None, attempt: int) -> bool:
+    """
+    Gentag ved 429 (altid — serveren har afvist kaldet) og ved 503/timeouts
+    for idempotente metoder, højst ACCT_MAX_RETRIES gange.
+    """
+    if attempt >= max_retries():
+        return False
+    if status == 429:
+        return True
+    return (status is None or status in THROTTLE_STATUSES) and method in IDEMPOTENT_METHODS
+
+
+def retry_delay(attempt: int, retry_after: float | None, controller: AimdController | None) -> float:
+    """
+    Ventetid før genforsøg. Med controller venter acquire() selv på Retry-After,
+    så her ventes kun eksponentiel backoff når serveren ikke gav et tidspunkt.
+    """
+    if retry_after is not None:
+        return 0.0 if controller is not None else retry_after
+    return min(8.0, 0.5 * (2 ** attempt))
+
+
+def _count_retry() -> None:
+    global _retries
+    with _lock:
+        _retries += 1
+
+
+def _build_session() -> requests.Session:
+    s = requests.Session()
+    s.auth = HTTPBasicAuth(os.getenv("ACCT_USER", ""), os.getenv("ACCT_PASS", ""))
+    s.headers.update(DEFAULT_HEADERS)
+    size = pool_size()
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def get_session() -> requests.Session:
+    """Returnér den delte session (oprettes ved første brug, trådsikkert)."""
+    global _session, _read_slots, _write_slots, _controller, _stats_hook_registered
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _read_slots = threading.BoundedSemaphore(max_reads())
+                _write_slots = threading.BoundedSemaphore(max_writes())
+                _controller = new_controller()
+                _session = _build_session()
+                if os.getenv("ACCT_STATS_FILE") and not _stats_hook_registered:
+                    atexit.register(_write_stats_at_exit)
+                    _stats_hook_registered = True
+    return _session
+
+
+def reset_session() -> None:
+    """Luk og glem den delte session (fx efter ændring af credentials i env)."""
+    global _session, _read_slots, _write_slots, _controller, _retries
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _read_slots = _write_slots = None
+        _controller = None
+        _retries = 0
+
+
+def _write_stats_at_exit() -> None:
+    # en session lukket med reset_session() (fx i orchestrator.run) har allerede skrevet sine tal
+    path = os.getenv("ACCT_STATS_FILE")
+    if path and _session is not None:
+        write_stats(path)
+
+
+def _body_size(data) -> int:
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    return len(data) if isinstance(data, (bytes, bytearray)) else 0
+
+
+def _response_size(r: requests.Response, stream: bool) -> int:
+    # et streamet svar må ikke læses her; brug Content-Length hvis serveren sender den
+    if stream:
+        try:
+            return int(r.headers.get("Content-Length") or 0)
+        except ValueError:
+            return 0
+    return len(r.content)
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", default_timeout())
+    session = get_session()
+    method = method.upper()
+    sent = _body_size(kwargs.get("data"))
+    slots = _read_slots if method in READ_METHODS else _write_slots
+    ctl = _controller
+    attempt = 0
+    while True:
+        with slots:
+            if ctl is not None:
+                ctl.acquire()
+            start = time.monotonic()
+            try:
+                r = session.request(method, url, **kwargs)
+            except BaseException as e:
+                # slot skal altid frigives, også ved uventede fejl
+                elapsed = time.monotonic() - start
+                if ctl is not None:
+                    ctl.release(None, elapsed, timeout=isinstance(e, requests.Timeout))
+                retry = (isinstance(e, (requests.ConnectionError, requests.Timeout))
+                         and should_retry(method, None, attempt))
+                metrics.record_http(method, url, None, elapsed, 0, sent, retry=retry)
+                if not retry:
+                    raise
+                r = None
+            else:
+                elapsed = time.monotonic() - start
+                retry_after = None
+                if r.status_code in THROTTLE_STATUSES:
+                    retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                if ctl is not None:
+                    ctl.release(r.status_code, elapsed, retry_after)
+                retry = r.status_code in THROTTLE_STATUSES and should_retry(method, r.status_code, attempt)
+                metrics.record_http(method, url, r.status_code, elapsed,
+                                    _response_size(r, kwargs.get("stream", False)), sent, retry=retry)
+                if not retry:
+                    return r
+                # svaret bruges ikke: frigiv forbindelsen til poolen (streamede svar holder den ellers)
+                r.close()
+        # genforsøg — udenfor slots, så ventetiden ikke blokerer andre
+        _count_retry()
+        _sleep(retry_delay(attempt, retry_after if r is not None else None, ctl))
+        attempt += 1
+
+
+def stats() -> dict:
+    """HTTP-statistik for processen: AIMD-justeringer og antal genforsøg."""
+    ctl = _controller
+    return {
+        "adaptive": ctl.stats() if ctl is not None else None,
+        "retries": _retries,
+    }
+
+
+def write_stats(path: str, stage: str | None = None) -> None:
+    """Tilføj stats() som én JSON-linje (med stage-navn) til path."""
+    rec = {"stage": stage or os.path.basename(sys.argv[0] or "python"), **stats()}
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request("PUT", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> requests.Response:
+    return request("DELETE", url, **kwargs)
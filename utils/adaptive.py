@@ -0,0 +1,170 @@
+# utils/adaptive.py
+"""
+AIMD-styret samtidighed mod ACCT.
+
+Controlleren holder et dynamisk loft for antal samtidige kald:
+  - additiv stigning (+1 pr. "vindue" af vellykkede kald) så længe latency
+    og fejlrate er sunde
+  - multiplikativ nedgang ved 429/5xx/timeouts (højst én gang pr. cooldown,
+    så en byge af fejl fra samme vindue ikke kollapser loftet)
+  - Retry-After pauser alle nye kald til tidspunktet er passeret
+
+Bruges af både utils.acct_client (tråde) og utils.acct_async (asyncio);
+konfigurationen (ACCT_ADAPTIVE*) læses dér, se acct_client.new_controller.
+"""
+import asyncio
+import threading
+import time
+
+THROTTLE_STATUSES = frozenset({429, 503})
+# Et kald regnes som "langsomt" når latency > baseline * LATENCY_TOLERANCE
+LATENCY_TOLERANCE = 3.0
+# Mindste latency (s) der kan tælle som langsom, så støj ved meget hurtige svar ignoreres
+LATENCY_FLOOR = 0.05
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After som sekunder (heltal eller HTTP-dato); None hvis ukendt."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        dt = parsedate_to_datetime(value)
+        return max(0.0, dt.timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class AimdController:
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 backoff: float = 0.5, cooldown: float = 1.0):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.backoff = backoff
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._baseline: float | None = None
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "initial_limit": int(self.limit),
+            "min_limit_seen": int(self.limit),
+            "max_limit_seen": int(self.limit),
+            "requests": 0,
+            "increases": 0,
+            "decreases": 0,
+            "throttled": 0,
+            "server_errors": 0,
+            "timeouts": 0,
+            "slow": 0,
+            "retry_after_pauses": 0,
+            "retry_after_seconds": 0.0,
+            "wait_seconds": 0.0,
+        }
+
+    # ---------- slots ----------
+    def _try_acquire(self) -> float:
+        """Tag en slot hvis muligt og returnér 0; ellers antal sekunder der bør ventes."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self._stats["requests"] += 1
+            return 0.0
+        return 0.05
+
+    def acquire(self) -> None:
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                wait = self._try_acquire()
+                if wait <= 0:
+                    break
+                self._cond.wait(timeout=wait)
+            self._stats["wait_seconds"] += time.monotonic() - start
+
+    async def acquire_async(self) -> None:
+        start = time.monotonic()
+        while True:
+            with self._cond:
+                wait = self._try_acquire()
+                if wait <= 0:
+                    self._stats["wait_seconds"] += time.monotonic() - start
+                    return
+            await asyncio.sleep(wait)
+
+    # ---------- feedback ----------
+    def release(self, status: int | None, latency: float, retry_after: float | None = None,
+                timeout: bool = False) -> None:
+        """
+        Frigiv slot og juster loftet.
+        status=None betyder netværksfejl/timeout (timeout=True for timeouts).
+        """
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.monotonic()
+
+            if status in THROTTLE_STATUSES:
+                self._stats["throttled"] += 1
+                self._decrease(now)
+            elif status is not None and status >= 500:
+                self._stats["server_errors"] += 1
+                self._decrease(now)
+            elif status is None:
+                if timeout:
+                    self._stats["timeouts"] += 1
+                self._decrease(now)
+            else:
+                self._on_success(latency)
+
+            if retry_after:
+                self._stats["retry_after_pauses"] += 1
+                self._stats["retry_after_seconds"] += retry_after
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+            self._cond.notify_all()
+
+    def _on_success(self, latency: float) -> None:
+        if self._baseline is None:
+            self._baseline = latency
+        else:
+            # baseline følger de hurtigste svar; glider langsomt op så den kan tilpasse sig
+            self._baseline = min(latency, self._baseline * 0.99 + latency * 0.01)
+        if latency > max(LATENCY_FLOOR, self._baseline * LATENCY_TOLERANCE):
+            self._stats["slow"] += 1
+            return
+        if self.limit < self.max_limit:
+            before = int(self.limit)
+            # +1 pr. fuldt vindue af vellykkede kald
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / max(1.0, self.limit))
+            if int(self.limit) > before:
+                self._stats["increases"] += 1
+                self._stats["max_limit_seen"] = max(self._stats["max_limit_seen"], int(self.limit))
+
+    def _decrease(self, now: float) -> None:
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        new = max(float(self.min_limit), self.limit * self.backoff)
+        if int(new) < int(self.limit):
+            self._stats["decreases"] += 1
+        self.limit = new
+        self._stats["min_limit_seen"] = min(self._stats["min_limit_seen"], int(self.limit))
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = dict(self._stats)
+            out["final_limit"] = int(self.limit)
+            out["wait_seconds"] = round(out["wait_seconds"], 3)
+            out["retry_after_seconds"] = round(out["retry_after_seconds"], 3)
+            return out
@@ -0,0 +1,165 @@
+# utils/apply_journal.py
+"""
+Append-only journal over bekræftede ACCT-ændringer, så et afbrudt eller
+genstartet apply kan fortsætte hvor det slap.
+
+Hver linje er ``{"p": plan-hash, "f": fase, "u": GUID, "r": [ok, info]}``.
+Plan-hashet er over planens kørsels-id (``created``) og indhold (gruppe,
+slette-strategi, brugere og handlinger), så et genforsøg af samme plan
+(pipeline-trinets retry, eller ``--plan apply_plan.json`` efter et nedbrud)
+genkender sine egne linjer, mens en senere kørsel med samme diff — fx den
+daglige EntryRemaining-nulstilling af de samme brugere — starter forfra.
+Kun vellykkede ops skrives; fejlede prøves igen. Linjer fra andre planer
+ryddes væk ved åbning, og journalen slettes når et apply er kørt helt igennem.
+
+Skrivning sker i batches: linjerne samles og skrives + fsync'es når der er
+APPLY_JOURNAL_BATCH af dem eller APPLY_JOURNAL_INTERVAL sekunder er gået,
+og altid ved close().
+
+Konfiguration (env):
+  APPLY_JOURNAL            "0" slår journalen fra (default "1")
+  APPLY_JOURNAL_FILE       default apply_journal.jsonl
+  APPLY_JOURNAL_BATCH      linjer pr. fsync (default 50)
+  APPLY_JOURNAL_INTERVAL   max sekunder mellem fsync (default 1.0)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from utils.acct_client import env_int
+
+JOURNAL_FILE = "apply_journal.jsonl"
+
+
+def enabled() -> bool:
+    return os.getenv("APPLY_JOURNAL", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def plan_hash(plan: dict) -> str:
+    """Hash af planens kørsels-id ('created') og det den gør (uafhængigt af nøglernes rækkefølge)."""
+    core = {
+        "created": plan.get("created", ""),
+        "group_id": plan.get("group_id", ""),
+        "delete_strategy": plan.get("delete_strategy", ""),
+        "users": [[u.get("user_id"), u.get("action")] for u in plan.get("users", [])],
+    }
+    return hashlib.sha256(json.dumps(core, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class ApplyJournal:
+    def __init__(self, key: str, path: str | None = None, batch: int | None = None,
+                 interval: float | None = None):
+        self.key = key
+        self.path = Path(path or os.getenv("APPLY_JOURNAL_FILE", JOURNAL_FILE))
+        self.batch = batch or env_int("APPLY_JOURNAL_BATCH", 50, minimum=1)
+        self.interval = interval if interval is not None else float(os.getenv("APPLY_JOURNAL_INTERVAL", "1.0"))
+        self._done: dict[tuple[str, str], tuple[bool, str | None]] = {}
+        self._pending: list[str] = []
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+        self.skipped = 0
+        self._load()
+        self._fh = self.path.open("a", encoding="utf-8")
+
+    def _load(self) -> None:
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return
+        keep, foreign = [], 0
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # afbrudt midt i en linje
+            if rec.get("p") != self.key:
+                foreign += 1
+                continue
+            keep.append(line)
+            ok, info = rec["r"]
+            self._done[(rec["f"], rec["u"])] = (bool(ok), info)
+        if foreign:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text("".join(line + "\n" for line in keep), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def done(self, phase: str, uid: str) -> tuple[bool, str | None] | None:
+        """Resultatet hvis op'en allerede er bekræftet i en tidligere (afbrudt) kørsel."""
+        with self._lock:
+            res = self._done.get((phase, uid))
+            if res is not None:
+                self.skipped += 1
+            return res
+
+    def record(self, phase: str, uid: str, result: tuple[bool, str | None]) -> None:
+        """Notér en bekræftet op; skrives i næste batch."""
+        line = json.dumps({"p": self.key, "f": phase, "u": uid, "r": list(result)}, ensure_ascii=False)
+        with self._lock:
+            self._done[(phase, uid)] = result
+            self._pending.append(line)
+            if len(self._pending) >= self.batch or time.monotonic() - self._last_sync >= self.interval:
+                self._sync()
+
+    def _sync(self) -> None:
+        if self._pending:
+            self._fh.write("".join(line + "\n" for line in self._pending))
+            self._pending.clear()
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+        self._last_sync = time.monotonic()
+
+    def close(self, clear: bool = False) -> None:
+        """Skriv det sidste batch og luk. clear=True: applyet er kørt igennem — slet journalen."""
+        with self._lock:
+            self._sync()
+            self._fh.close()
+            if clear:
+                self.path.unlink(missing_ok=True)
+
+
+def open_for(plan: dict) -> ApplyJournal | None:
+    """Journal for planen, eller None hvis APPLY_JOURNAL=0."""
+    if not enabled():
+        return None
+    journal = ApplyJournal(plan_hash(plan))
+    if len(journal):
+        print(f"Genoptager apply: {len(journal)} ops er allerede bekræftet i {journal.path}")
+    return journal
+
+
+def journaled(op, journal: ApplyJournal | None, phase: str):
+    """Pak en op(uid) -> (ok, info) så bekræftede ops springes over og nye noteres."""
+    if journal is None:
+        return op
+
+    def run(uid: str) -> tuple[bool, str | None]:
+        prev = journal.done(phase, uid)
+        if prev is not None:
+            return prev
+        res = op(uid)
+        if res[0]:
+            journal.record(phase, uid, res)
+        return res
+    return run
+
+
+def ajournaled(op, journal: ApplyJournal | None, phase: str):
+    """Som journaled, for async op(uid)."""
+    if journal is None:
+        return op
+
+    async def run(uid: str) -> tuple[bool, str | None]:
+        prev = journal.done(phase, uid)
+        if prev is not None:
+            return prev
+        res = await op(uid)
+        if res[0]:
+            journal.record(phase, uid, res)
+        return res
+    return run
@@ -0,0 +1,149 @@
+# utils/artifact_store.py
+"""
+Upload af kørslens artefakter (CSV/JSON/log) til et bucket — parallelt,
+gzip-komprimeret og indholdsadresseret.
+
+Hver fil gzip'es og gemmes som ``blobs/<sha256 af indholdet>.gz``; findes
+blob'en allerede (samme indhold i en tidligere kørsel), uploades den ikke
+igen. Pr. kørsel skrives kun et lille manifest, ``logs/<ts>/manifest.json``,
+med filnavn → sha256, størrelser og blob-nøgle, så kørslens filer kan hentes
+frem igen.
+
+Backends:
+  GCSBackend    Google Cloud Storage (google-cloud-storage importeres først ved brug)
+  LocalBackend  mappe på disk — til tests og benchmarks uden netværk
+
+Konfiguration (env):
+  ARTIFACT_BACKEND   "gcs" (default når BUCKET_NAME er sat) eller "local"
+  ARTIFACT_DIR       rodmappe for "local" (default artifacts)
+  UPLOAD_JOBS        samtidige uploads (default 8)
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils.concurrency import jobs_from_env, run_bounded
+
+CONTENT_TYPES = {".csv": "text/csv", ".json": "application/json", ".jsonl": "application/json",
+                 ".log": "text/plain"}
+
+
+class LocalBackend:
+    """Blob-lager i en mappe (nøgler bliver relative stier)."""
+
+    def __init__(self, root: str | os.PathLike):
+        self.root = Path(root)
+
+    def describe(self, key: str) -> str:
+        return str(self.root / key)
+
+    def exists(self, key: str) -> bool:
+        return (self.root / key).exists()
+
+    def put(self, key: str, data: bytes, content_type: str, content_encoding: str | None = None) -> None:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+
+class GCSBackend:
+    def __init__(self, bucket_name: str):
+        from google.cloud import storage
+        self.name = bucket_name
+        self.bucket = storage.Client().bucket(bucket_name)
+
+    def describe(self, key: str) -> str:
+        return f"gs://{self.name}/{key}"
+
+    def exists(self, key: str) -> bool:
+        return self.bucket.blob(key).exists()
+
+    def put(self, key: str, data: bytes, content_type: str, content_encoding: str | None = None) -> None:
+        blob = self.bucket.blob(key)
+        if content_encoding:
+            blob.content_encoding = content_encoding
+        blob.upload_from_string(data, content_type=content_type)
+
+
+def backend_from_env():
+    """Backend ud fra ARTIFACT_BACKEND/BUCKET_NAME, eller None hvis intet er sat op."""
+    kind = os.getenv("ARTIFACT_BACKEND", "").strip().lower()
+    if kind == "local":
+        return LocalBackend(os.getenv("ARTIFACT_DIR", "artifacts"))
+    bucket = os.getenv("BUCKET_NAME")
+    if kind in ("", "gcs") and bucket:
+        return GCSBackend(bucket)
+    return None
+
+
+def blob_key(digest: str) -> str:
+    return f"blobs/{digest}.gz"
+
+
+def _upload_one(backend, path: Path, claim) -> dict:
+    raw = path.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    key = blob_key(digest)
+    entry = {"sha256": digest, "size": len(raw), "blob": key}
+    # claim: kun én tråd uploader et givent indhold i denne kørsel
+    if not claim(digest) or backend.exists(key):
+        entry["uploaded"] = False
+        return entry
+    # mtime=0: samme indhold giver samme bytes
+    data = gzip.compress(raw, compresslevel=6, mtime=0)
+    backend.put(key, data, CONTENT_TYPES.get(path.suffix.lower(), "application/octet-stream"), "gzip")
+    entry.update(uploaded=True, gz_size=len(data))
+    return entry
+
+
+def upload_artifacts(files, backend, run_id: str | None = None, jobs: int | None = None) -> dict:
+    """
+    Upload de filer der findes, samtidigt, og skriv kørslens manifest.
+    Returnerer manifestet ({"run", "created", "files": {navn: entry}, "missing": [...]}).
+    """
+    run_id = run_id or datetime.now().strftime("%Y-%m-%d_%H-%M")
+    paths = [Path(f) for f in dict.fromkeys(files)]
+    present = [p for p in paths if p.is_file()]
+    manifest = {
+        "run": run_id,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "files": {},
+        "missing": [str(p) for p in paths if not p.is_file()],
+    }
+    claimed: set[str] = set()
+    lock = threading.Lock()
+
+    def claim(digest: str) -> bool:
+        with lock:
+            if digest in claimed:
+                return False
+            claimed.add(digest)
+            return True
+
+    def upload(path: Path) -> dict:
+        return _upload_one(backend, path, claim)
+
+    for path, entry in run_bounded(upload, present, jobs or jobs_from_env("UPLOAD_JOBS", 8)):
+        manifest["files"][path.name] = entry
+    key = f"logs/{run_id}/manifest.json"
+    backend.put(key, json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"), "application/json")
+    manifest["manifest"] = backend.describe(key)
+    return manifest
+
+
+def restore(backend: LocalBackend, run_id: str, dest: str | os.PathLike) -> list[str]:
+    """Hent en kørsels filer tilbage fra et LocalBackend (fx til fejlsøgning)."""
+    manifest = json.loads((backend.root / f"logs/{run_id}/manifest.json").read_text(encoding="utf-8"))
+    out = []
+    for name, entry in manifest["files"].items():
+        target = Path(dest) / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(gzip.decompress((backend.root / entry["blob"]).read_bytes()))
+        out.append(str(target))
+    return out
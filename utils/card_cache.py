@@ -0,0 +1,216 @@
+# utils/card_cache.py
+"""
+Cache for Card -> UserID-opslag mod ACCT.
+
+Hver post har et tidsstempel og udløber efter en TTL. Kort der ikke findes
+caches også ("negative" poster, UserID=None) men med kortere TTL, så et kort
+ikke probes mod alle kandidat-URL'er flere gange i samme kørsel.
+
+Filen er JSON Lines, én kompakt post pr. linje:
+  {"c": "<card>", "u": "<guid>", "t": <unix-tid>}   fundet
+  {"c": "<card>", "u": null, "t": <unix-tid>}       ikke fundet
+  {"c": "<card>", "d": 1}                           glem kortet
+  {"u": "<guid>", "d": 1}                           glem alle kort for brugeren
+Nye poster tilføjes (append) ved flush(); filen skrives kun helt om
+(atomisk via tmp-fil + os.replace) når loggen er vokset til mere end det
+dobbelte af de levende poster, eller når den gamle format (ét JSON-objekt
+{card: uid}) er indlæst.
+
+Konfiguration (env):
+  CARD_CACHE_FILE          cache-filen (default acct_card_user_cache.json)
+  CARD_CACHE_TTL           levetid for fundne kort i sekunder (default 7 døgn)
+  CARD_CACHE_NEGATIVE_TTL  levetid for ikke-fundne kort i sekunder (default 1 time)
+  CARD_CACHE_MAX           max antal poster; de ældste smides ud først (default 100000)
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from utils.acct_client import env_int
+
+CACHE_FILE = "acct_card_user_cache.json"
+
+# udskiftelig i tests
+_now = time.time
+
+
+def cache_file() -> str:
+    return os.getenv("CARD_CACHE_FILE", CACHE_FILE)
+
+
+def default_ttl() -> int:
+    return env_int("CARD_CACHE_TTL", 7 * 24 * 3600, minimum=0)
+
+
+def default_negative_ttl() -> int:
+    return env_int("CARD_CACHE_NEGATIVE_TTL", 3600, minimum=0)
+
+
+def default_max_entries() -> int:
+    return env_int("CARD_CACHE_MAX", 100_000)
+
+
+def _dump(rec: dict) -> str:
+    return json.dumps(rec, ensure_ascii=False, separators=(",", ":"))
+
+
+class CardCache:
+    """
+    Trådsikker Card -> UserID-cache bundet til en fil. Indlæses ved første brug.
+
+        cache = CardCache()
+        hit, uid = cache.lookup(card)   # hit=False: ukendt/udløbet, slå op i ACCT
+        cache.put(card, uid)            # uid=None: kortet findes ikke
+        cache.flush()
+    """
+
+    def __init__(self, path: str | os.PathLike | None = None, ttl: int | None = None,
+                 negative_ttl: int | None = None, max_entries: int | None = None):
+        self.path = Path(path if path is not None else cache_file())
+        self.ttl = default_ttl() if ttl is None else ttl
+        self.negative_ttl = default_negative_ttl() if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries or default_max_entries()
+        # card -> (uid | None, tidsstempel); ældste først
+        self._entries: OrderedDict[str, tuple[str | None, float]] = OrderedDict()
+        self._pending: list[dict] = []
+        self._log_lines = 0
+        self._needs_rewrite = False
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    # ---------- indlæsning ----------
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self._load()
+            self._loaded = True
+
+    def _load(self) -> None:
+        try:
+            text = self.path.read_text(encoding="utf-8")
+        except OSError:
+            return
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict) and not obj.keys() <= {"c", "u", "t", "d"}:
+            # gammelt format: {card: uid} uden tidsstempler — regnes som hentet da filen blev skrevet.
+            # create_missing_users gemte hele UserID-URI'en; vi gemmer kun GUID'en.
+            mtime = self.path.stat().st_mtime
+            for card, uid in obj.items():
+                if card and uid:
+                    self._set(str(card), str(uid).rsplit("/", 1)[-1], mtime)
+            self._needs_rewrite = True
+            return
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            self._log_lines += 1
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # fx halv linje efter afbrudt skrivning
+            if isinstance(rec, dict):
+                self._apply(rec)
+
+    def _apply(self, rec: dict) -> None:
+        if rec.get("d"):
+            if "c" in rec:
+                self._entries.pop(str(rec["c"]), None)
+            elif rec.get("u"):
+                self._drop_user(str(rec["u"]))
+        elif rec.get("c"):
+            uid = rec.get("u")
+            self._set(str(rec["c"]), str(uid) if uid else None, float(rec.get("t") or 0))
+
+    def _set(self, card: str, uid: str | None, ts: float) -> None:
+        self._entries[card] = (uid, ts)
+        self._entries.move_to_end(card)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _drop_user(self, uid: str) -> None:
+        for card in [c for c, (u, _) in self._entries.items() if u == uid]:
+            del self._entries[card]
+
+    # ---------- opslag ----------
+    def lookup(self, card: str) -> tuple[bool, str | None]:
+        """(True, uid) ved gyldigt hit — uid er None for kendt-ikke-fundet; ellers (False, None)."""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(card)
+            if entry is None:
+                return False, None
+            uid, ts = entry
+            if _now() - ts > (self.ttl if uid else self.negative_ttl):
+                del self._entries[card]
+                return False, None
+            return True, uid
+
+    def put(self, card: str, uid: str | None) -> None:
+        ts = _now()
+        with self._lock:
+            self._ensure_loaded()
+            self._set(card, uid, ts)
+            self._pending.append({"c": card, "u": uid, "t": int(ts)})
+
+    def invalidate_card(self, card: str) -> None:
+        """Glem kortet (fx efter POST af en ny bruger med det kort)."""
+        self._invalidate({"c": card, "d": 1})
+
+    def invalidate_user(self, uid: str) -> None:
+        """Glem alle kort der peger på brugeren (efter PUT/DELETE på brugeren)."""
+        self._invalidate({"u": uid, "d": 1})
+
+    def _invalidate(self, rec: dict) -> None:
+        with self._lock:
+            if self._loaded:
+                self._apply(rec)
+            # indlæses cachen ikke i denne proces, er en tombstone i loggen nok
+            self._pending.append(rec)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
+
+    # ---------- persistens ----------
+    def flush(self) -> None:
+        """Skriv ventende poster; komprimér filen når loggen er blevet for lang."""
+        with self._lock:
+            if self._loaded and (self._needs_rewrite or
+                                 self._log_lines + len(self._pending) > 2 * len(self._entries) + 100):
+                self._rewrite()
+            elif self._pending:
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write("".join(_dump(r) + "\n" for r in self._pending))
+                self._log_lines += len(self._pending)
+            self._pending.clear()
+
+    def _rewrite(self) -> None:
+        now = _now()
+        live = [
+            {"c": card, "u": uid, "t": int(ts)}
+            for card, (uid, ts) in self._entries.items()
+            if now - ts <= (self.ttl if uid else self.negative_ttl)
+        ]
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            f.write("".join(_dump(r) + "\n" for r in live))
+        os.replace(tmp, self.path)
+        self._log_lines = len(live)
+        self._needs_rewrite = False
+
+
+def invalidating(results, cache: CardCache):
+    """
+    Send (user_id, (ok, info))-resultater videre uændret og glem cachede kort
+    for hver bruger der blev skrevet til (PUT/DELETE kan have ændret Card).
+    """
+    for uid, res in results:
+        if res[0]:
+            cache.invalidate_user(uid)
+        yield uid, res
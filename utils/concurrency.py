@@ -0,0 +1,56 @@
+# utils/concurrency.py
+"""
+Bounded worker-pool til ACCT-operationer.
+
+``run_bounded`` kører ``fn(item)`` for hvert element med højst ``jobs``
+samtidige workers og returnerer resultaterne i samme rækkefølge som input,
+så opsummering og fejl-filer bliver deterministiske uanset hvilken tråd
+der blev færdig først.
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_JOBS = 8
+
+
+def jobs_from_env(name: str = "APPLY_JOBS", default: int = DEFAULT_JOBS) -> int:
+    try:
+        return max(1, int(os.getenv(name, "") or default))
+    except ValueError:
+        return default
+
+
+def dedupe(items: Iterable[T]) -> list[T]:
+    """Fjern dubletter men bevar rækkefølgen (samme bruger må ikke køre parallelt med sig selv)."""
+    seen: set = set()
+    out: list[T] = []
+    for it in items:
+        if it not in seen:
+            seen.add(it)
+            out.append(it)
+    return out
+
+
+def run_bounded(fn: Callable[[T], R], items: Iterable[T], jobs: int) -> Iterator[tuple[T, R]]:
+    """
+    Kør ``fn`` over ``items`` med højst ``jobs`` tråde.
+    Yielder ``(item, result)`` i input-rækkefølge, efterhånden som præfikset er færdigt.
+    Exceptions fra ``fn`` propageres; ACCT-ops bør derfor selv returnere (ok, info).
+    Under profilering (utils.stage_profile) profileres worker-trådene med i trinet.
+    """
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        for it in items:
+            yield it, fn(it)
+        return
+    # stage_profile importeres ikke herfra: er modulet ikke indlæst, er profilering heller ikke startet
+    profile = sys.modules.get("utils.stage_profile")
+    if profile is not None and profile.active():
+        fn = profile.worker(fn)
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+        yield from zip(items, pool.map(fn, items))
@@ -0,0 +1,101 @@
+# utils/deadline.py
+"""
+Tidsbudget for apply-faserne (Cloud Functions har en hård timeout).
+
+En Deadline kender den resterende tid og estimerer hvad én op koster ud fra
+de observerede latenser pr. fase (glidende gennemsnit + 4 × afvigelse, som
+TCP's RTO i RFC 6298). En op startes kun hvis estimatet plus DEADLINE_RESERVE
+kan nås inden deadline; ellers returneres (False, DEFERRED) uden kald, og fra
+da af udskydes alt resten — kørslen stopper rent i stedet for at blive dræbt
+midt i en PUT. De udskudte brugere gemmes som en rest-plan
+(changing_state_of_group.REMAINING_PLAN_FILE).
+
+Konfiguration (env):
+  APPLY_DEADLINE          sekunder til rådighed for changing_state_of_group.main (default: ingen)
+  FUNCTION_TIMEOUT_SEC    Cloud Function-timeout; main.entry_point bruger den minus
+                          DEADLINE_UPLOAD_RESERVE (default 30s) til upload af artefakter
+  DEADLINE_RESERVE        sikkerhedsmargin i sekunder pr. op (default 5)
+  DEADLINE_OP_ESTIMATE    estimat før første observation, sekunder (default 2)
+"""
+import os
+import threading
+import time
+
+from utils.acct_client import env_float
+
+DEFERRED = "deferred_deadline"
+
+# udskiftelig i tests
+_clock = time.monotonic
+
+
+class Deadline:
+    def __init__(self, seconds: float, reserve: float | None = None, initial_estimate: float | None = None):
+        self.end = _clock() + seconds
+        self.reserve = reserve if reserve is not None else env_float("DEADLINE_RESERVE", 5.0)
+        self.initial = initial_estimate if initial_estimate is not None else env_float("DEADLINE_OP_ESTIMATE", 2.0)
+        self.expired = False
+        self.deferred: list[tuple[str, str]] = []  # (fase, uid) i den rækkefølge de blev udskudt
+        self._est: dict[str, tuple[float, float]] = {}  # fase -> (gennemsnit, afvigelse)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str = "APPLY_DEADLINE") -> "Deadline | None":
+        seconds = env_float(name, 0.0)
+        return cls(seconds) if seconds > 0 else None
+
+    def remaining(self) -> float:
+        return self.end - _clock()
+
+    def estimate(self, phase: str) -> float:
+        with self._lock:
+            est = self._est.get(phase)
+        if est is None:
+            return self.initial
+        mean, dev = est
+        return mean + 4 * dev
+
+    def observe(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            est = self._est.get(phase)
+            if est is None:
+                self._est[phase] = (seconds, seconds / 2)
+            else:
+                mean, dev = est
+                self._est[phase] = (mean + (seconds - mean) / 8, dev + (abs(seconds - mean) - dev) / 4)
+
+    def allows(self, phase: str) -> bool:
+        """Kan en op i fasen nå at blive færdig? Når svaret først er nej, forbliver det nej."""
+        if not self.expired and self.remaining() - self.reserve < self.estimate(phase):
+            self.expired = True
+        return not self.expired
+
+    def guard(self, op, phase: str):
+        """Pak en op(uid) -> (ok, info) så den udskydes når tiden ikke rækker, og dens latens måles."""
+        def run(uid: str) -> tuple[bool, str | None]:
+            if not self.allows(phase):
+                with self._lock:
+                    self.deferred.append((phase, uid))
+                return False, DEFERRED
+            start = _clock()
+            try:
+                return op(uid)
+            finally:
+                self.observe(phase, _clock() - start)
+        return run
+
+    def summary(self) -> dict:
+        return {"remaining_s": round(self.remaining(), 1), "deferred": len({uid for _, uid in self.deferred}),
+                "estimates_s": {p: round(self.estimate(p), 3) for p in sorted(self._est)}}
+
+
+def guarded(op, deadline: Deadline | None, phase: str):
+    return op if deadline is None else deadline.guard(op, phase)
+
+
+def for_function() -> Deadline | None:
+    """Deadline for en Cloud Function-kørsel: FUNCTION_TIMEOUT_SEC minus DEADLINE_UPLOAD_RESERVE."""
+    timeout = env_float("FUNCTION_TIMEOUT_SEC", 0.0)
+    if timeout <= 0:
+        return None
+    return Deadline(max(1.0, timeout - env_float("DEADLINE_UPLOAD_RESERVE", 30.0)))
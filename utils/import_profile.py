@@ -0,0 +1,73 @@
+# utils/import_profile.py
+"""
+Import-tidsprofil pr. modul (kumulativ pris), til at holde kold start nede.
+
+Kører ``python -X importtime -c "import <modul>"`` i en frisk proces og
+samler stderr-linjerne ``import time: self | cumulative | name``.
+
+Kør:  python -m utils.import_profile main [--top 25] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> list[dict]:
+    """Stderr fra -X importtime → [{"module", "self_us", "cumulative_us", "depth"}] i importrækkefølge."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            rows.append({"module": m.group(4), "self_us": int(m.group(1)),
+                         "cumulative_us": int(m.group(2)), "depth": (len(m.group(3)) - 1) // 2})
+    return rows
+
+
+def profile(module: str, python: str = sys.executable, env: dict | None = None) -> list[dict]:
+    """Importér modulet i en ny proces (fra repo-roden) og returnér import-tiderne."""
+    proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=REPO_ROOT, capture_output=True, text=True, env=env or dict(os.environ))
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} fejlede:\n{proc.stderr.strip().splitlines()[-1]}")
+    return parse_importtime(proc.stderr)
+
+
+def total_ms(rows: list[dict], module: str) -> float:
+    """Kumulativ importtid for modulet i millisekunder."""
+    for r in reversed(rows):
+        if r["module"] == module:
+            return r["cumulative_us"] / 1000
+    raise KeyError(module)
+
+
+def print_report(module: str, rows: list[dict], top: int = 25) -> None:
+    print(f"import {module}: {total_ms(rows, module):.1f} ms kumulativt, {len(rows)} moduler")
+    print(f"{'kumulativ ms':>12} {'egen ms':>9}  modul")
+    for r in sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]:
+        print(f"{r['cumulative_us'] / 1000:12.1f} {r['self_us'] / 1000:9.1f}  {'  ' * r['depth']}{r['module']}")
+
+
+def main(argv: list[str] | None = None) -> list[dict]:
+    ap = argparse.ArgumentParser(description="Import-tidsprofil (python -X importtime) for et modul")
+    ap.add_argument("module", nargs="?", default="main")
+    ap.add_argument("--top", type=int, default=25)
+    ap.add_argument("--json", action="store_true", help="skriv rækkerne som JSON i stedet for tabel")
+    args = ap.parse_args(argv)
+    rows = profile(args.module)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(args.module, rows, args.top)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
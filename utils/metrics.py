@@ -0,0 +1,210 @@
+# utils/metrics.py
+"""
+Kørselsmetrikker: HTTP pr. endpoint og vægurstid pr. trin.
+
+HTTP-laget (utils.acct_client, utils.acct_async og Rasmus-download) kalder
+record_http for hvert svar/forsøg; pipeline.stage kalder record_stage.
+report() samler det til én JSON-venlig dict:
+
+  {"http": {"GET test.acct.dk/rest/current/users/{guid}":
+              {"count", "status": {"200": n, ...}, "errors", "retries",
+               "bytes_in", "bytes_out",
+               "latency_ms": {"p50", "p95", "p99", "max", "mean", "histogram": {"≤50": n, ...}}}},
+   "stages": {"apply": {"seconds", "attempts", "ok"}},
+   "totals": {"requests", "retries", "bytes_in", "bytes_out", "http_seconds"}}
+
+Endpoints grupperes efter skabelon: GUIDs bliver {guid}, lange tal/id'er
+{id}, og query-værdier fjernes (?card=), så /users/<guid> er ét endpoint.
+
+Latenserne gemmes pr. endpoint op til METRICS_MAX_SAMPLES (default 20000);
+derefter reservoir-sampling, så percentilerne stadig er repræsentative.
+"""
+import json
+import math
+import os
+import random
+import re
+import threading
+from urllib.parse import parse_qsl, urlsplit
+
+# øvre grænser i ms for latens-histogrammet
+HISTOGRAM_BOUNDS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_GUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+_ID_RE = re.compile(r"^(?=.*\d)[\w-]{6,}$")
+
+
+def endpoint_key(method: str, url: str) -> str:
+    """'GET https://h/users/<guid>?card=1' → 'GET h/users/{guid}?card='."""
+    parts = urlsplit(url)
+    segs = []
+    for seg in parts.path.split("/"):
+        if _GUID_RE.match(seg):
+            seg = "{guid}"
+        elif seg.isdigit() or (len(seg) >= 20 and _ID_RE.match(seg)):
+            seg = "{id}"
+        segs.append(seg)
+    key = f"{method.upper()} {parts.netloc}{'/'.join(segs)}"
+    names = [k for k, _ in parse_qsl(parts.query, keep_blank_values=True)]
+    if names:
+        key += "?" + "&".join(f"{k}=" for k in names)
+    return key
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nærmeste-rang-percentil af en sorteret liste (0 hvis tom)."""
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+class _Endpoint:
+    __slots__ = ("count", "status", "errors", "retries", "bytes_in", "bytes_out", "seconds", "samples", "hist")
+
+    def __init__(self):
+        self.count = self.errors = self.retries = self.bytes_in = self.bytes_out = 0
+        self.seconds = 0.0
+        self.status: dict[str, int] = {}
+        self.samples: list[float] = []
+        self.hist = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def as_dict(self) -> dict:
+        lat = sorted(self.samples)
+        labels = [f"≤{b}" for b in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}"]
+        return {
+            "count": self.count,
+            "status": dict(sorted(self.status.items())),
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency_ms": {
+                "p50": round(percentile(lat, 50), 1),
+                "p95": round(percentile(lat, 95), 1),
+                "p99": round(percentile(lat, 99), 1),
+                "max": round(lat[-1], 1) if lat else 0.0,
+                "mean": round(self.seconds * 1000 / self.count, 1) if self.count else 0.0,
+                "histogram": {k: n for k, n in zip(labels, self.hist) if n},
+            },
+        }
+
+
+class Metrics:
+    """Trådsikker opsamling for én kørsel."""
+
+    def __init__(self, max_samples: int | None = None):
+        # ikke acct_client.env_int: acct_client importerer dette modul
+        try:
+            self.max_samples = max_samples or max(1, int(os.getenv("METRICS_MAX_SAMPLES", "") or 20000))
+        except ValueError:
+            self.max_samples = 20000
+        self._lock = threading.Lock()
+        self._http: dict[str, _Endpoint] = {}
+        self._stages: dict[str, dict] = {}
+        self._rng = random.Random(0)
+
+    def record_http(self, method: str, url: str, status: int | None, seconds: float,
+                    bytes_in: int = 0, bytes_out: int = 0, retry: bool = False) -> None:
+        """Ét forsøg; status None = forbindelsesfejl/timeout. retry=True: forsøget blev gentaget."""
+        key = endpoint_key(method, url)
+        ms = seconds * 1000
+        with self._lock:
+            ep = self._http.get(key)
+            if ep is None:
+                ep = self._http[key] = _Endpoint()
+            ep.count += 1
+            code = str(status) if status is not None else "error"
+            ep.status[code] = ep.status.get(code, 0) + 1
+            if status is None or status >= 400:
+                ep.errors += 1
+            if retry:
+                ep.retries += 1
+            ep.bytes_in += bytes_in
+            ep.bytes_out += bytes_out
+            ep.seconds += seconds
+            if len(ep.samples) < self.max_samples:
+                ep.samples.append(ms)
+            else:
+                j = self._rng.randrange(ep.count)
+                if j < self.max_samples:
+                    ep.samples[j] = ms
+            for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+                if ms <= bound:
+                    ep.hist[i] += 1
+                    break
+            else:
+                ep.hist[-1] += 1
+
+    def record_stage(self, name: str, seconds: float, attempts: int = 1, ok: bool = True) -> None:
+        with self._lock:
+            prev = self._stages.get(name)
+            if prev is not None:  # samme trin kørt flere gange (fx pr. kørsel i en benchmark)
+                seconds += prev["seconds"]
+                attempts += prev["attempts"]
+                ok = ok and prev["ok"]
+            self._stages[name] = {"seconds": round(seconds, 3), "attempts": attempts, "ok": ok}
+
+    def report(self) -> dict:
+        with self._lock:
+            http = {k: ep.as_dict() for k, ep in sorted(self._http.items())}
+            seconds = sum(ep.seconds for ep in self._http.values())
+            stages = {k: dict(v) for k, v in self._stages.items()}
+        return {
+            "http": http,
+            "stages": stages,
+            "totals": {
+                "requests": sum(e["count"] for e in http.values()),
+                "retries": sum(e["retries"] for e in http.values()),
+                "bytes_in": sum(e["bytes_in"] for e in http.values()),
+                "bytes_out": sum(e["bytes_out"] for e in http.values()),
+                "http_seconds": round(seconds, 3),
+            },
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._http.clear()
+            self._stages.clear()
+
+
+# processens fælles opsamling
+METRICS = Metrics()
+
+
+def record_http(*args, **kwargs) -> None:
+    METRICS.record_http(*args, **kwargs)
+
+
+def record_stage(*args, **kwargs) -> None:
+    METRICS.record_stage(*args, **kwargs)
+
+
+def report() -> dict:
+    return METRICS.report()
+
+
+def reset() -> None:
+    METRICS.reset()
+
+
+def write_report(path: str | os.PathLike, extra: dict | None = None) -> dict:
+    """Skriv report() (+ evt. ekstra nøgler, fx run/timestamp) som JSON og returnér den."""
+    rep = {**(extra or {}), **report()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rep, f, indent=2, ensure_ascii=False)
+    return rep
+
+
+def print_summary(rep: dict, top: int = 8) -> None:
+    """Kort oversigt: de endpoints der brugte mest tid, og trinenes vægurstid."""
+    t = rep["totals"]
+    print(f"HTTP: {t['requests']} kald, {t['retries']} genforsøg, {t['bytes_in']} B ind / {t['bytes_out']} B ud, "
+          f"{t['http_seconds']:.1f}s samlet kaldetid")
+    slowest = sorted(rep["http"].items(), key=lambda kv: kv[1]["count"] * kv[1]["latency_ms"]["mean"], reverse=True)
+    for key, ep in slowest[:top]:
+        lat = ep["latency_ms"]
+        print(f"  {key}: {ep['count']} kald, p50 {lat['p50']} / p95 {lat['p95']} / p99 {lat['p99']} ms, "
+              f"status {ep['status']}")
+    for name, st in rep["stages"].items():
+        print(f"  trin {name}: {st['seconds']:.1f}s ({st['attempts']} forsøg{'' if st['ok'] else ', FEJLET'})")
@@ -0,0 +1,158 @@
+# utils/snapshot.py
+"""
+Kørsels-snapshot af brugere fra eksporterne.
+
+build_members_csv (/groups/{GROUP_ID}/users) henter allerede Card, Name og
+EntryRemaining for hvert medlem og gemmer felterne her, så
+changing_state_of_group kan springe ``GET /users/{guid}`` over for brugere
+der lige er listet, og kun hente det snapshottet ikke har (fx brugerens
+øvrige grupper). Det er gruppens medlemmer apply rører (DEL/UPD).
+
+Den fulde /users-eksport (find_users) gemmer kun i snapshottet når
+USER_SNAPSHOT_ALL_USERS=1 — ellers ville både hukommelse og fil vokse med
+hele kataloget, og eksporten ikke længere være flad. orchestrator.run
+starter hver kørsel med et tomt snapshot i hukommelsen (reset_shared), så
+en varm Cloud Function-instans ikke ophober poster på tværs af kørsler.
+
+Staleness-regler — en post bruges kun hvis:
+  1. den er yngre end USER_SNAPSHOT_MAX_AGE sekunder (default 1800; 0 slår snapshottet fra),
+  2. snapshottet er taget mod samme ACCT_BASE,
+  3. denne proces ikke selv har skrevet til brugeren siden (invalidate()),
+     da PUT/DELETE kan have ændret felterne.
+
+Filen (USER_SNAPSHOT_FILE, JSON) skrives atomisk; flere eksportører fletter
+deres poster ind i samme fil.
+"""
+import json
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from utils.acct_client import env_int
+from utils.xml_utils import _localname
+
+NS_XSI = "http://www.w3.org/2001/XMLSchema-instance"
+
+# udskiftelig i tests
+_now = time.time
+
+
+def snapshot_file() -> str:
+    return os.getenv("USER_SNAPSHOT_FILE", "user_snapshot.json")
+
+
+def record_all_users() -> bool:
+    return os.getenv("USER_SNAPSHOT_ALL_USERS", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def max_age() -> int:
+    return env_int("USER_SNAPSHOT_MAX_AGE", 1800, minimum=0)
+
+
+def _acct_base() -> str:
+    return os.getenv("ACCT_BASE", "https://test.acct.dk/rest/current").rstrip("/")
+
+
+def element_fields(el: ET.Element) -> dict:
+    """Card/Name/EntryRemaining fra et <User>-element (namespace-agnostisk, uden fallbacks)."""
+    cur = {"card": "", "name": "", "entry_nil": False, "entry_text": None}
+    for child in el:
+        t = _localname(child.tag).lower()
+        if t == "card":
+            cur["card"] = (child.text or "").strip()
+        elif t == "name":
+            cur["name"] = (child.text or "").strip()
+        elif t == "entryremaining":
+            if child.attrib.get(f"{{{NS_XSI}}}nil", "").lower() == "true":
+                cur["entry_nil"] = True
+            else:
+                cur["entry_text"] = (child.text or "").strip() or None
+    return cur
+
+
+class UserSnapshot:
+    def __init__(self, path: str | None = None):
+        self.path = Path(path or snapshot_file())
+        self._users: dict[str, dict] = {}
+        self._invalid: set[str] = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            obj = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(obj, dict) and obj.get("acct_base") == _acct_base() and isinstance(obj.get("users"), dict):
+            self._users = obj["users"]
+
+    def record(self, guid: str, fields: dict) -> None:
+        """Gem felterne (fra element_fields) for guid med tidsstempel nu."""
+        with self._lock:
+            self._ensure_loaded()
+            self._users[guid] = {**fields, "t": int(_now())}
+            self._invalid.discard(guid)
+
+    def get(self, guid: str) -> dict | None:
+        """Friske felter for guid, eller None hvis ukendt, for gammel eller invalideret."""
+        limit = max_age()
+        if limit <= 0:
+            return None
+        with self._lock:
+            if guid in self._invalid:
+                return None
+            self._ensure_loaded()
+            rec = self._users.get(guid)
+        if rec is None or _now() - rec.get("t", 0) > limit:
+            return None
+        return {k: rec.get(k) for k in ("card", "name", "entry_nil", "entry_text")}
+
+    def invalidate(self, guid: str) -> None:
+        with self._lock:
+            self._invalid.add(guid)
+
+    def save(self) -> None:
+        """Skriv friske poster atomisk (tmp-fil + os.replace)."""
+        with self._lock:
+            self._ensure_loaded()
+            now, limit = _now(), max_age()
+            users = {g: r for g, r in self._users.items()
+                     if g not in self._invalid and now - r.get("t", 0) <= limit}
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps({"acct_base": _acct_base(), "users": users},
+                                      ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+_shared: UserSnapshot | None = None
+_shared_lock = threading.Lock()
+
+
+def shared() -> UserSnapshot:
+    """Procesens snapshot (USER_SNAPSHOT_FILE), oprettes ved første brug."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = UserSnapshot()
+        return _shared
+
+
+def reset_shared() -> None:
+    global _shared
+    with _shared_lock:
+        _shared = None
+
+
+def recording(handle, snap: UserSnapshot):
+    """Pak en parse_user-handler så hver parset bruger også gemmes i snapshottet."""
+    def run(el: ET.Element):
+        rec = handle(el)
+        if rec and rec.get("guid"):
+            snap.record(rec["guid"], element_fields(el))
+        return rec
+    return run
@@ -0,0 +1,189 @@
+# utils/stage_profile.py
+"""
+Valgfri profilering pr. pipeline-trin (cProfile + tracemalloc-peak).
+
+Slået til (orchestrator --profile, SYNC_PROFILE=1 eller ?profile=1 i
+Cloud Function-requesten) kører pipeline.stage hvert trin under cProfile og
+måler hukommelses-peak med tracemalloc. Trinene svarer til stage-modulerne:
+  rasmus → rasmus_liste_til_csv   group → build_members_csv
+  diff   → member_rasmus_diff     create → create_missing_users
+  apply  → changing_state_of_group (async: hele async_pipeline som ét trin)
+
+Worker-tråde fra utils.concurrency.run_bounded profileres med hver sin
+profiler, som lægges sammen med trinets, så ACCT-kaldene i apply-poolen
+også kommer med.
+
+Pr. trin skrives i profilmappen (logs/profile_<ts>/):
+  <trin>.pstats   til ``python -m pstats`` / snakeviz
+  <trin>.txt      top-N funktioner efter kumulativ tid (PROFILE_TOP, default 30)
+og til sidst profile_summary.json med tid og peak pr. trin. Filerne arkiveres
+og uploades sammen med kørslens øvrige artefakter.
+
+Der profileres ét trin ad gangen: kaldes profiled() fra en anden tråd mens
+et trin profileres (fx to pipelines i samme proces), køres det andet trin
+uprofileret, og det noteres i outputtet. Indlejrede kald i samme tråd (et
+trin der kalder pipeline.stage igen) regnes med i det ydre trin.
+
+cProfile, pstats og tracemalloc importeres først når profilering startes,
+så modulet ikke belaster importtiden når det er slået fra.
+
+Konfiguration (env):
+  SYNC_PROFILE           "1" slår profilering til (default fra)
+  PROFILE_TOP            antal funktioner i <trin>.txt (default 30)
+  PROFILE_TRACE_FRAMES   tracemalloc-frames pr. allokering (default 1)
+"""
+import io
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+def enabled() -> bool:
+    return os.getenv("SYNC_PROFILE", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class _Run:
+    def __init__(self, out_dir: Path, top: int):
+        self.dir = out_dir
+        self.top = top
+        self.stages: dict[str, dict] = {}
+        self.files: list[str] = []
+
+
+class _Stage:
+    def __init__(self, label: str):
+        self.label = label
+        self.owner = threading.get_ident()
+        self.workers: dict = {}  # tråd-id -> cProfile.Profile
+        self.lock = threading.Lock()
+
+
+_run: _Run | None = None
+_current: _Stage | None = None
+_current_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, "") or default))
+    except ValueError:
+        return default
+
+
+def start(out_dir: str | os.PathLike, top: int | None = None) -> Path:
+    """Profilér de efterfølgende trin; filerne skrives i out_dir."""
+    global _run
+    path = Path(out_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    _run = _Run(path, top or _env_int("PROFILE_TOP", 30))
+    return path
+
+
+def active() -> bool:
+    return _run is not None
+
+
+def finish() -> list[str]:
+    """Skriv profile_summary.json, slå profilering fra og returnér alle skrevne filer."""
+    global _run
+    run, _run = _run, None
+    if run is None:
+        return []
+    summary = run.dir / "profile_summary.json"
+    summary.write_text(json.dumps(run.stages, indent=2, ensure_ascii=False), encoding="utf-8")
+    return run.files + [str(summary)]
+
+
+def profiled(label: str, fn, *args, **kwargs):
+    """Kør fn under cProfile/tracemalloc hvis profilering er slået til (ellers bare fn)."""
+    global _current
+    run = _run
+    if run is None:
+        return fn(*args, **kwargs)
+    with _current_lock:
+        busy = _current
+        if busy is None:
+            stage = _current = _Stage(label)
+    if busy is not None:
+        if busy.owner != threading.get_ident():  # indlejret i samme tråd: tælles med i det ydre trin
+            print(f"Profil {label}: ikke profileret (trin {busy.label} profileres samtidig i en anden tråd)")
+        return fn(*args, **kwargs)
+
+    import cProfile
+    import tracemalloc
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(_env_int("PROFILE_TRACE_FRAMES", 1))
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    prof = cProfile.Profile()
+    t0 = time.perf_counter()
+    prof.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        prof.disable()
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        if started:
+            tracemalloc.stop()
+        with _current_lock:
+            _current = None
+        _save(run, label, prof, stage, elapsed, peak - base)
+
+
+def worker(fn):
+    """Pak en worker-funktion (run_bounded) så dens kald profileres med i det aktive trin."""
+    stage = _current
+    if stage is None:
+        return fn
+
+    import cProfile
+
+    def run(item):
+        ident = threading.get_ident()
+        with stage.lock:
+            prof = stage.workers.get(ident)
+            if prof is None:
+                prof = stage.workers[ident] = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:  # en anden profiler er aktiv i tråden
+            return fn(item)
+        try:
+            return fn(item)
+        finally:
+            prof.disable()
+    return run
+
+
+def _save(run: _Run, label: str, prof, stage: _Stage, seconds: float, peak: int) -> None:
+    import pstats
+    stats = pstats.Stats(prof)
+    for w in stage.workers.values():
+        try:
+            stats.add(w)
+        except TypeError:  # profiler uden målinger
+            pass
+    name = label
+    n = 2
+    while name in run.stages:  # samme trin kørt igen (fx anden kørsel i samme proces)
+        name, n = f"{label}_{n}", n + 1
+    pstats_path = run.dir / f"{name}.pstats"
+    stats.dump_stats(pstats_path)
+
+    buf = io.StringIO()
+    buf.write(f"trin {label}: {seconds:.2f}s, tracemalloc-peak {peak / 1e6:.1f} MB, "
+              f"{len(stage.workers)} worker-tråde\n\n")
+    stats.stream = buf
+    stats.sort_stats("cumulative").print_stats(run.top)
+    txt_path = run.dir / f"{name}.txt"
+    txt_path.write_text(buf.getvalue(), encoding="utf-8")
+
+    run.stages[name] = {"seconds": round(seconds, 3), "peak_bytes": peak,
+                        "worker_threads": len(stage.workers),
+                        "pstats": pstats_path.name, "top": txt_path.name}
+    run.files += [str(pstats_path), str(txt_path)]
+    print(f"Profil {name}: {seconds:.2f}s, peak {peak / 1e6:.1f} MB → {pstats_path}")
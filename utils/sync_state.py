@@ -0,0 +1,112 @@
+# utils/sync_state.py
+"""
+Tilstand fra sidste gennemførte kørsel, til inkrementel sync.
+
+Efter ADD/DEL/UPD gemmes gruppens faktiske medlemmer (post-state) og
+Rasmus-listens kort i SYNC_STATE_FILE sammen med et indholdshash af hver.
+Hashene er over en kanonisk (sorteret) form af rækkerne, så de ikke
+afhænger af rækkefølge eller formatering af CSV-filerne.
+
+Næste kørsel sammenligner (member_rasmus_diff.incremental_diff):
+  - begge hashes uændrede og intet udestående  → ingen diff, ingen opslag
+  - ellers diff'es kun kort hvis række har ændret sig (eller som stod
+    udestående efter sidste kørsel, fx fejlede eller manglende kort)
+
+SYNC_INCREMENTAL=0 slår det fra (fuld diff hver gang).
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+STATE_FILE = "sync_state.json"
+STATE_VERSION = 1
+
+
+def enabled() -> bool:
+    return os.getenv("SYNC_INCREMENTAL", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def state_file() -> str:
+    return os.getenv("SYNC_STATE_FILE", STATE_FILE)
+
+
+def _digest(lines) -> str:
+    h = hashlib.sha256()
+    for line in lines:
+        h.update(line.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def rasmus_hash(cards) -> str:
+    return _digest(sorted(cards))
+
+
+def group_hash(group_by_card: dict) -> str:
+    return _digest(sorted(f'{c}\t{r.get("UserID", "")}\t{r.get("EntryRemaining", "")}'
+                          for c, r in group_by_card.items()))
+
+
+def pending_cards(rasmus_cards, group_by_card: dict, needs_reset) -> list[str]:
+    """Kort der stadig kræver en handling i en given tilstand (skal med i næste diff)."""
+    rasmus = set(rasmus_cards)
+    group = set(group_by_card)
+    out = (rasmus - group) | (group - rasmus)
+    out |= {c for c in rasmus & group if needs_reset(group_by_card[c].get("EntryRemaining", ""))}
+    return sorted(out)
+
+
+def load() -> dict | None:
+    """Gemt tilstand, eller None hvis den mangler, er ugyldig, fra en anden gruppe eller slået fra."""
+    if not enabled():
+        return None
+    try:
+        state = json.loads(Path(state_file()).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get("version") != STATE_VERSION:
+        return None
+    if state.get("group_id") != os.getenv("GROUP_ID", ""):
+        return None
+    return state
+
+
+def save(rasmus_cards, group_by_card: dict, needs_reset) -> dict:
+    """Gem post-state atomisk (tmp-fil + os.replace) og returnér den."""
+    state = {
+        "version": STATE_VERSION,
+        "group_id": os.getenv("GROUP_ID", ""),
+        "rasmus_hash": rasmus_hash(rasmus_cards),
+        "group_hash": group_hash(group_by_card),
+        "rasmus_cards": sorted(rasmus_cards),
+        "group": {c: {"UserID": r.get("UserID", ""), "EntryRemaining": r.get("EntryRemaining", "")}
+                  for c, r in sorted(group_by_card.items())},
+        "pending": pending_cards(rasmus_cards, group_by_card, needs_reset),
+    }
+    path = Path(state_file())
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+    return state
+
+
+def unchanged(state: dict | None, rasmus_cards, group_by_card: dict) -> bool:
+    """True hvis begge hashes svarer til den gemte tilstand og intet står udestående."""
+    return (state is not None
+            and state["rasmus_hash"] == rasmus_hash(rasmus_cards)
+            and state["group_hash"] == group_hash(group_by_card)
+            and not state.get("pending"))
+
+
+def changed_cards(state: dict, rasmus_cards, group_by_card: dict) -> set[str]:
+    """Kort hvis Rasmus- eller grupperække afviger fra den gemte tilstand, plus udestående kort."""
+    old_rasmus = set(state.get("rasmus_cards") or [])
+    old_group = state.get("group") or {}
+    changed = old_rasmus ^ set(rasmus_cards)
+    for card in set(old_group) | set(group_by_card):
+        old, new = old_group.get(card), group_by_card.get(card)
+        if (old is None) != (new is None) or (old and new and (
+                old.get("UserID") != new.get("UserID") or old.get("EntryRemaining") != new.get("EntryRemaining"))):
+            changed.add(card)
+    return changed | set(state.get("pending") or [])
@@ -0,0 +1,63 @@
+# utils/verification.py
+"""
+Politik for hvornår ændringer mod ACCT verificeres.
+
+VERIFY_POLICY (env):
+  per_op        verificér hver ændring med et ekstra GET med det samme (default)
+  sampled(N%)   verificér kun N% af brugerne med det samme (fast udvalg pr. GUID);
+                også "sampled:N" eller bare "sampled" (10%)
+  batch         ingen GET pr. ændring; alt bekræftes til sidst med ét
+                /groups/{GROUP_ID}/users-udtræk, og kun afvigere tjekkes igen
+  none          ingen verifikation
+"""
+import os
+import re
+import zlib
+
+MODES = ("none", "sampled", "per_op", "batch")
+DEFAULT_SAMPLE_PERCENT = 10.0
+
+_SAMPLED_RE = re.compile(r"^sampled(?:[(:=]\s*([\d.]+)\s*%?\s*\)?)?$")
+
+
+class VerifyPolicy:
+    def __init__(self, mode: str = "per_op", percent: float = DEFAULT_SAMPLE_PERCENT):
+        if mode not in MODES:
+            raise ValueError(f"ukendt verifikationspolitik: {mode!r} (brug {', '.join(MODES)})")
+        self.mode = mode
+        self.percent = max(0.0, min(100.0, percent))
+
+    @property
+    def batch(self) -> bool:
+        return self.mode == "batch"
+
+    def inline(self, user_guid: str) -> bool:
+        """Skal denne brugers ændring verificeres med det samme (GET efter PUT/DELETE)?"""
+        if self.mode == "per_op":
+            return True
+        if self.mode == "sampled":
+            # deterministisk udvalg, så samme bruger vælges i gentagne kørsler
+            return zlib.crc32(user_guid.encode("utf-8")) % 10000 < self.percent * 100
+        return False
+
+    def __repr__(self) -> str:
+        if self.mode == "sampled":
+            return f"sampled({self.percent:g}%)"
+        return self.mode
+
+
+def parse_policy(text: str | None) -> VerifyPolicy:
+    """'per_op' / 'batch' / 'none' / 'sampled(25%)' → VerifyPolicy. ValueError ved ukendt værdi."""
+    value = (text or "per_op").strip().lower().replace("-", "_")
+    m = _SAMPLED_RE.match(value)
+    if m:
+        return VerifyPolicy("sampled", float(m.group(1)) if m.group(1) else DEFAULT_SAMPLE_PERCENT)
+    return VerifyPolicy(value)
+
+
+def policy_from_env(name: str = "VERIFY_POLICY") -> VerifyPolicy:
+    try:
+        return parse_policy(os.getenv(name))
+    except ValueError as e:
+        print(f"⚠️  {e} — bruger per_op")
+        return VerifyPolicy("per_op")
@@ -9,3 +9,106 @@ def sort_children_alphabetically(elem: ET.Element):
     elem[:] = sorted(list(elem), key=lambda e: _localname(e.tag))
     for child in elem:
         sort_children_alphabetically(child)
+
+class ElementStream:
+    """
+    Inkrementel parser: fød bytes-chunks, få records for hvert færdigt ``tag``-element.
+    ``handle(elem)`` omsætter elementet til en record (None springes over); elementet
+    ryddes bagefter, så hukommelsen holdes flad uanset dokumentets størrelse.
+    """
+
+    def __init__(self, tag: str, handle):
+        self.tag = tag
+        self.handle = handle
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root = None
+
+    def _drain(self) -> list:
+        out = []
+        for event, el in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = el
+                continue
+            if el.tag != self.tag:
+                continue
+            rec = self.handle(el)
+            if rec is not None:
+                out.append(rec)
+            el.clear()
+            if self._root is not None and self._root is not el:
+                # fjern færdige børn fra roden (UserCollection), så de kan GC'es
+                self._root.clear()
+        return out
+
+    def feed(self, data: bytes) -> list:
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self) -> list:
+        self._parser.close()
+        return self._drain()
+
+
+def iter_elements(chunks, tag: str, handle):
+    """Yield records fra en iterable af bytes-chunks (fx ``response.iter_content()``)."""
+    stream = ElementStream(tag, handle)
+    for chunk in chunks:
+        if chunk:
+            yield from stream.feed(chunk)
+    yield from stream.close()
+
+
+async def aiter_elements(chunks, tag: str, handle):
+    """Som iter_elements, for en async iterable af chunks (fx aiohttp ``content.iter_chunked()``)."""
+    stream = ElementStream(tag, handle)
+    async for chunk in chunks:
+        if chunk:
+            for rec in stream.feed(chunk):
+                yield rec
+    for rec in stream.close():
+        yield rec
+
+
+CARD_TAGS = frozenset({"card"})
+USERID_TAGS = frozenset({"userid", "guid", "id"})
+
+
+def parse_card_userid_map(xml) -> dict[str, str]:
+    """
+    Card → UserID/Guid/Id fra et vilkårligt ACCT-svar (enkelt <User> eller collection),
+    namespace-agnostisk og i ét gennemløb af træet (O(n)).
+
+    Et "record" er det inderste element der (inkl. sig selv) indeholder både et Card-
+    og et UserID-lignende element; første forekomst i dokumentrækkefølge tæller.
+    Ved dublet-Card vinder det sidste record. Ugyldig XML giver {}.
+    """
+    try:
+        root = ET.fromstring(xml.encode("utf-8") if isinstance(xml, str) else xml)
+    except ET.ParseError:
+        return {}
+    out: dict[str, str] = {}
+
+    def walk(el) -> tuple[str | None, str | None, bool]:
+        # returnerer (første Card, første UserID, om der er et record i undertræet)
+        name = _localname(el.tag).lower()
+        card = uid = None
+        if name in CARD_TAGS:
+            card = (el.text or "").strip()
+        elif name in USERID_TAGS:
+            uid = (el.text or "").strip()
+        record_below = False
+        for child in el:
+            c_card, c_uid, c_rec = walk(child)
+            if card is None:
+                card = c_card
+            if uid is None:
+                uid = c_uid
+            record_below = record_below or c_rec
+        if card and uid and not record_below:
+            out[card] = uid
+            record_below = True
+        return card, uid, record_below
+
+    walk(root)
+    return out